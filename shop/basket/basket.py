@@ -1,6 +1,9 @@
-from decimal import Decimal
 from django.conf import settings
+from django.core import signing
 from catalog.models import Product
+from catalog.pricing import with_current_price
+
+BASKET_COOKIE_SALT = "basket.cookie"
 
 
 class BasketSession(object):
@@ -10,11 +13,8 @@ class BasketSession(object):
         Инициализируем корзину
         """
         self.session = request.session
-        basket = self.session.get(settings.CART_SESSION_ID)
-        if not basket:
-            # save an empty cart in the session
-            basket = self.session[settings.CART_SESSION_ID] = {}
-        self.basket = basket
+        # Пустая корзина попадает в сессию только при первом изменении (save)
+        self.basket = self.session.get(settings.CART_SESSION_ID) or {}
 
     def add(self, product, quantity=1, update_quantity=False):
         """
@@ -22,14 +22,53 @@ class BasketSession(object):
         """
         product_id = str(product.id)
         if product_id not in self.basket:
-            self.basket[product_id] = {'quantity': 0,
-                                    'price': str(product.price)}
+            # Цена не хранится: она берётся из каталога (basket.pricing)
+            self.basket[product_id] = {'quantity': 0}
         if update_quantity:
             self.basket[product_id]['quantity'] = quantity
         else:
             self.basket[product_id]['quantity'] += quantity
         self.save()
 
+    def set(self, product, quantity):
+        """
+        Установить количество продукта, 0 — убрать его из корзины.
+        """
+        if quantity:
+            self.add(product, quantity=quantity, update_quantity=True)
+        else:
+            self.basket.pop(str(product.id), None)
+            self.save()
+
+    def replace(self, counts):
+        """
+        Заменить содержимое корзины количествами {id товара: количество}.
+        """
+        self.basket = {
+            str(product_id): {'quantity': quantity}
+            for product_id, quantity in counts.items()
+            if quantity
+        }
+        self.save()
+
+    def counts(self):
+        """Количества товаров по их id"""
+        return {
+            int(product_id): item['quantity']
+            for product_id, item in self.basket.items()
+        }
+
+    def clear(self):
+        """
+        Очистить корзину.
+        """
+        self.basket = {}
+        self.save()
+
+    def write(self, response):
+        # Сессию сохраняет SessionMiddleware
+        pass
+
     def save(self):
         # Обновление сессии basket
         self.session[settings.CART_SESSION_ID] = self.basket
@@ -38,10 +77,15 @@ class BasketSession(object):
 
     def remove(self, product, quantity):
         """
-        Удаление товара из корзины.
+        Удаление товара из корзины, строка удаляется вместе с последней единицей.
+
+        ValueError, если товара в корзине меньше, чем нужно убрать.
         """
         product_id = str(product.id)
-        if self.basket[product_id]['quantity'] == 1:
+        current = self.basket.get(product_id, {'quantity': 0})['quantity']
+        if quantity > current:
+            raise ValueError("Количество для удаления больше, чем в корзине.")
+        if quantity == current:
             del self.basket[product_id]
         else:
             self.basket[product_id]['quantity'] -= quantity
@@ -49,16 +93,108 @@ class BasketSession(object):
 
     def __iter__(self):
         """
-        Перебор элементов в корзине и получение продуктов из базы данных.
+        Перебор элементов корзины с товарами и действующими ценами.
+
+        Товары с ценами загружаются одним запросом, корзина не изменяется.
         """
-        product_ids = self.basket.keys()
-        # получение объектов product и добавление их в корзину
-        products = Product.objects.filter(id__in=product_ids)
+        quantities = self.counts()
+        products = with_current_price(Product.objects.filter(id__in=quantities))
         for product in products:
-            self.basket[str(product.id)]['product'] = product
+            quantity = quantities[product.id]
+            yield {
+                'product': product,
+                'quantity': quantity,
+                'price': product.actual_price,
+                'total_price': product.actual_price * quantity,
+            }
+
+
+class CookieBasket(BasketSession):
+    """
+    Корзина анонимного пользователя в подписанной cookie (BASKET_STORAGE = "cookie")
+
+    В cookie хранятся только пары (id товара, количество), цены всегда берутся
+    из каталога, поэтому на сервере корзина не хранится вовсе. Число позиций
+    ограничено BASKET_COOKIE_MAX_ITEMS, чтобы cookie не превышала лимит браузера.
+    Повреждённая или подделанная cookie читается как пустая корзина.
+    """
+
+    def __init__(self, request):
+        self.modified = False
+        self.basket = {
+            str(product_id): {"quantity": quantity}
+            for product_id, quantity in self.decode(
+                request.COOKIES.get(settings.BASKET_COOKIE_NAME)
+            )
+        }
+
+    @staticmethod
+    def decode(value):
+        if not value:
+            return []
+        try:
+            pairs = signing.loads(value, salt=BASKET_COOKIE_SALT)
+        except signing.BadSignature:
+            return []
+        if not isinstance(pairs, list):
+            return []
+        # Некорректные пары отбрасываются, остальная корзина сохраняется
+        pairs = [
+            pair
+            for pair in pairs
+            if isinstance(pair, list)
+            and len(pair) == 2
+            and all(isinstance(number, int) and number > 0 for number in pair)
+        ]
+        return pairs[: settings.BASKET_COOKIE_MAX_ITEMS]
+
+    def encode(self) -> str:
+        pairs = [
+            [int(product_id), item["quantity"]]
+            for product_id, item in self.basket.items()
+        ]
+        return signing.dumps(pairs, salt=BASKET_COOKIE_SALT, compress=True)
 
-        for item in self.basket.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
-            
\ No newline at end of file
+    def add(self, product, quantity=1, update_quantity=False):
+        if (
+            str(product.id) not in self.basket
+            and len(self.basket) >= settings.BASKET_COOKIE_MAX_ITEMS
+        ):
+            raise ValueError("В корзине слишком много разных товаров.")
+        super().add(product, quantity=quantity, update_quantity=update_quantity)
+
+    def replace(self, counts):
+        # Лимит проверяется до изменения: корзина меняется целиком или никак
+        if len(counts) > settings.BASKET_COOKIE_MAX_ITEMS:
+            raise ValueError("В корзине слишком много разных товаров.")
+        super().replace(counts)
+
+    def save(self):
+        self.modified = True
+
+    def write(self, response):
+        """Записывает изменённую корзину в cookie ответа"""
+        if not self.modified:
+            return
+        if not self.basket:
+            response.delete_cookie(settings.BASKET_COOKIE_NAME, samesite="Lax")
+            return
+        response.set_cookie(
+            settings.BASKET_COOKIE_NAME,
+            self.encode(),
+            max_age=settings.BASKET_COOKIE_AGE,
+            httponly=True,
+            samesite="Lax",
+        )
+
+
+def get_anonymous_basket(request):
+    """Корзина анонимного пользователя согласно BASKET_STORAGE, одна на запрос"""
+    # Корзина хранится на HttpRequest, где её найдёт BasketCookieMiddleware
+    request = getattr(request, "_request", request)
+    if not hasattr(request, "_anonymous_basket"):
+        if getattr(settings, "BASKET_STORAGE", "session") == "cookie":
+            request._anonymous_basket = CookieBasket(request)
+        else:
+            request._anonymous_basket = BasketSession(request)
+    return request._anonymous_basket
@@ -0,0 +1,147 @@
+"""
+Изменение количеств товаров в корзине пользователя
+
+Каждое изменение — условный UPDATE с F-выражением, без чтения строки перед
+записью: одновременные запросы не теряют обновлений, а блокировка записи
+SQLite берётся первым же оператором транзакции и держится минимально.
+Уникальность пары (корзина, товар) гарантирует ограничение в базе; если
+строку одновременно создали в другом запросе, вставка повторяется как UPDATE.
+"""
+
+from itertools import islice
+from typing import Dict, Iterable
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from catalog.models import Product
+
+from .models import BasketItem
+
+# Количество при слиянии корзин — SQL-выражение от количества в корзине
+# пользователя ({current}) и в анонимной корзине ({added})
+MERGE_POLICIES = {
+    "sum": "{current} + {added}",
+    "max": "CASE WHEN {added} > {current} THEN {added} ELSE {current} END",
+    "replace": "{added}",
+}
+MERGE_BATCH_SIZE = 500
+
+
+def upsert_item(basket_id: int, product_id: int, count: int, value) -> None:
+    # value — новое значение basket_count для существующей строки
+    items = BasketItem.objects.filter(basket_id=basket_id, product_id=product_id)
+    with transaction.atomic():
+        if items.update(basket_count=value):
+            return
+        try:
+            with transaction.atomic():
+                BasketItem.objects.create(
+                    basket_id=basket_id, product_id=product_id, basket_count=count
+                )
+        except IntegrityError:
+            items.update(basket_count=value)
+
+
+def add_item(basket_id: int, product_id: int, count: int) -> None:
+    """Добавляет count единиц товара, создавая строку при необходимости"""
+    upsert_item(basket_id, product_id, count, F("basket_count") + count)
+
+
+def set_item(basket_id: int, product_id: int, count: int) -> None:
+    """Устанавливает количество товара, 0 — убирает товар из корзины"""
+    if count:
+        upsert_item(basket_id, product_id, count, count)
+    else:
+        BasketItem.objects.filter(basket_id=basket_id, product_id=product_id).delete()
+
+
+def remove_item(basket_id: int, product_id: int, count: int) -> None:
+    """
+    Убирает count единиц товара, строка удаляется вместе с последней единицей.
+
+    ValueError, если товара в корзине меньше, чем нужно убрать.
+    """
+    items = BasketItem.objects.filter(basket_id=basket_id, product_id=product_id)
+    with transaction.atomic():
+        if items.filter(basket_count__gt=count).update(
+            basket_count=F("basket_count") - count
+        ):
+            return
+        deleted, _ = items.filter(basket_count=count).delete()
+        if not deleted:
+            raise ValueError("Количество для удаления больше, чем в корзине.")
+
+
+# Операции пакетного изменения корзины (BasketBatchView)
+OPERATIONS = {"add": add_item, "remove": remove_item, "set": set_item}
+
+
+def apply_operations(
+    counts: Dict[int, int], operations: Iterable[dict]
+) -> Dict[int, int]:
+    """
+    Количества после операций пакета для корзины без строк в базе (сессия).
+
+    Исходный словарь не меняется; ValueError — как у remove_item.
+    """
+    counts = dict(counts)
+    for operation in operations:
+        product_id, count = operation["id"], operation["count"]
+        current = counts.get(product_id, 0)
+        if operation["op"] == "add":
+            current += count
+        elif operation["op"] == "remove":
+            if count > current:
+                raise ValueError("Количество для удаления больше, чем в корзине.")
+            current -= count
+        else:
+            current = count
+        if current:
+            counts[product_id] = current
+        else:
+            counts.pop(product_id, None)
+    return counts
+
+
+def merge_items(basket_id: int, counts: Dict[int, int], policy: str = "sum") -> int:
+    """
+    Сливает количества counts в корзину, возвращает число слитых товаров.
+
+    Одна вставка INSERT ... SELECT с обновлением при конфликте по (корзина,
+    товар) на MERGE_BATCH_SIZE товаров. Новое количество считает база
+    выражением от текущего значения строки, поэтому одновременные add_item
+    не теряются, а транзакция начинается с записи. Удалённые из каталога
+    товары пропускаются. Правило policy — из MERGE_POLICIES.
+    """
+    quote = connection.ops.quote_name
+    table = quote(BasketItem._meta.db_table)
+    basket, product, count, date = map(
+        quote, ("basket_id", "product_id", "basket_count", "date")
+    )
+    value = MERGE_POLICIES[policy].format(
+        current=f"{table}.{count}", added=f"excluded.{count}"
+    )
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    product_ids = iter(counts)
+    merged = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        while batch := list(islice(product_ids, MERGE_BATCH_SIZE)):
+            cases = " ".join("WHEN %s THEN %s" for _ in batch)
+            placeholders = ", ".join("%s" for _ in batch)
+            cursor.execute(
+                f"INSERT INTO {table} ({basket}, {product}, {count}, {date}) "
+                f'SELECT %s, "id", CASE "id" {cases} END, %s '
+                f'FROM {quote(Product._meta.db_table)} WHERE "id" IN ({placeholders}) '
+                f"ON CONFLICT ({basket}, {product}) "
+                f"DO UPDATE SET {count} = {value}, {date} = excluded.{date}",
+                [
+                    basket_id,
+                    *(param for pk in batch for param in (pk, counts[pk])),
+                    now,
+                    *batch,
+                ],
+            )
+            merged += cursor.rowcount
+    return merged
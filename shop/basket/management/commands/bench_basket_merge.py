@@ -0,0 +1,96 @@
+import time
+from statistics import mean
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from basket.items import merge_items
+from basket.models import Basket, BasketItem
+from catalog.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает перенос анонимной корзины построчным get_or_create "
+        "и пакетным слиянием (merge_items)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lines", type=int, default=500, help="товаров в анонимной корзине"
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="повторов замера")
+
+    def handle(self, *args, **options):
+        # Все изменения откатываются
+        with transaction.atomic():
+            self.run(options["lines"], options["repeat"])
+            transaction.set_rollback(True)
+
+    def prepare(self, lines):
+        category = Category.objects.create(title="Бенчмарк")
+        products = Product.objects.bulk_create(
+            (
+                Product(
+                    category=category,
+                    title=f"Товар {index}",
+                    price=100,
+                    effective_price=100,
+                )
+                for index in range(lines)
+            ),
+            batch_size=1000,
+        )
+        user = User.objects.create_user(username="bench-basket-merge")
+        basket = Basket.objects.create(user=user)
+        counts = {product.pk: 2 for product in products}
+        return basket, counts
+
+    def reset(self, basket, counts):
+        # Половина товаров анонимной корзины уже есть в корзине пользователя
+        BasketItem.objects.filter(basket=basket).delete()
+        BasketItem.objects.bulk_create(
+            BasketItem(basket=basket, product_id=product_id, basket_count=1)
+            for product_id in list(counts)[::2]
+        )
+
+    def merge_by_line(self, basket, counts):
+        for product_id, count in counts.items():
+            item, created = BasketItem.objects.get_or_create(
+                basket=basket, product_id=product_id, defaults={"basket_count": count}
+            )
+            if not created:
+                item.basket_count += count
+                item.save()
+
+    def measure(self, merge, basket, counts, repeat):
+        times = []
+        for _ in range(repeat):
+            self.reset(basket, counts)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                merge(basket, counts)
+                times.append(time.perf_counter() - started)
+        return mean(times) * 1000, len(queries)
+
+    def run(self, lines, repeat):
+        basket, counts = self.prepare(lines)
+        by_line, by_line_queries = self.measure(
+            self.merge_by_line, basket, counts, repeat
+        )
+        batched, batched_queries = self.measure(
+            lambda basket, counts: merge_items(basket.pk, counts),
+            basket,
+            counts,
+            repeat,
+        )
+        self.stdout.write(f"Строк в корзине: {lines}")
+        self.stdout.write(
+            f"get_or_create: {by_line:.1f} мс, запросов {by_line_queries}"
+        )
+        self.stdout.write(
+            f"merge_items:   {batched:.1f} мс, запросов {batched_queries}"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ускорение: x{by_line / batched:.1f}"))
@@ -0,0 +1,12 @@
+class BasketCookieMiddleware:
+    """Записывает изменённую cookie-корзину анонимного пользователя в ответ"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        basket = getattr(request, "_anonymous_basket", None)
+        if basket is not None:
+            basket.write(response)
+        return response
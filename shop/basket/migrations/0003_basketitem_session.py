@@ -0,0 +1,30 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("basket", "0002_basketitem_basket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="basketitem",
+            name="session",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name="basketitem",
+            name="basket",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="basket_items",
+                to="basket.basket",
+            ),
+        ),
+    ]
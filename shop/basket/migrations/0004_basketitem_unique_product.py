@@ -0,0 +1,38 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    # Повторные строки одного товара в корзине объединяются в первую
+    BasketItem = apps.get_model("basket", "BasketItem")
+    duplicates = (
+        BasketItem.objects.filter(basket__isnull=False)
+        .values("basket_id", "product_id")
+        .annotate(rows=Count("id"), first_id=Min("id"), total=Sum("basket_count"))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        items = BasketItem.objects.filter(
+            basket_id=row["basket_id"], product_id=row["product_id"]
+        )
+        items.exclude(pk=row["first_id"]).delete()
+        items.update(basket_count=row["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("basket", "0003_basketitem_session"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="basketitem",
+            constraint=models.UniqueConstraint(
+                fields=("basket", "product"), name="unique_basket_product"
+            ),
+        ),
+    ]
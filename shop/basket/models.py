@@ -41,6 +41,11 @@ class BasketItem(models.Model):
     class Meta:
         verbose_name = "Товар в корзине"
         verbose_name_plural = "Товары в корзине"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["basket", "product"], name="unique_basket_product"
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.product}"
@@ -0,0 +1,47 @@
+"""
+Стоимость корзины по действующим ценам каталога
+
+Цены не хранятся в корзине (ни в сессии, ни в cookie, ни в BasketItem), а
+берутся из Product.effective_price с учётом скидок одним запросом на всю
+корзину. Подходит для корзины любого вида: на вход — количества по id товаров.
+"""
+
+from decimal import Decimal
+from typing import Dict
+
+from django.conf import settings
+
+from catalog.models import Product
+from catalog.pricing import with_current_price
+
+
+def price_basket(counts: Dict[int, int]) -> dict:
+    """
+    Цены и суммы строк (lines) и итоги корзины (totals).
+
+    Доставка бесплатна, если у всех товаров корзины бесплатная доставка
+    или сумма не меньше BASKET_FREE_DELIVERY_FROM. Удалённые из каталога
+    товары не учитываются.
+    """
+    products = with_current_price(Product.objects.filter(pk__in=list(counts)))
+    lines = {}
+    all_free = True
+    for product_id, price, free_delivery in products.values_list(
+        "pk", "actual_price", "freeDelivery"
+    ):
+        count = counts[product_id]
+        lines[product_id] = {"price": price, "count": count, "total": price * count}
+        all_free = all_free and free_delivery
+
+    subtotal = sum((line["total"] for line in lines.values()), Decimal(0))
+    free_delivery = bool(lines) and (
+        all_free or subtotal >= Decimal(settings.BASKET_FREE_DELIVERY_FROM)
+    )
+    return {
+        "lines": lines,
+        "totals": {
+            "count": sum(line["count"] for line in lines.values()),
+            "price": subtotal,
+            "freeDelivery": free_delivery,
+        },
+    }
@@ -1,61 +1,75 @@
+from typing import Dict, Iterable, List
+
 from rest_framework import serializers
-from catalog.serializers import ProductCatalogSerializer
-from catalog.models import Product
-
-
-class BasketSerializer(ProductCatalogSerializer):
-
-    count = serializers.SerializerMethodField()
-
-    def get_count(self, instance):
-        basket_items = self.context["basket_items"]
-        basket_item = basket_items.filter(product=instance).first()
-        return basket_item.basket_count if basket_item else 0
-
-    class Meta:
-        model = Product
-        fields = (
-            "id",
-            "title",
-            "description",
-            "category",
-            "freeDelivery",
-            "count",  # Поле count теперь берется из BasketItem
-            "price",
-            "date",
-            "images",
-            "tags",
-            "rating",
-            "reviews",
-        )
+
+from catalog.fragments import get_fragments
+
+from .basket import get_anonymous_basket
+from .models import BasketItem
+from .pricing import price_basket
 
 
-class BasketSerializerSession(ProductCatalogSerializer):
-
-    class Meta:
-        model = Product
-        fields = (
-            "id",
-            "title",
-            "description",
-            "category",
-            "freeDelivery",
-            "price",
-            "date",
-            "images",
-            "tags",
-            "rating",
-            "reviews",
+def get_basket_counts(request) -> Dict[int, int]:
+    """Количества товаров корзины пользователя или сессии одним запросом"""
+    if request.user.is_authenticated:
+        return dict(
+            BasketItem.objects.filter(basket__user=request.user).values_list(
+                "product_id", "basket_count"
+            )
         )
+    return get_anonymous_basket(request).counts()
+
+
+def serialize_basket(counts: Dict[int, int]) -> List[dict]:
+    """
+    Товары корзины в формате каталога.
+
+    Карточки берутся из кеша фрагментов, поле count заменяется количеством
+    товара в корзине. Число запросов не зависит от размера корзины: карточки
+    отсутствующих в кеше товаров строятся пакетно (catalog.fragments).
+    """
+    items = get_fragments(sorted(counts))
+    for item in items:
+        item["count"] = counts[item["id"]]
+    return items
+
+
+def serialize_priced_basket(counts: Dict[int, int]) -> dict:
+    """Товары корзины с суммами строк (total) и итоги корзины (basket.pricing)"""
+    pricing = price_basket(counts)
+    items = []
+    for item in serialize_basket(counts):
+        line = pricing["lines"].get(item["id"])
+        if line is not None:
+            item.update(price=line["price"], total=line["total"])
+            items.append(item)
+    return {"items": items, "totals": pricing["totals"]}
+
+
+def serialize_lines(counts: Dict[int, int], product_ids: Iterable[int]) -> List[dict]:
+    """Только указанные товары корзины; убранные из корзины — с count 0"""
+    items = get_fragments(sorted(set(product_ids)))
+    for item in items:
+        item["count"] = counts.get(item["id"], 0)
+    return items
+
+
+class BasketOperationSerializer(serializers.Serializer):
+    """Операция пакетного изменения корзины: add, remove или set количества"""
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
+    op = serializers.ChoiceField(choices=["add", "remove", "set"])
+    id = serializers.IntegerField()
+    count = serializers.IntegerField(min_value=0, default=1)
 
-        basket = self.context.get("basket")
+    def validate(self, attrs):
+        if attrs["op"] != "set" and attrs["count"] < 1:
+            raise serializers.ValidationError(
+                {"count": "Для add и remove количество должно быть не меньше 1."}
+            )
+        return attrs
 
-        if basket and str(instance.id) in basket:
-            representation["count"] = basket[str(instance.id)]["quantity"]
-        else:
-            representation["count"] = 0
 
-        return representation
+class BasketBatchSerializer(serializers.Serializer):
+    operations = BasketOperationSerializer(many=True, allow_empty=False, max_length=100)
+    # Вернуть только изменённые строки и итоги вместо всей корзины
+    delta = serializers.BooleanField(default=False)
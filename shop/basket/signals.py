@@ -0,0 +1,25 @@
+"""
+Обработчики сигналов корзины
+"""
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .basket import get_anonymous_basket
+from .items import merge_items
+from .models import Basket
+
+
+@receiver(user_logged_in)
+def merge_anonymous_basket(sender, request, user, **kwargs):
+    # Корзина, собранная до входа или регистрации, переносится в базу
+    if request is None:
+        return
+    anonymous = get_anonymous_basket(request)
+    counts = anonymous.counts()
+    if not counts:
+        return
+    basket, _ = Basket.objects.get_or_create(user=user)
+    merge_items(basket.pk, counts, settings.BASKET_MERGE_POLICY)
+    anonymous.clear()
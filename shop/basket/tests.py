@@ -1,3 +1,414 @@
-from django.test import TestCase
+import threading
+from copy import deepcopy
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.fragments import fragment_key
+from catalog.models import Category, Product, Sale
+from catalog.pricing import applied_schedule_date
+
+from .basket import BASKET_COOKIE_SALT, BasketSession, CookieBasket
+from .items import add_item, merge_items, remove_item
+from .models import Basket, BasketItem
+
+
+class BasketTestMixin:
+    """Общие данные тестов корзины и заказов: товары по 10 и покупатель"""
+
+    PRODUCTS = 30
+    # Дополнительные поля товаров, например остаток count
+    PRODUCT_FIELDS = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = cls.create_products(cls.PRODUCTS, **cls.PRODUCT_FIELDS)
+        cls.user = cls.create_buyer()
+        cls.basket = Basket.objects.create(user=cls.user)
+
+    def setUp(self):
+        # Кеш фрагментов и сессий переживает тесты
+        cache.clear()
+
+    @classmethod
+    def create_products(cls, number, **kwargs):
+        category = Category.objects.create(title="Канцтовары")
+        return Product.objects.bulk_create(
+            Product(
+                category=category,
+                title=f"Товар {index}",
+                price=Decimal(10),
+                effective_price=Decimal(10),
+                **kwargs,
+            )
+            for index in range(number)
+        )
+
+    @classmethod
+    def create_buyer(cls):
+        return User.objects.create_user(username="buyer", password="secret")
+
+
+class BasketViewTestCase(BasketTestMixin, TestCase):
+    def add(self, product, count):
+        return self.client.post(
+            reverse("basket:basket"),
+            {"id": product.pk, "count": count},
+            content_type="application/json",
+        )
+
+    def assertBasket(self, response, expected):
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data], expected
+        )
+        self.assertTrue(all(item["price"] == Decimal(10) for item in response.data))
+
+    def test_session_basket(self):
+        first, second = self.products[:2]
+        self.add(second, 2)
+        response = self.add(first, 1)
+        self.assertBasket(response, [(first.pk, 1), (second.pk, 2)])
+
+    @override_settings(BASKET_STORAGE="cookie", BASKET_COOKIE_MAX_ITEMS=2)
+    def test_cookie_basket(self):
+        first, second, third = self.products[:3]
+        self.add(second, 2)
+        response = self.add(first, 1)
+        self.assertBasket(response, [(first.pk, 1), (second.pk, 2)])
+        self.assertIn("basket", response.cookies)
+        # Сессия не создаётся: корзина целиком в подписанной cookie
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("basket:basket"))
+        self.assertBasket(response, [(first.pk, 1), (second.pk, 2)])
+        self.assertNotIn("basket", response.cookies)
+
+        self.assertEqual(self.add(third, 1).status_code, 400)
+
+        self.client.cookies["basket"] = self.client.cookies["basket"].value + "x"
+        self.assertBasket(self.client.get(reverse("basket:basket")), [])
+
+    @override_settings(BASKET_STORAGE="cookie")
+    def test_cookie_basket_remove(self):
+        first, second = self.products[:2]
+        self.add(first, 2)
+        self.add(second, 1)
+
+        response = self.client.delete(
+            reverse("basket:basket"),
+            {"id": first.pk, "count": 3},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete(
+            reverse("basket:basket"),
+            {"id": first.pk, "count": 2},
+            content_type="application/json",
+        )
+        self.assertBasket(response, [(second.pk, 1)])
+        self.assertBasket(self.client.get(reverse("basket:basket")), [(second.pk, 1)])
+
+    def test_cookie_decode_skips_invalid_pairs(self):
+        value = signing.dumps(
+            [[self.products[0].pk, 2], [self.products[1].pk, 0], "x"],
+            salt=BASKET_COOKIE_SALT,
+            compress=True,
+        )
+        self.assertEqual(CookieBasket.decode(value), [[self.products[0].pk, 2]])
+
+    @override_settings(BASKET_FREE_DELIVERY_FROM=100)
+    def test_totals_use_current_prices(self):
+        first, second = self.products[:2]
+        self.add(first, 3)
+        self.add(second, 2)
+        today = timezone.now().date()
+        Sale.objects.create(
+            product=second, salePrice=Decimal(4), dateFrom=today, dateTo=today
+        )
+
+        response = self.client.get(reverse("basket:basket"), {"totals": 1})
+        self.assertEqual(
+            [
+                (item["id"], item["price"], item["total"])
+                for item in response.data["items"]
+            ],
+            [(first.pk, Decimal(10), Decimal(30)), (second.pk, Decimal(4), Decimal(8))],
+        )
+        self.assertEqual(
+            response.data["totals"],
+            {"count": 5, "price": Decimal(38), "freeDelivery": False},
+        )
+
+        self.add(first, 7)
+        response = self.client.get(reverse("basket:basket"), {"totals": 1})
+        self.assertEqual(response.data["totals"]["price"], Decimal(108))
+        self.assertTrue(response.data["totals"]["freeDelivery"])
+
+    def test_session_iteration_uses_current_prices(self):
+        first, second = self.products[:2]
+        self.add(first, 3)
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        basket = BasketSession(request)
+        stored = deepcopy(basket.basket)
+        with self.assertNumQueries(1):
+            items = list(basket)
+        self.assertEqual(
+            [(item["product"], item["total_price"]) for item in items],
+            [(first, Decimal(30))],
+        )
+        self.assertEqual(basket.basket, stored)
+
+    def test_user_basket(self):
+        self.client.force_login(self.user)
+        first, second = self.products[:2]
+        self.add(second, 2)
+        response = self.add(first, 1)
+        self.assertEqual(response.status_code, 201)
+        self.assertBasket(response, [(first.pk, 1), (second.pk, 2)])
+
+        response = self.client.delete(
+            reverse("basket:basket"),
+            {"id": second.pk, "count": 1},
+            content_type="application/json",
+        )
+        self.assertBasket(response, [(first.pk, 1), (second.pk, 1)])
+        self.assertBasket(
+            self.client.get(reverse("basket:basket")), [(first.pk, 1), (second.pk, 1)]
+        )
+
+    def fill_basket(self, size):
+        BasketItem.objects.all().delete()
+        basket, _ = Basket.objects.get_or_create(user=self.user)
+        BasketItem.objects.bulk_create(
+            BasketItem(basket=basket, product=product, basket_count=2)
+            for product in self.products[:size]
+        )
+
+    def test_query_count_does_not_depend_on_basket_size(self):
+        # Пользователь сессии, количества корзины и, если карточек нет в кеше,
+        # товары с изображениями и тегами
+        self.client.force_login(self.user)
+        applied_schedule_date()
+        for size in (2, 25):
+            self.fill_basket(size)
+            cache.delete_many(fragment_key(product.pk) for product in self.products)
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse("basket:basket"))
+            self.assertEqual(len(response.data), size)
+            with self.assertNumQueries(2):
+                self.client.get(reverse("basket:basket"))
+
+
+class BasketConcurrencyTestCase(BasketTestMixin, TransactionTestCase):
+    THREADS = 8
+    ADDS = 25
+
+    def setUp(self):
+        super().setUp()
+        (self.product,) = self.create_products(1)
+        self.basket = Basket.objects.create(user=self.create_buyer())
+
+    def run_threads(self, target):
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(self.ADDS):
+                    target()
+            except Exception as error:  # noqa: BLE001 - ошибка проверяется в тесте
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_adds_and_removes_are_not_lost(self):
+        self.run_threads(lambda: add_item(self.basket.pk, self.product.pk, 2))
+        item = BasketItem.objects.get(basket=self.basket)
+        self.assertEqual(item.basket_count, self.THREADS * self.ADDS * 2)
+
+        self.run_threads(lambda: remove_item(self.basket.pk, self.product.pk, 1))
+        item.refresh_from_db()
+        self.assertEqual(item.basket_count, self.THREADS * self.ADDS)
+
+    def test_concurrent_merges_and_adds_are_not_lost(self):
+        def add_and_merge():
+            add_item(self.basket.pk, self.product.pk, 1)
+            merge_items(self.basket.pk, {self.product.pk: 1})
+
+        self.run_threads(add_and_merge)
+        item = BasketItem.objects.get(basket=self.basket)
+        self.assertEqual(item.basket_count, self.THREADS * self.ADDS * 2)
+
+
+class BasketBatchTestCase(BasketTestMixin, TestCase):
+    PRODUCTS = 3
+
+    def batch(self, operations, **extra):
+        return self.client.post(
+            reverse("basket:basket_batch"),
+            {"operations": operations, **extra},
+            content_type="application/json",
+        )
+
+    def check_batch(self):
+        first, second, third = self.products
+        response = self.batch(
+            [
+                {"op": "add", "id": first.pk, "count": 3},
+                {"op": "add", "id": second.pk},
+                {"op": "remove", "id": first.pk, "count": 1},
+                {"op": "set", "id": third.pk, "count": 5},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data],
+            [(first.pk, 2), (second.pk, 1), (third.pk, 5)],
+        )
+
+        response = self.batch(
+            [
+                {"op": "set", "id": second.pk, "count": 0},
+                {"op": "add", "id": third.pk, "count": 1},
+            ],
+            delta=True,
+        )
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data["items"]],
+            [(second.pk, 0), (third.pk, 6)],
+        )
+        self.assertEqual(
+            response.data["totals"],
+            {"count": 8, "price": Decimal(80), "freeDelivery": False},
+        )
+
+        # Ошибка в любой операции отменяет весь пакет
+        response = self.batch(
+            [
+                {"op": "add", "id": first.pk, "count": 1},
+                {"op": "remove", "id": second.pk, "count": 1},
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("basket:basket"))
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data],
+            [(first.pk, 2), (third.pk, 6)],
+        )
+
+    def test_session_batch(self):
+        self.check_batch()
+
+    def test_user_batch(self):
+        self.client.force_login(self.user)
+        self.check_batch()
+
+    @override_settings(BASKET_STORAGE="cookie", BASKET_COOKIE_MAX_ITEMS=2)
+    def test_cookie_batch_over_limit_keeps_basket(self):
+        first, second, third = self.products
+        self.batch([{"op": "add", "id": first.pk, "count": 2}])
+        response = self.batch(
+            [
+                {"op": "remove", "id": first.pk, "count": 1},
+                {"op": "add", "id": second.pk},
+                {"op": "add", "id": third.pk},
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("basket", response.cookies)
+        response = self.client.get(reverse("basket:basket"))
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data], [(first.pk, 2)]
+        )
+
+    def test_invalid_operations(self):
+        for operations in (
+            [],
+            [{"op": "move", "id": self.products[0].pk}],
+            [{"op": "add", "id": self.products[0].pk, "count": 0}],
+            [{"op": "add", "id": 0}],
+        ):
+            self.assertEqual(self.batch(operations).status_code, 400, operations)
+
+
+class BasketMergeTestCase(BasketTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        first, second = self.products[:2]
+        BasketItem.objects.create(basket=self.basket, product=first, basket_count=3)
+        for product, count in ((first, 2), (second, 1)):
+            self.client.post(
+                reverse("basket:basket"),
+                {"id": product.pk, "count": count},
+                content_type="application/json",
+            )
+
+    def sign_in(self):
+        response = self.client.post(
+            reverse("users:post_sign_in"),
+            {"username": "buyer", "password": "secret"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def user_counts(self):
+        return dict(
+            BasketItem.objects.filter(basket=self.basket).values_list(
+                "product_id", "basket_count"
+            )
+        )
+
+    def test_merge_on_sign_in(self):
+        first, second = self.products[:2]
+        self.sign_in()
+        self.assertEqual(self.user_counts(), {first.pk: 5, second.pk: 1})
+        # Анонимная корзина очищена: повторный вход не удваивает количества
+        self.client.logout()
+        self.sign_in()
+        self.assertEqual(self.user_counts(), {first.pk: 5, second.pk: 1})
+
+    def test_merge_policies(self):
+        first, second = self.products[:2]
+        for policy, expected in (("max", 3), ("replace", 2)):
+            with self.subTest(policy=policy):
+                BasketItem.objects.filter(basket=self.basket, product=first).update(
+                    basket_count=3
+                )
+                merge_items(self.basket.pk, {first.pk: 2, second.pk: 1}, policy)
+                self.assertEqual(self.user_counts(), {first.pk: expected, second.pk: 1})
+
+    @override_settings(BASKET_STORAGE="cookie")
+    def test_merge_cookie_basket(self):
+        first, second = self.products[:2]
+        self.client.cookies.clear()
+        self.client.post(
+            reverse("basket:basket"),
+            {"id": second.pk, "count": 4},
+            content_type="application/json",
+        )
+        response = self.sign_in()
+        self.assertEqual(response.cookies["basket"].value, "")
+        self.assertEqual(self.user_counts(), {first.pk: 3, second.pk: 4})
+
+    def test_merge_query_count_does_not_depend_on_size(self):
+        # Одна вставка с обновлением при конфликте (и точка сохранения)
+        for size in (2, 30):
+            counts = {product.pk: 1 for product in self.products[:size]}
+            with self.assertNumQueries(3):
+                self.assertEqual(merge_items(self.basket.pk, counts), size)
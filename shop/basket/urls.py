@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import BasketView
+from .views import BasketBatchView, BasketView
 
 app_name = "basket"
 
 urlpatterns = [
     path("api/basket", BasketView.as_view(), name="basket"),
+    path("api/basket/batch", BasketBatchView.as_view(), name="basket_batch"),
 ]
@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -8,35 +9,33 @@ from catalog.models import Product
 # from catalog.serializers import ProductCatalogSerializer
 
 # from catalog.serializers import ProductSerializer
-from .models import Basket, BasketItem
-from .serializers import BasketSerializer, BasketSerializerSession
-from .basket import BasketSession
+from .items import OPERATIONS, add_item, apply_operations, remove_item
+from .models import Basket
+from .pricing import price_basket
+from .serializers import (
+    BasketBatchSerializer,
+    get_basket_counts,
+    serialize_basket,
+    serialize_lines,
+    serialize_priced_basket,
+)
+from .basket import get_anonymous_basket
 
 
 class BasketView(APIView):
 
-    def get_basket_products(self, user):
-        basket_items = BasketItem.objects.filter(basket__user=user)
-        if not basket_items:
-            return Product.objects.none()
-        return Product.objects.filter(id__in=basket_items.values("product_id"))
+    def basket_response(self, request, status_code=status.HTTP_200_OK):
+        # Общая сборка ответа для GET, POST и DELETE. С ?totals=1 вместо
+        # списка товаров — {"items": товары с суммами строк, "totals": итоги}
+        counts = get_basket_counts(request)
+        if request.query_params.get("totals") in ("1", "true"):
+            data = serialize_priced_basket(counts)
+        else:
+            data = serialize_basket(counts)
+        return Response(data, status=status_code)
 
     def get(self, request):
-        if request.user.is_authenticated:
-            products = self.get_basket_products(request.user)
-            basket_items = BasketItem.objects.filter(basket__user=request.user)
-            serializer = BasketSerializer(
-                products, many=True, context={"basket_items": basket_items}
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        else:
-            basket = BasketSession(request)
-            product_ids = list(basket.basket.keys())
-            products = Product.objects.filter(id__in=product_ids)
-            serializer = BasketSerializerSession(
-                products, many=True, context={"basket": basket.basket}
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.basket_response(request)
 
     def post(self, request):
         product_id = request.data.get("id")
@@ -44,30 +43,17 @@ class BasketView(APIView):
         product = Product.objects.get(id=product_id)
         if request.user.is_authenticated:
             basket, _ = Basket.objects.get_or_create(user=request.user)
-            basket_item, created = BasketItem.objects.get_or_create(
-                basket=basket, product=product
-            )
-            if not created:
-                basket_item.basket_count += count
-            else:
-                basket_item.basket_count = count
-
-            basket_item.save()
-            products = self.get_basket_products(request.user)
-            basket_items = BasketItem.objects.filter(basket__user=request.user)
-            serializer = BasketSerializer(
-                products, many=True, context={"basket_items": basket_items}
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            add_item(basket.pk, product.pk, count)
+            return self.basket_response(request, status.HTTP_201_CREATED)
         else:
-            basket = BasketSession(request)
-            basket.add(product, quantity=count)
-            product_ids = list(basket.basket.keys())
-            products = Product.objects.filter(id__in=product_ids)
-            serializer = BasketSerializerSession(
-                products, many=True, context={"basket": basket.basket}
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            basket = get_anonymous_basket(request)
+            try:
+                basket.add(product, quantity=count)
+            except ValueError as error:
+                return Response(
+                    {"error": str(error)}, status=status.HTTP_400_BAD_REQUEST
+                )
+            return self.basket_response(request)
 
     def delete(self, request):
         product_id = request.data.get("id")
@@ -75,31 +61,61 @@ class BasketView(APIView):
 
         if request.user.is_authenticated:
             basket = Basket.objects.get(user=request.user)
-            basket_item = BasketItem.objects.get(basket=basket, product__id=product_id)
-            if basket_item.basket_count > count:
-                basket_item.basket_count -= count
-                basket_item.save()
-            elif basket_item.basket_count == count:
-                basket_item.delete()
-            else:
+            try:
+                remove_item(basket.pk, product_id, count)
+            except ValueError as error:
                 return Response(
-                    {"error": "Количество для удаления больше, чем в корзине."},
-                    status=status.HTTP_400_BAD_REQUEST,
+                    {"error": str(error)}, status=status.HTTP_400_BAD_REQUEST
                 )
-
-            remaining_products = self.get_basket_products(request.user)
-            basket_items = BasketItem.objects.filter(basket__user=request.user)
-            serializer = BasketSerializer(
-                remaining_products, many=True, context={"basket_items": basket_items}
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.basket_response(request)
         else:
-            basket = BasketSession(request)
+            basket = get_anonymous_basket(request)
             product = Product.objects.get(id=product_id)
-            basket.remove(product, quantity=count)
-            product_ids = list(basket.basket.keys())
-            products = Product.objects.filter(id__in=product_ids)
-            serializer = BasketSerializerSession(
-                products, many=True, context={"basket": basket.basket}
+            try:
+                basket.remove(product, quantity=count)
+            except ValueError as error:
+                return Response(
+                    {"error": str(error)}, status=status.HTTP_400_BAD_REQUEST
+                )
+            return self.basket_response(request)
+
+
+class BasketBatchView(BasketView):
+    """Несколько изменений корзины одной транзакцией и одним ответом"""
+
+    http_method_names = ["post", "options"]
+
+    def post(self, request):
+        serializer = BasketBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data["operations"]
+        product_ids = {operation["id"] for operation in operations}
+        if Product.objects.filter(pk__in=product_ids).count() != len(product_ids):
+            return Response(
+                {"error": "Товар не найден."}, status=status.HTTP_400_BAD_REQUEST
             )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        try:
+            if request.user.is_authenticated:
+                basket, _ = Basket.objects.get_or_create(user=request.user)
+                with transaction.atomic():
+                    for operation in operations:
+                        OPERATIONS[operation["op"]](
+                            basket.pk, operation["id"], operation["count"]
+                        )
+            else:
+                # Корзина меняется, только если применимы все операции
+                counts = apply_operations(get_basket_counts(request), operations)
+                get_anonymous_basket(request).replace(counts)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not serializer.validated_data["delta"]:
+            return self.basket_response(request)
+        counts = get_basket_counts(request)
+        return Response(
+            {
+                "items": serialize_lines(counts, product_ids),
+                "totals": price_basket(counts)["totals"],
+            }
+        )
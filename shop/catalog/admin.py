@@ -22,6 +22,7 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = (
         "title",
         "parent",
+        "available_count",
     )
     inlines = [
         CategoryImagesInline,
@@ -44,8 +45,10 @@ class ProductAdmin(admin.ModelAdmin):
         "fullDescription",
         "freeDelivery",
         "rating",
+        "reviews_count",
         "limited",
     )
+    readonly_fields = ("rating",)
     inlines = [
         ProductImagesInline,
     ]
@@ -0,0 +1,122 @@
+"""
+Версионируемый кеш ответов каталога
+
+Ключ кеша включает счётчик версии каталога, который увеличивается сигналами
+при любом изменении товаров, скидок, тегов, изображений, отзывов и категорий.
+Инвалидация — один cache.incr: старые ключи больше не запрашиваются и истекают
+сами, перебирать их не нужно. В ключ также входят текущая дата (действующие
+скидки меняются по датам) и хост запроса (ссылки на изображения абсолютные).
+"""
+
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "catalog:version"
+CACHE_STATS_KEY = "catalog:cache_stats:{prefix}:{event}"
+# Ответы каталога и скидок, витрины главной страницы (catalog.shelves)
+CACHE_STATS_PREFIXES = ("catalog", "sales", "popular", "limited", "banners")
+
+
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version() -> None:
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Ключа нет (кеш очищен или ещё не создан) — начинаем новую версию
+        cache.add(CATALOG_VERSION_KEY, 1, None)
+        cache.incr(CATALOG_VERSION_KEY)
+
+
+def normalize_params(query_params) -> str:
+    """Параметры запроса в каноническом виде, независимом от их порядка"""
+    params = sorted(
+        (key, sorted(query_params.getlist(key))) for key in query_params.keys()
+    )
+    return json.dumps(params, ensure_ascii=False)
+
+
+def response_cache_key(prefix: str, request) -> str:
+    digest = hashlib.md5(
+        f"{request.scheme}://{request.get_host()}?"
+        f"{normalize_params(request.query_params)}".encode()
+    ).hexdigest()
+    return (
+        f"catalog:response:{prefix}:{get_catalog_version()}:"
+        f"{timezone.now().date()}:{digest}"
+    )
+
+
+def record_cache_event(prefix: str, event: str) -> None:
+    key = CACHE_STATS_KEY.format(prefix=prefix, event=event)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def is_shared_cache() -> bool:
+    """
+    Кеш общий для процессов: иначе версия каталога и счётчики статистики
+    у каждого процесса (веб-воркера, команды manage.py) свои
+    """
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def get_cache_stats() -> dict:
+    keys = {
+        (prefix, event): CACHE_STATS_KEY.format(prefix=prefix, event=event)
+        for prefix in CACHE_STATS_PREFIXES
+        for event in ("hits", "misses")
+    }
+    values = cache.get_many(keys.values())
+    stats = {}
+    for (prefix, event), key in keys.items():
+        stats.setdefault(prefix, {})[event] = values.get(key, 0)
+    return stats
+
+
+def reset_cache_stats() -> None:
+    cache.delete_many(
+        CACHE_STATS_KEY.format(prefix=prefix, event=event)
+        for prefix in CACHE_STATS_PREFIXES
+        for event in ("hits", "misses")
+    )
+
+
+def cached_response(prefix: str):
+    """Кеширует успешные ответы GET-обработчика APIView по параметрам запроса"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = response_cache_key(prefix, request)
+            data = cache.get(key)
+            if data is not None:
+                record_cache_event(prefix, "hits")
+                return Response(data)
+
+            record_cache_event(prefix, "misses")
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,215 @@
+"""
+Дерево категорий для /api/categories и индекс потомков категорий
+
+Дерево двухуровневое (вложенность ограничена в Category.save) и строится одним
+запросом по категориям с изображениями и словарю потомков. Готовая к отдаче структура хранится
+в кеше и сбрасывается сигналами при изменении категорий, их изображений и
+счётчиков доступных товаров.
+
+Category.available_count — число доступных товаров самой категории; счётчик
+поддерживается сигналами товаров, для массовых изменений есть команда
+rebuild_category_counts.
+
+Таблица CategoryClosure хранит все пары «предок — потомок» и обновляется при
+создании и переносе категории (удаление — каскадом). Словарь потомков строится
+по ней одним запросом и кешируется; фильтр каталога по category/subcategory,
+фасеты и дерево берут из него готовые списки id категорий.
+"""
+
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Category, CategoryClosure, Product
+from .serializers import CategoryImageSerializer
+
+CATEGORY_TREE_CACHE_KEY = "catalog:category_tree"
+CATEGORY_DESCENDANTS_CACHE_KEY = "catalog:category_descendants"
+
+
+def apply_category_delta(category_id: int, delta: int) -> None:
+    # Счётчик мог разойтись с таблицей после массовых операций без сигналов —
+    # не даём ему уйти в минус и сломать удаление товаров
+    Category.objects.filter(pk=category_id).update(
+        available_count=Greatest(F("available_count") + delta, 0)
+    )
+    invalidate_category_tree()
+
+
+def rebuild_category_counts() -> int:
+    """Пересчитывает счётчики по таблице товаров, возвращает число категорий"""
+    products = (
+        Product.objects.filter(category=OuterRef("pk"), available=True)
+        .order_by()
+        .values("category")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    updated = Category.objects.update(available_count=Coalesce(Subquery(products), 0))
+    invalidate_category_tree()
+    return updated
+
+
+def build_category_tree() -> List[dict]:
+    """
+    Категории верхнего уровня, у которых есть подкатегории и доступные товары,
+    с подкатегориями, в которых есть доступные товары
+    """
+    nodes, children = {}, {}
+    for category in Category.objects.select_related("image").order_by("id"):
+        image = getattr(category, "image", None)
+        nodes[category.pk] = {
+            "id": category.pk,
+            "title": category.title,
+            "image": CategoryImageSerializer(image).data if image else None,
+            "subcategories": [],
+            "available": category.available_count,
+            "parent": category.parent_id,
+        }
+        children.setdefault(category.parent_id, []).append(category.pk)
+
+    descendants = get_category_descendants()
+    tree = []
+    for root_id in children.get(None, []):
+        root = nodes[root_id]
+        subcategories = [nodes[pk] for pk in children.get(root_id, [])]
+        available = sum(nodes[pk]["available"] for pk in descendants.get(root_id, []))
+        if not subcategories or not available:
+            continue
+        root["subcategories"] = [node for node in subcategories if node["available"]]
+        tree.append(root)
+
+    for node in nodes.values():
+        del node["available"], node["parent"]
+    return tree
+
+
+def get_category_tree(request=None) -> List[dict]:
+    tree = cache.get(CATEGORY_TREE_CACHE_KEY)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(CATEGORY_TREE_CACHE_KEY, tree, settings.CATALOG_CACHE_TIMEOUT)
+
+    if request is not None:
+        # Ссылки на изображения хранятся относительными
+        for node in tree:
+            for category in (node, *node["subcategories"]):
+                if category["image"] and category["image"]["src"]:
+                    category["image"]["src"] = request.build_absolute_uri(
+                        category["image"]["src"]
+                    )
+    return tree
+
+
+def invalidate_category_tree() -> None:
+    cache.delete(CATEGORY_TREE_CACHE_KEY)
+
+
+def move_category(category_id: int, parent_id: Optional[int]) -> None:
+    """
+    Обновляет замыкание для новой или перенесённой категории: связи поддерева
+    с прежними предками удаляются, с предками нового родителя — добавляются
+    """
+    with transaction.atomic():
+        subtree = list(
+            CategoryClosure.objects.filter(ancestor_id=category_id).values_list(
+                "descendant_id", "depth"
+            )
+        )
+        if not subtree:
+            subtree = [(category_id, 0)]
+            CategoryClosure.objects.create(
+                ancestor_id=category_id, descendant_id=category_id, depth=0
+            )
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+        CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids
+        ).delete()
+        if parent_id is not None:
+            ancestors = CategoryClosure.objects.filter(
+                descendant_id=parent_id
+            ).values_list("ancestor_id", "depth")
+            CategoryClosure.objects.bulk_create(
+                CategoryClosure(
+                    ancestor_id=ancestor_id,
+                    descendant_id=descendant_id,
+                    depth=ancestor_depth + descendant_depth + 1,
+                )
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, descendant_depth in subtree
+            )
+    invalidate_category_descendants()
+
+
+def rebuild_category_closure() -> int:
+    """Перестраивает замыкание по полю parent, возвращает число связей"""
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth = category_id, 0
+        while ancestor_id is not None:
+            links.append(
+                CategoryClosure(
+                    ancestor_id=ancestor_id, descendant_id=category_id, depth=depth
+                )
+            )
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+    with transaction.atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(links)
+    invalidate_category_descendants()
+    return len(links)
+
+
+def get_category_descendants() -> Dict[int, List[int]]:
+    """id категории -> id всех её потомков, включая её саму"""
+    descendants = cache.get(CATEGORY_DESCENDANTS_CACHE_KEY)
+    if descendants is None:
+        descendants = {}
+        for ancestor_id, descendant_id in CategoryClosure.objects.order_by(
+            "ancestor_id", "depth", "descendant_id"
+        ).values_list("ancestor_id", "descendant_id"):
+            descendants.setdefault(ancestor_id, []).append(descendant_id)
+        cache.set(
+            CATEGORY_DESCENDANTS_CACHE_KEY, descendants, settings.CATALOG_CACHE_TIMEOUT
+        )
+    return descendants
+
+
+def get_category_ancestors() -> Dict[int, List[int]]:
+    """id категории -> id всех её предков, включая её саму"""
+    ancestors = {}
+    for ancestor_id, descendant_ids in get_category_descendants().items():
+        for descendant_id in descendant_ids:
+            ancestors.setdefault(descendant_id, []).append(ancestor_id)
+    return ancestors
+
+
+def category_filter_ids(category, subcategory) -> Optional[List[int]]:
+    """
+    id категорий для фильтра каталога по параметрам category и subcategory.
+
+    None — фильтра нет. Подкатегория сужает выборку до своего поддерева и должна
+    входить в category, если задано и то и другое.
+    """
+    if not category and not subcategory:
+        return None
+    descendants = get_category_descendants()
+    try:
+        category_ids = descendants.get(int(category), []) if category else None
+        subcategory_ids = descendants.get(int(subcategory), []) if subcategory else None
+    except ValueError:
+        return []
+    if subcategory_ids is None:
+        return category_ids
+    if category_ids is not None and int(subcategory) not in category_ids:
+        return []
+    return subcategory_ids
+
+
+def invalidate_category_descendants() -> None:
+    cache.delete_many([CATEGORY_DESCENDANTS_CACHE_KEY, CATEGORY_TREE_CACHE_KEY])
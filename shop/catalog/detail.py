@@ -0,0 +1,100 @@
+"""
+Кеш карточки товара для /api/product/<pk>/ и условные GET-запросы
+
+У каждого товара в кеше есть версия — время последнего изменения в
+микросекундах. Сигналы обновляют её при изменении товара, его изображений,
+тегов, характеристик, отзывов и скидок. По версии и текущей дате строятся
+ETag и Last-Modified, поэтому повторный запрос со страницы товара получает
+304 без обращения к базе, а собранный ответ хранится в кеше под версией.
+"""
+
+import hashlib
+import time
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .fragments import absolute_image_urls
+from .models import Product, Review
+from .pricing import with_current_price
+from .serializers import ProductSerializer
+
+PRODUCT_VERSION_KEY = "catalog:product_version:{product_id}"
+PRODUCT_DETAIL_KEY = "catalog:product_detail:{product_id}:{version}:{date}"
+
+
+def new_version() -> int:
+    return time.time_ns() // 1000
+
+
+def get_product_version(product_id: int) -> int:
+    key = PRODUCT_VERSION_KEY.format(product_id=product_id)
+    version = cache.get(key)
+    if version is None:
+        # Версия потеряна (кеш очищен или истёк срок) — считаем товар
+        # изменённым сейчас
+        cache.add(key, new_version(), settings.CATALOG_FRAGMENT_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_product_versions(product_ids: Optional[Iterable[int]] = None) -> None:
+    """Новая версия товаров; без аргументов — всего каталога"""
+    if product_ids is None:
+        product_ids = Product.objects.values_list("pk", flat=True)
+    version = new_version()
+    cache.set_many(
+        {
+            PRODUCT_VERSION_KEY.format(product_id=product_id): version
+            for product_id in product_ids
+        },
+        settings.CATALOG_FRAGMENT_TIMEOUT,
+    )
+
+
+def product_etag(product_id: int, version: int) -> str:
+    # Цена зависит от действующих скидок, поэтому дата входит в ETag
+    return hashlib.md5(
+        f"{product_id}:{version}:{timezone.now().date()}".encode()
+    ).hexdigest()
+
+
+def latest_reviews(reviews):
+    return reviews.select_related("author").order_by("-date", "-id")[
+        : settings.CATALOG_DETAIL_REVIEWS
+    ]
+
+
+def detail_queryset():
+    """Товар со всеми связанными данными карточки за фиксированное число запросов"""
+    return with_current_price(
+        Product.objects.prefetch_related(
+            "images",
+            "tags",
+            "specifications",
+            Prefetch(
+                "reviews",
+                queryset=latest_reviews(Review.objects.all()),
+                to_attr="latest_reviews",
+            ),
+        )
+    )
+
+
+def get_product_detail(product_id: int, version: int, request=None) -> Optional[dict]:
+    """Сериализованная карточка товара, None — товара нет"""
+    key = PRODUCT_DETAIL_KEY.format(
+        product_id=product_id, version=version, date=timezone.now().date()
+    )
+    data = cache.get(key)
+    if data is None:
+        product = detail_queryset().filter(pk=product_id).first()
+        if product is None:
+            return None
+        data = dict(ProductSerializer(product).data)
+        cache.set(key, data, settings.CATALOG_FRAGMENT_TIMEOUT)
+    data["images"] = absolute_image_urls(data["images"], request)
+    return data
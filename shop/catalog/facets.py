@@ -0,0 +1,412 @@
+"""
+Фасетный индекс каталога: битовые множества id товаров по значениям фасетов
+
+Для каждого тега, категории и флага доставки/наличия хранится битовая маска
+(Python int, бит N — товар с id N). Выборка по фильтрам ProductFilter
+собирается пересечением масок, счётчики фасетов — подсчётом единичных бит,
+без GROUP BY на каждый фасет. Из базы читаются только id товаров, найденных
+полнотекстовым поиском (filter[name]).
+
+Для цен товары упорядочены по цене и разбиты на корзины по PRICE_BUCKET_SIZE
+товаров с маской на каждую: фильтр по цене — объединение масок корзин внутри
+диапазона, минимальная и максимальная цена выборки — первая и последняя
+корзина, пересекающаяся с выборкой. Стоимость запроса зависит от числа
+корзин, а не перебирает товары выборки.
+
+Индекс хранится в памяти процесса, как и read-модель (catalog.readmodel):
+сигналы помечают изменённые товары, и перед следующим запросом перечитываются
+только они; изменения тегов и категорий перестраивают индекс целиком.
+Изменения из других процессов и массовые операции без сигналов подхватываются
+полной перестройкой раз в CATALOG_FACET_INDEX_TTL секунд и при смене даты.
+"""
+
+import copy
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .categories import category_filter_ids, get_category_ancestors
+from .models import Category, Product, Tag
+from .pricing import with_current_price
+from .search import build_match_query, search_filter
+
+PRICE_BUCKET_SIZE = 512
+# Больше изменённых товаров — дешевле перестроить индекс целиком
+REFRESH_LIMIT = 1000
+
+
+def to_bitmap(ids: Iterable[int]) -> int:
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray((max(ids) >> 3) + 1)
+    for product_id in ids:
+        buffer[product_id >> 3] |= 1 << (product_id & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def ids_filter(ids: List[int]) -> Q:
+    """
+    Условие id IN (...) для готового списка id.
+
+    В SQLite список передаётся одним JSON-параметром через json_each, чтобы
+    не упираться в лимит числа параметров запроса.
+    """
+    if connection.vendor != "sqlite":
+        return Q(id__in=ids)
+    return Q(id__in=RawSQL("SELECT value FROM json_each(%s)", (json.dumps(ids),)))
+
+
+def from_bitmap(bitmap: int) -> List[int]:
+    ids = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        while byte:
+            low_bit = byte & -byte
+            ids.append((index << 3) + low_bit.bit_length() - 1)
+            byte ^= low_bit
+    return ids
+
+
+def get_tag_filter(params):
+    """
+    id тегов из параметров tags[] и режим tagsMode: any (по умолчанию) —
+    товары с любым из тегов, all — со всеми
+    """
+    tag_ids = [int(tag_id) for tag_id in params.getlist("tags[]") if tag_id.isdigit()]
+    return tag_ids, params.get("tagsMode") == "all"
+
+
+def parse_price(value: Optional[str]) -> Optional[Decimal]:
+    """Граница фильтра по цене; ValueError для нечисловых значений"""
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+    if not price.is_finite():
+        raise ValueError(value)
+    return price
+
+
+def toggle(bitmap: int, bit: int, on: bool) -> int:
+    return bitmap | bit if on else bitmap & ~bit
+
+
+class FacetIndex:
+    def __init__(self):
+        # id товара -> (категория, бесплатная доставка, в наличии, цена)
+        self.rows: Dict[int, Tuple[int, bool, bool, Decimal]] = {}
+        self.product_tags: Dict[int, Tuple[int, ...]] = {}
+        self.products = 0
+        self.tags: Dict[int, int] = {}
+        self.tag_names: Dict[int, str] = {}
+        # Маска категории включает товары её подкатегорий
+        self.categories: Dict[int, int] = {}
+        self.category_titles: Dict[int, str] = {}
+        self.category_parents: Dict[int, Optional[int]] = {}
+        self.ancestors: Dict[int, List[int]] = {}
+        self.free_delivery = 0
+        self.available = 0
+        # id товаров по возрастанию (цена, id), цены в том же порядке и маски
+        # корзин по PRICE_BUCKET_SIZE товаров
+        self.price_order: List[int] = []
+        self.sorted_prices: List[Decimal] = []
+        self.price_buckets: List[int] = []
+
+    @staticmethod
+    def product_rows(product_ids=None):
+        products = Product.objects.order_by()
+        if product_ids is not None:
+            products = products.filter(pk__in=list(product_ids))
+        return {
+            product_id: row
+            for product_id, *row in with_current_price(products).values_list(
+                "id", "category_id", "freeDelivery", "available", "actual_price"
+            )
+        }
+
+    @staticmethod
+    def tag_links(product_ids=None):
+        links = Tag.products.through.objects.all()
+        if product_ids is not None:
+            links = links.filter(product_id__in=list(product_ids))
+        product_tags: Dict[int, List[int]] = {}
+        for tag_id, product_id in links.values_list("tag_id", "product_id"):
+            product_tags.setdefault(product_id, []).append(tag_id)
+        return {product_id: tuple(tags) for product_id, tags in product_tags.items()}
+
+    @classmethod
+    def build(cls) -> "FacetIndex":
+        index = cls()
+        for category_id, title, parent_id in Category.objects.values_list(
+            "id", "title", "parent_id"
+        ):
+            index.category_titles[category_id] = title
+            index.category_parents[category_id] = parent_id
+        index.ancestors = get_category_ancestors()
+        index.tag_names = dict(Tag.objects.values_list("id", "name"))
+        index.rows = {pk: tuple(row) for pk, row in cls.product_rows().items()}
+        index.product_tags = cls.tag_links()
+
+        category_ids: Dict[int, List[int]] = {}
+        tag_ids: Dict[int, List[int]] = {}
+        free_delivery, available = [], []
+        for product_id, (category_id, is_free, is_available, _) in index.rows.items():
+            for ancestor_id in index.ancestors.get(category_id, [category_id]):
+                category_ids.setdefault(ancestor_id, []).append(product_id)
+            for tag_id in index.product_tags.get(product_id, ()):
+                tag_ids.setdefault(tag_id, []).append(product_id)
+            if is_free:
+                free_delivery.append(product_id)
+            if is_available:
+                available.append(product_id)
+
+        index.products = to_bitmap(index.rows)
+        index.categories = {pk: to_bitmap(ids) for pk, ids in category_ids.items()}
+        index.tags = {pk: to_bitmap(ids) for pk, ids in tag_ids.items()}
+        index.free_delivery = to_bitmap(free_delivery)
+        index.available = to_bitmap(available)
+        index.build_prices()
+        return index
+
+    def build_prices(self) -> None:
+        rows = self.rows
+        self.price_order = sorted(rows, key=lambda pk: (rows[pk][3], pk))
+        self.sorted_prices = [rows[pk][3] for pk in self.price_order]
+        self.price_buckets = [
+            to_bitmap(self.price_order[start : start + PRICE_BUCKET_SIZE])
+            for start in range(0, len(self.price_order), PRICE_BUCKET_SIZE)
+        ]
+
+    def _toggle_product(self, product_id: int, on: bool) -> None:
+        bit = 1 << product_id
+        category_id, is_free, is_available, _ = self.rows[product_id]
+        self.products = toggle(self.products, bit, on)
+        for ancestor_id in self.ancestors.get(category_id, [category_id]):
+            self.categories[ancestor_id] = toggle(
+                self.categories.get(ancestor_id, 0), bit, on
+            )
+        for tag_id in self.product_tags.get(product_id, ()):
+            self.tags[tag_id] = toggle(self.tags.get(tag_id, 0), bit, on)
+        if is_free:
+            self.free_delivery = toggle(self.free_delivery, bit, on)
+        if is_available:
+            self.available = toggle(self.available, bit, on)
+
+    def refreshed(self, product_ids: Iterable[int]) -> "FacetIndex":
+        """
+        Копия индекса с перечитанными из базы товарами.
+
+        Индекс не изменяется: запросы, уже получившие его, дочитывают
+        согласованные данные.
+        """
+        product_ids = list(product_ids)
+        rows = self.product_rows(product_ids)
+        links = self.tag_links(product_ids)
+
+        index = copy.copy(self)
+        index.rows = dict(self.rows)
+        index.product_tags = dict(self.product_tags)
+        index.categories = dict(self.categories)
+        index.tags = dict(self.tags)
+        prices_changed = False
+        for product_id in product_ids:
+            previous = index.rows.get(product_id)
+            if previous is not None:
+                index._toggle_product(product_id, False)
+                del index.rows[product_id]
+                index.product_tags.pop(product_id, None)
+            row = rows.get(product_id)
+            if row is not None:
+                index.rows[product_id] = tuple(row)
+                if product_id in links:
+                    index.product_tags[product_id] = links[product_id]
+                index._toggle_product(product_id, True)
+            previous_price = previous[3] if previous else None
+            prices_changed |= previous_price != (row[3] if row else None)
+        if prices_changed:
+            index.build_prices()
+        return index
+
+    def price_bitmap(
+        self, min_price: Optional[Decimal], max_price: Optional[Decimal]
+    ) -> int:
+        """Маска товаров с ценой в диапазоне [min_price, max_price]"""
+        start = 0 if min_price is None else bisect_left(self.sorted_prices, min_price)
+        stop = len(self.price_order)
+        if max_price is not None:
+            stop = bisect_right(self.sorted_prices, max_price)
+        # Корзины целиком внутри диапазона — готовыми масками, края — по id
+        first = -(-start // PRICE_BUCKET_SIZE)
+        last = stop // PRICE_BUCKET_SIZE
+        if first >= last:
+            return to_bitmap(self.price_order[start:stop])
+        bitmap = to_bitmap(self.price_order[start : first * PRICE_BUCKET_SIZE])
+        bitmap |= to_bitmap(self.price_order[last * PRICE_BUCKET_SIZE : stop])
+        for bucket in self.price_buckets[first:last]:
+            bitmap |= bucket
+        return bitmap
+
+    def price_range(self, bitmap: int) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        """Минимальная и максимальная цена товаров выборки"""
+        if not bitmap:
+            return None, None
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+
+        def first_price(buckets):
+            for number in buckets:
+                if not bitmap & self.price_buckets[number]:
+                    continue
+                start = number * PRICE_BUCKET_SIZE
+                positions = range(start, start + PRICE_BUCKET_SIZE)
+                if buckets.step < 0:
+                    positions = reversed(positions)
+                for position in positions:
+                    if position >= len(self.price_order):
+                        continue
+                    product_id = self.price_order[position]
+                    byte = product_id >> 3
+                    if byte < len(data) and data[byte] >> (product_id & 7) & 1:
+                        return self.sorted_prices[position]
+            return None
+
+        count = len(self.price_buckets)
+        return first_price(range(count)), first_price(range(count - 1, -1, -1))
+
+    def select(self, params) -> Optional[int]:
+        """
+        Маска товаров, подходящих под параметры ProductFilter.
+
+        None — некорректный фильтр по цене.
+        """
+        bitmap = self.products
+        name = params.get("filter[name]")
+        if name:
+            if not build_match_query(name):
+                return 0
+            bitmap &= to_bitmap(
+                Product.objects.filter(search_filter(name)).values_list("id", flat=True)
+            )
+        try:
+            min_price = parse_price(params.get("filter[minPrice]"))
+            max_price = parse_price(params.get("filter[maxPrice]"))
+        except ValueError:
+            return None
+        if min_price is not None or max_price is not None:
+            bitmap &= self.price_bitmap(min_price, max_price)
+        if params.get("filter[freeDelivery]") == "true":
+            bitmap &= self.free_delivery
+        if params.get("filter[available]") == "true":
+            bitmap &= self.available
+        tag_ids, match_all_tags = get_tag_filter(params)
+        if tag_ids:
+            bitmap &= self.tagged(tag_ids, match_all_tags)
+        category_ids = category_filter_ids(
+            params.get("category"), params.get("subcategory")
+        )
+        if category_ids is not None:
+            categories = 0
+            for category_id in category_ids:
+                categories |= self.categories.get(category_id, 0)
+            bitmap &= categories
+        return bitmap
+
+    def subcategories(self, category_id: Optional[int]) -> List[int]:
+        return [
+            pk
+            for pk, parent_id in self.category_parents.items()
+            if parent_id == category_id
+        ]
+
+    def tagged(self, tag_ids: Iterable[int], match_all: bool = False) -> int:
+        """Маска товаров с любым из тегов или, при match_all, со всеми тегами"""
+        bitmaps = [self.tags.get(tag_id, 0) for tag_id in tag_ids]
+        if not bitmaps:
+            return self.products
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result & bitmap if match_all else result | bitmap
+        return result
+
+    def tag_counts(self, bitmap: int) -> List[dict]:
+        counts = [
+            {"id": tag_id, "name": self.tag_names[tag_id], "count": count}
+            for tag_id, tag_bitmap in self.tags.items()
+            if (count := (bitmap & tag_bitmap).bit_count())
+        ]
+        return sorted(counts, key=lambda item: (-item["count"], item["id"]))
+
+    def facets(self, bitmap: int, category_id: Optional[int] = None) -> dict:
+        """Счётчики всех фасетов для выборки, заданной маской bitmap"""
+        min_price, max_price = self.price_range(bitmap)
+        categories = [
+            {
+                "id": pk,
+                "title": self.category_titles[pk],
+                "count": (bitmap & self.categories.get(pk, 0)).bit_count(),
+            }
+            for pk in self.subcategories(category_id)
+        ]
+        return {
+            "total": bitmap.bit_count(),
+            "tags": self.tag_counts(bitmap),
+            "categories": [item for item in categories if item["count"]],
+            "price": {"min": min_price, "max": max_price},
+            "freeDelivery": (bitmap & self.free_delivery).bit_count(),
+            "available": (bitmap & self.available).bit_count(),
+        }
+
+
+class FacetIndexStore:
+    """Индекс процесса с обновлением по сигналам, см. описание модуля"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[FacetIndex] = None
+        self._dirty = set()
+        self._stale = True
+        self._loaded_at = 0.0
+        self._loaded_date = None
+
+    def mark_dirty(self, product_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._dirty.update(product_ids)
+
+    def mark_stale(self) -> None:
+        with self._lock:
+            self._stale = True
+
+    def get(self) -> FacetIndex:
+        with self._lock:
+            ttl = getattr(settings, "CATALOG_FACET_INDEX_TTL", 300)
+            expired = (
+                time.monotonic() - self._loaded_at > ttl
+                or self._loaded_date != timezone.now().date()
+            )
+            if self._stale or expired or len(self._dirty) > REFRESH_LIMIT:
+                self._index = FacetIndex.build()
+                self._stale = False
+                self._loaded_at = time.monotonic()
+                self._loaded_date = timezone.now().date()
+            elif self._dirty:
+                self._index = self._index.refreshed(self._dirty)
+            self._dirty.clear()
+            return self._index
+
+
+facet_index = FacetIndexStore()
+
+
+def get_facet_index() -> FacetIndex:
+    return facet_index.get()
@@ -1,7 +1,38 @@
-from django.db.models import QuerySet, Count, Q
+from django.db.models import QuerySet
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import BaseFilterBackend
 from rest_framework.request import Request
-from .models import Category
+from .categories import category_filter_ids
+from .facets import (
+    from_bitmap,
+    get_facet_index,
+    get_tag_filter,
+    ids_filter,
+    parse_price,
+)
+from .pricing import with_price_field
+from .search import is_supported as search_is_supported
+from .search import build_match_query, search_filter, with_search_rank
+
+# Порядок товаров для параметров sort/sortType. id — устойчивый второй ключ:
+# без него порядок товаров с одинаковым значением не определён, а keyset-пагинации
+# нужен строгий порядок
+SORT_ORDERINGS = {
+    ("price", "inc"): ("effective_price", "id"),
+    ("price", "dec"): ("-effective_price", "-id"),
+    ("date", "inc"): ("-date", "-id"),
+    ("date", "dec"): ("date", "id"),
+    ("reviews", "inc"): ("-reviews_count", "-id"),
+    ("reviews", "dec"): ("reviews_count", "id"),
+    ("rating", "inc"): ("-rating", "-id"),
+    ("rating", "dec"): ("rating", "id"),
+}
+DEFAULT_ORDERING = ("effective_price", "id")
+
+
+def get_ordering(ordering, sort_type):
+    return SORT_ORDERINGS.get((ordering, sort_type), DEFAULT_ORDERING)
+
 
 class ProductFilter(BaseFilterBackend):
     def filter_queryset(self, request: Request, queryset: QuerySet, view):
@@ -9,57 +40,49 @@ class ProductFilter(BaseFilterBackend):
         ordering = params.get("sort")
         sort_type = params.get("sortType")
         name = params.get("filter[name]")
-        min_price = params.get("filter[minPrice]")
-        max_price = params.get("filter[maxPrice]")
+        try:
+            min_price = parse_price(params.get("filter[minPrice]"))
+            max_price = parse_price(params.get("filter[maxPrice]"))
+        except ValueError:
+            # Тот же ответ, что у фасетов (CatalogFacetsView)
+            raise ValidationError({"error": "Некорректный фильтр по цене."})
         category = params.get("category")
         subcategory = params.get("subcategory")
         free_delivery = True if params.get("filter[freeDelivery]") == "true" else False
         available = True if params.get("filter[available]") == "true" else False
-        tags = params.get("tags[]")
+        tag_ids, match_all_tags = get_tag_filter(params)
 
         if name:
-            queryset = queryset.filter(title__icontains=name)
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+            if not build_match_query(name):
+                # В строке нет слов — искать нечего
+                return queryset.none().order_by(*get_ordering(ordering, sort_type))
+            queryset = queryset.filter(search_filter(name))
+        # До применения расписания скидок на сегодня цена считается подзапросом
+        queryset, price_field = with_price_field(queryset)
+        if min_price is not None:
+            queryset = queryset.filter(**{f"{price_field}__gte": min_price})
+        if max_price is not None:
+            queryset = queryset.filter(**{f"{price_field}__lte": max_price})
         if free_delivery:
             queryset = queryset.filter(freeDelivery=free_delivery)
         if available:
             queryset = queryset.filter(available=True)
-        if tags:
-            tags = list(tags)
-            queryset = queryset.filter(tags__in=tags)
-        if category:
-            # queryset = queryset.filter(category_id=category)
-            subcategories = Category.objects.filter(Q(id=category) | Q(parent=category))
-            queryset = queryset.filter(category__in=subcategories)
+        if tag_ids:
+            # Пересечение масок фасетного индекса вместо JOIN по тегам,
+            # который размножает строки товаров
+            bitmap = get_facet_index().tagged(tag_ids, match_all_tags)
+            queryset = queryset.filter(ids_filter(from_bitmap(bitmap)))
+        category_ids = category_filter_ids(category, subcategory)
+        if category_ids is not None:
+            # Категория вместе с подкатегориями — готовый список id из замыкания
+            queryset = queryset.filter(category_id__in=category_ids)
 
-
-        if ordering == "price" and sort_type == "inc":
-            queryset = queryset.order_by("price")
-        elif ordering == "price" and sort_type == "dec":
-            queryset = queryset.order_by("-price")
-        elif ordering == "date" and sort_type == "inc":
-            queryset = queryset.order_by("-date")
-        elif ordering == "date" and sort_type == "dec":
-            queryset = queryset.order_by("date")
-        elif ordering == "reviews" and sort_type == "inc":
-            queryset = queryset.annotate(reviews_count=Count("reviews")).order_by(
-                "-reviews_count"
-            )
-        elif ordering == "reviews" and sort_type == "dec":
-            queryset = queryset.annotate(reviews_count=Count("reviews")).order_by(
-                "reviews_count"
-            )
-        elif ordering == "rating" and sort_type == "inc":
-            queryset = queryset.annotate(orders_count=Count("reviews")).order_by(
-                "-orders_count"
-            )
-        elif ordering == "rating" and sort_type == "dec":
-            queryset = queryset.annotate(orders_count=Count("reviews")).order_by(
-                "orders_count"
+        if name and not ordering and search_is_supported():
+            # Без явной сортировки результаты поиска упорядочены по релевантности
+            return with_search_rank(queryset, name).order_by("search_rank", "id")
+        return queryset.order_by(
+            *(
+                field.replace("effective_price", price_field)
+                for field in get_ordering(ordering, sort_type)
             )
-        else:
-            queryset = queryset.order_by("price")
-        return queryset
+        )
@@ -0,0 +1,92 @@
+"""
+Кеш сериализованных карточек товаров (фрагментов)
+
+Фрагмент — вывод ProductCatalogSerializer для одного товара. Ответы каталога,
+популярных, лимитированных товаров, баннеров и корзины собираются из фрагментов
+одним cache.get_many; из базы загружаются и сериализуются только отсутствующие.
+Сигналы удаляют фрагмент изменённого товара, остальные остаются в кеше.
+
+Ключ включает текущую дату, так как цена зависит от действующих скидок.
+Ссылки на изображения хранятся относительными и дополняются хостом запроса
+при сборке ответа.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Product
+from .pricing import with_current_price
+from .serializers import ProductCatalogSerializer
+
+FRAGMENT_CACHE_KEY = "catalog:fragment:{date}:{product_id}"
+
+
+def fragment_key(product_id: int, date=None) -> str:
+    return FRAGMENT_CACHE_KEY.format(
+        date=date or timezone.now().date(), product_id=product_id
+    )
+
+
+def build_fragments(product_ids: Iterable[int]) -> Dict[int, dict]:
+    products = with_current_price(
+        Product.objects.filter(pk__in=list(product_ids)).prefetch_related(
+            "images", "tags"
+        )
+    )
+    serializer = ProductCatalogSerializer(products, many=True)
+    return {item["id"]: dict(item) for item in serializer.data}
+
+
+def get_fragments(product_ids: Iterable[int], request=None) -> List[dict]:
+    """
+    Фрагменты товаров в порядке product_ids.
+
+    Удалённые товары пропускаются. Каждый вызов возвращает новые словари,
+    их можно изменять.
+    """
+    product_ids = list(product_ids)
+    date = timezone.now().date()
+    keys = {product_id: fragment_key(product_id, date) for product_id in product_ids}
+    cached = cache.get_many(keys.values())
+    fragments = {
+        product_id: cached[key] for product_id, key in keys.items() if key in cached
+    }
+
+    missing = [product_id for product_id in keys if product_id not in fragments]
+    if missing:
+        built = build_fragments(missing)
+        cache.set_many(
+            {keys[product_id]: fragment for product_id, fragment in built.items()},
+            settings.CATALOG_FRAGMENT_TIMEOUT,
+        )
+        fragments.update(built)
+
+    result = []
+    for product_id in product_ids:
+        if product_id not in fragments:
+            continue
+        fragment = dict(fragments[product_id])
+        fragment["images"] = absolute_image_urls(fragment["images"], request)
+        result.append(fragment)
+    return result
+
+
+def absolute_image_urls(images: List[dict], request=None) -> List[dict]:
+    """Копии изображений со ссылками, дополненными хостом запроса"""
+    images = [dict(image) for image in images]
+    if request is not None:
+        for image in images:
+            if image["src"]:
+                image["src"] = request.build_absolute_uri(image["src"])
+    return images
+
+
+def invalidate_fragments(product_ids: Optional[Iterable[int]] = None) -> None:
+    """Удаляет фрагменты товаров; без аргументов — всего каталога"""
+    if product_ids is None:
+        product_ids = Product.objects.values_list("pk", flat=True)
+    date = timezone.now().date()
+    cache.delete_many([fragment_key(product_id, date) for product_id in product_ids])
@@ -0,0 +1,44 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from catalog.pricing import apply_sale_schedule
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновляет действующие цены товаров, скидки которых начались или закончились. "
+        "Запускается по расписанию после полуночи или постоянно с --loop: "
+        "до применения расписания каталог считает цены подзапросом"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=date.fromisoformat,
+            help="дата в формате ГГГГ-ММ-ДД, по умолчанию — сегодня",
+        )
+        parser.add_argument(
+            "--full", action="store_true", help="пересчитать цены всего каталога"
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="работать постоянно, применяя расписание при смене даты",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=60,
+            help="период проверки в режиме --loop, секунды",
+        )
+
+    def handle(self, *args, **options):
+        self.report(apply_sale_schedule(options["date"], full=options["full"]))
+        while options["loop"]:
+            time.sleep(options["interval"])
+            self.report(apply_sale_schedule())
+
+    def report(self, updated):
+        self.stdout.write(f"Пересчитано цен: {updated}")
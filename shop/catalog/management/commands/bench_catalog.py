@@ -0,0 +1,106 @@
+import itertools
+import time
+from statistics import mean
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.http import QueryDict
+
+from catalog.filters import SORT_ORDERINGS, ProductFilter
+from catalog.models import Category, Product
+from catalog.readmodel import CatalogReadModel, np
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает фильтрацию и сортировку каталога через ORM "
+        "и через колоночную read-модель"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="повторов каждого запроса"
+        )
+        parser.add_argument(
+            "--synthetic",
+            type=int,
+            default=0,
+            help="добавить N синтетических товаров (изменения откатываются)",
+        )
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("Для read-модели нужен numpy")
+
+        with transaction.atomic():
+            if options["synthetic"]:
+                self.create_products(options["synthetic"])
+            self.run(options["repeat"])
+            transaction.set_rollback(True)
+
+    def create_products(self, count):
+        category = Category.objects.order_by("id").first()
+        if category is None:
+            category = Category.objects.create(title="Бенчмарк")
+        Product.objects.bulk_create(
+            (
+                Product(
+                    category=category,
+                    title=f"Товар {index}",
+                    price=100 + index % 5000,
+                    effective_price=100 + index % 5000,
+                    rating=index % 500 / 100,
+                    reviews_count=index % 97,
+                    freeDelivery=index % 3 == 0,
+                )
+                for index in range(count)
+            ),
+            batch_size=1000,
+        )
+
+    def get_queries(self):
+        category = Category.objects.filter(parent=None).values_list("id", flat=True)
+        filters = [
+            {},
+            {"filter[minPrice]": "500", "filter[maxPrice]": "3000"},
+            {"filter[freeDelivery]": "true", "filter[available]": "true"},
+        ]
+        if category:
+            filters.append({"category": str(category[0])})
+        for (sort, sort_type), params in itertools.product(SORT_ORDERINGS, filters):
+            query = QueryDict(mutable=True)
+            query.update({"sort": sort, "sortType": sort_type, **params})
+            yield query
+
+    def run(self, repeat):
+        model = CatalogReadModel()
+        started = time.perf_counter()
+        model.load()
+        self.stdout.write(
+            f"Товаров: {len(model.ids)}, построение модели: "
+            f"{(time.perf_counter() - started) * 1000:.1f} мс"
+        )
+
+        orm_times, model_times = [], []
+        for query in self.get_queries():
+            request = type("Request", (), {"query_params": query})()
+            for _ in range(repeat):
+                # ORM: как CatalogPagination — COUNT(*) и первая страница id
+                started = time.perf_counter()
+                queryset = ProductFilter().filter_queryset(
+                    request, Product.objects.all(), None
+                )
+                queryset.count()
+                list(queryset.values_list("id", flat=True)[:20])
+                orm_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                ids = model.query(query)
+                len(ids)
+                ids[:20].tolist()
+                model_times.append(time.perf_counter() - started)
+
+        orm, vectorized = mean(orm_times) * 1000, mean(model_times) * 1000
+        self.stdout.write(f"ORM:        {orm:.3f} мс на запрос")
+        self.stdout.write(f"Read-модель: {vectorized:.3f} мс на запрос")
+        self.stdout.write(self.style.SUCCESS(f"Ускорение: x{orm / vectorized:.1f}"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.cache import (
+    get_cache_stats,
+    get_catalog_version,
+    is_shared_cache,
+    reset_cache_stats,
+)
+
+
+class Command(BaseCommand):
+    help = "Показывает статистику попаданий в кеш ответов каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="обнулить счётчики после вывода"
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            # Команда видела бы только свой пустой кеш, а не кеш веб-процессов
+            raise CommandError(
+                "Кеш хранится в памяти процесса. Статистику веб-процесса "
+                "отдаёт администратору GET /api/catalog/cache-stats."
+            )
+        self.stdout.write(f"Версия каталога: {get_catalog_version()}")
+        for prefix, stats in get_cache_stats().items():
+            total = stats["hits"] + stats["misses"]
+            ratio = stats["hits"] / total * 100 if total else 0
+            self.stdout.write(
+                f"{prefix}: попаданий {stats['hits']}, промахов {stats['misses']}"
+                f" ({ratio:.1f}% попаданий)"
+            )
+        if options["reset"]:
+            reset_cache_stats()
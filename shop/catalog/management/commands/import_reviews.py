@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.reviews import import_reviews
+from catalog.serializers import ReviewImportSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует отзывы из JSON-файла: список объектов с полями product, "
+        "author, email, text, rate (подходит и формат фикстур)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="путь к JSON-файлу")
+
+    def handle(self, *args, **options):
+        with open(options["path"], encoding="utf-8") as file:
+            rows = json.load(file)
+        # Фикстуры хранят поля модели во вложенном объекте fields
+        rows = [row.get("fields", row) for row in rows]
+
+        serializer = ReviewImportSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            errors = [
+                f"{index}: {error}"
+                for index, error in enumerate(serializer.errors)
+                if error
+            ]
+            raise CommandError("Ошибки в строках:\n" + "\n".join(errors))
+        try:
+            created, products = import_reviews(serializer.validated_data)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            self.style.SUCCESS(f"Импортировано отзывов: {created}, товаров: {products}")
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.categories import rebuild_category_closure
+
+
+class Command(BaseCommand):
+    help = "Перестраивает таблицу связей «предок — потомок» категорий"
+
+    def handle(self, *args, **options):
+        links = rebuild_category_closure()
+        self.stdout.write(self.style.SUCCESS(f"Связей категорий: {links}"))
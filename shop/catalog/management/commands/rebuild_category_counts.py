@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.categories import rebuild_category_counts
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает количество доступных товаров в категориях"
+
+    def handle(self, *args, **options):
+        updated = rebuild_category_counts()
+        self.stdout.write(self.style.SUCCESS(f"Обновлено категорий: {updated}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from catalog.stats import rebuild_review_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает количество отзывов и рейтинг товаров по таблице отзывов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "product_ids",
+            nargs="*",
+            type=int,
+            help="id товаров; по умолчанию пересчитывается весь каталог",
+        )
+
+    def handle(self, *args, **options):
+        updated = rebuild_review_stats(options["product_ids"] or None)
+        self.stdout.write(self.style.SUCCESS(f"Обновлено товаров: {updated}"))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.cache import is_shared_cache
+from catalog.shelves import refresh_shelves
+
+
+class Command(BaseCommand):
+    help = "Пересобирает витрины главной страницы (популярные, лимитированные, баннеры)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="работать постоянно, пересобирая устаревшие витрины",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=60,
+            help="период проверки в режиме --loop, секунды",
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            # Витрины попали бы в кеш самой команды; веб-процессы пересобирают
+            # их сами при первом запросе после изменения каталога
+            raise CommandError(
+                "Кеш хранится в памяти процесса, веб-процессы не увидят витрины. "
+                "Настройте общий кеш (CACHES) или не запускайте команду."
+            )
+        self.report(refresh_shelves())
+        while options["loop"]:
+            time.sleep(options["interval"])
+            self.report(refresh_shelves(force=False))
+
+    def report(self, refreshed):
+        for name, count in refreshed.items():
+            self.stdout.write(f"{name}: товаров {count}")
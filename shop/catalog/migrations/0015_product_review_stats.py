@@ -0,0 +1,61 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:34
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def fill_review_stats(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    Review = apps.get_model("catalog", "Review")
+    reviews = Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+    Product.objects.update(
+        reviews_count=Coalesce(
+            Subquery(reviews.annotate(total=Count("pk")).values("total")), 0
+        ),
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(total=Sum("rate")).values("total")), 0
+        ),
+    )
+    Product.objects.filter(reviews_count__gt=0).update(
+        rating=Round(Cast(F("rating_sum"), FloatField()) / F("reviews_count"), 2)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_alter_banner_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="Сумма оценок"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="reviews_count",
+            field=models.PositiveIntegerField(
+                db_index=True,
+                default=0,
+                editable=False,
+                verbose_name="Количество отзывов",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="rating",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0,
+                max_digits=3,
+                verbose_name="Рейтинг",
+            ),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
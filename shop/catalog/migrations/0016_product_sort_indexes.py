@@ -0,0 +1,31 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0015_product_review_stats"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="date",
+            field=models.DateTimeField(
+                auto_now_add=True, db_index=True, verbose_name="Дата"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="price",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0,
+                max_digits=8,
+                verbose_name="Цена",
+            ),
+        ),
+    ]
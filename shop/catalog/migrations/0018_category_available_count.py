@@ -0,0 +1,36 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_available_count(apps, schema_editor):
+    Category = apps.get_model("catalog", "Category")
+    Product = apps.get_model("catalog", "Product")
+    products = (
+        Product.objects.filter(category=OuterRef("pk"), available=True)
+        .order_by()
+        .values("category")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Category.objects.update(available_count=Coalesce(Subquery(products), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0017_product_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="available_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Доступных товаров"
+            ),
+        ),
+        migrations.RunPython(fill_available_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_category_closure(apps, schema_editor):
+    Category = apps.get_model("catalog", "Category")
+    CategoryClosure = apps.get_model("catalog", "CategoryClosure")
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth = category_id, 0
+        while ancestor_id is not None:
+            links.append(
+                CategoryClosure(
+                    ancestor_id=ancestor_id, descendant_id=category_id, depth=depth
+                )
+            )
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+    CategoryClosure.objects.bulk_create(links)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0018_category_available_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveSmallIntegerField(verbose_name="Глубина")),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="catalog.category",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="catalog.category",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Связь категорий",
+                "verbose_name_plural": "Связи категорий",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="categoryclosure",
+            constraint=models.UniqueConstraint(
+                fields=("ancestor", "descendant"), name="unique_category_closure"
+            ),
+        ),
+        migrations.RunPython(fill_category_closure, migrations.RunPython.noop),
+    ]
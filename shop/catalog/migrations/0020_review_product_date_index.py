@@ -0,0 +1,19 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0019_category_closure"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "date"], name="review_product_date_idx"
+            ),
+        ),
+    ]
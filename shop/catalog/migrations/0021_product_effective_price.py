@@ -0,0 +1,56 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:56
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def fill_effective_price(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    Sale = apps.get_model("catalog", "Sale")
+    today = timezone.now().date()
+    sales = Sale.objects.filter(
+        product=OuterRef("pk"), dateFrom__lte=today, dateTo__gte=today
+    ).order_by("salePrice", "id")
+    Product.objects.update(
+        active_sale=Subquery(sales.values("id")[:1]),
+        effective_price=Coalesce(Subquery(sales.values("salePrice")[:1]), "price"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0020_review_product_date_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="active_sale",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="catalog.sale",
+                verbose_name="Действующая скидка",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=8,
+                verbose_name="Действующая цена",
+            ),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+    ]
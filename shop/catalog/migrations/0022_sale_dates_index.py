@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0021_product_effective_price"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(fields=["dateFrom", "dateTo"], name="sale_dates_idx"),
+        ),
+    ]
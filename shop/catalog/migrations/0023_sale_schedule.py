@@ -0,0 +1,35 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0022_sale_dates_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SaleSchedule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "applied_date",
+                    models.DateField(null=True, verbose_name="Применено на дату"),
+                ),
+            ],
+            options={
+                "verbose_name": "Расписание скидок",
+                "verbose_name_plural": "Расписание скидок",
+            },
+        ),
+    ]
@@ -5,7 +5,15 @@
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
-from django.utils import timezone
+
+
+def fields_except(instance: models.Model, excluded) -> list:
+    """Поля модели для update_fields без денормализованных счётчиков"""
+    return [
+        field.name
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in excluded
+    ]
 
 
 class Category(models.Model):
@@ -24,6 +32,10 @@ class Category(models.Model):
         related_name="subcategories",
         verbose_name="Родительская категория",
     )
+    # Доступные товары самой категории, без подкатегорий (см. catalog.categories)
+    available_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Доступных товаров"
+    )
 
     class Meta:
         verbose_name = "Категория"
@@ -36,9 +48,41 @@ class Category(models.Model):
         # Проверяем уровень вложенности
         if self.parent and self.parent.parent:
             raise ValidationError("Максимальный уровень вложенности для категории — 2.")
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # Счётчик меняется только запросами UPDATE из catalog.categories,
+            # значение в загруженном экземпляре может быть устаревшим
+            kwargs["update_fields"] = fields_except(self, ["available_count"])
         super().save(*args, **kwargs)
 
 
+class CategoryClosure(models.Model):
+    """
+    Транзитивное замыкание дерева категорий: все пары «предок — потомок»,
+    включая пару категории с самой собой (depth=0). Поддерживается сигналами
+    (см. catalog.categories)
+    """
+
+    ancestor = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveSmallIntegerField(verbose_name="Глубина")
+
+    class Meta:
+        verbose_name = "Связь категорий"
+        verbose_name_plural = "Связи категорий"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ancestor", "descendant"], name="unique_category_closure"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.ancestor_id} -> {self.descendant_id}"
+
+
 def category_image_directory_path(instance: "CategoryImage", filename: str) -> str:
     """Путь к изображению категории"""
     return "categories/category_{pk}/image/{filename}".format(
@@ -76,10 +120,15 @@ class Product(models.Model):
         "Category", on_delete=models.CASCADE, related_name="products"
     )
     price = models.DecimalField(
-        default=0, max_digits=8, decimal_places=2, blank=False, verbose_name="Цена"
+        default=0,
+        max_digits=8,
+        decimal_places=2,
+        blank=False,
+        db_index=True,
+        verbose_name="Цена",
     )
     count = models.IntegerField(default=0, blank=False, verbose_name="Количество")
-    date = models.DateTimeField(auto_now_add=True, verbose_name="Дата")
+    date = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата")
     title = models.CharField(max_length=100, blank=False, verbose_name="Название")
     description = models.CharField(max_length=100, blank=True, verbose_name="Описание")
     fullDescription = models.TextField(
@@ -89,9 +138,38 @@ class Product(models.Model):
         default=False, verbose_name="Бесплатная доставка"
     )
     rating = models.DecimalField(
-        default=0, max_digits=3, decimal_places=2, verbose_name="Рейтинг"
+        default=0,
+        max_digits=3,
+        decimal_places=2,
+        db_index=True,
+        verbose_name="Рейтинг",
+    )
+    # Статистика отзывов поддерживается инкрементально (см. catalog.stats)
+    reviews_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False, verbose_name="Количество отзывов"
+    )
+    rating_sum = models.IntegerField(
+        default=0, editable=False, verbose_name="Сумма оценок"
     )
     limited = models.BooleanField(default=False, verbose_name="Лимитированный товар")
+    # Цена и скидка на текущую дату; поддерживаются catalog.pricing
+    effective_price = models.DecimalField(
+        default=0,
+        max_digits=8,
+        decimal_places=2,
+        db_index=True,
+        editable=False,
+        verbose_name="Действующая цена",
+    )
+    active_sale = models.ForeignKey(
+        "Sale",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+        verbose_name="Действующая скидка",
+    )
 
     available = models.BooleanField(default=True, verbose_name="В наличии")
 
@@ -102,17 +180,20 @@ class Product(models.Model):
     def __str__(self):
         return self.title
 
-    def current_price(self):
-        current_date = timezone.now().date()
-
-        active_sale = self.sales.filter(
-            dateFrom__lte=current_date, dateTo__gte=current_date
-        ).aggregate(min_price=models.Min("salePrice"))["min_price"]
-
-        if active_sale is not None:
-            return active_sale
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # Статистику отзывов меняют только запросы UPDATE из catalog.stats:
+            # сохранение товара не должно затирать её устаревшими значениями
+            kwargs["update_fields"] = fields_except(
+                self, ["rating", "reviews_count", "rating_sum"]
+            )
+        super().save(*args, **kwargs)
 
-        return self.price
+    def current_price(self):
+        # Цена уже посчитана пакетно (см. catalog.pricing) — повторно не запрашиваем
+        if hasattr(self, "actual_price"):
+            return self.actual_price
+        return self.effective_price
 
 
 def product_images_directory_path(instance: "ProductImage", filename: str) -> str:
@@ -175,6 +256,10 @@ class Review(models.Model):
     class Meta:
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
+        indexes = [
+            # Последние отзывы товара: карточка и GET /api/product/<pk>/reviews
+            models.Index(fields=["product", "date"], name="review_product_date_idx"),
+        ]
 
     def __str__(self):
         return f"Отзыв {self.pk} от {self.date}"
@@ -212,11 +297,28 @@ class Sale(models.Model):
     class Meta:
         verbose_name = "Скидка"
         verbose_name_plural = "Скидки"
+        # Поиск действующих скидок и границ расписания (catalog.pricing)
+        indexes = [
+            models.Index(fields=["dateFrom", "dateTo"], name="sale_dates_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.product}"
 
 
+class SaleSchedule(models.Model):
+    """Дата, на которую применено расписание скидок (единственная запись)"""
+
+    applied_date = models.DateField(null=True, verbose_name="Применено на дату")
+
+    class Meta:
+        verbose_name = "Расписание скидок"
+        verbose_name_plural = "Расписание скидок"
+
+    def __str__(self) -> str:
+        return f"{self.applied_date}"
+
+
 class Banner(models.Model):
     sale = models.OneToOneField(
         Sale, on_delete=models.CASCADE, related_name="banneer", verbose_name="Баннер"
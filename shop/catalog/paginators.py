@@ -1,4 +1,19 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from decimal import Decimal
+from math import ceil
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
 from rest_framework.response import Response
 
 
@@ -16,3 +31,161 @@ class CatalogPagination(PageNumberPagination):
                 "lastPage": self.page.paginator.num_pages,
             }
         )
+
+
+class ReviewCursorPagination(CursorPagination):
+    """Отзывы товара от новых к старым, курсор вместо номера страницы"""
+
+    ordering = ("-date", "-id")
+    page_size = 10
+    page_size_query_param = "limit"
+    max_page_size = 50
+
+
+class CatalogKeysetPagination(BasePagination):
+    """
+    Keyset-пагинация каталога по ключам сортировки ProductFilter.
+
+    Вместо OFFSET следующая страница выбирается условием «после последней
+    строки предыдущей страницы», поэтому глубокие страницы стоят столько же,
+    сколько первая. Курсор непрозрачен для клиента и хранит значения ключей
+    сортировки последней строки, номер страницы и число страниц, посчитанное
+    на первой странице, — COUNT(*) по всей выборке на следующих страницах
+    не выполняется.
+    """
+
+    max_page_size = 100
+    page_size = 20
+    cursor_query_param = "cursor"
+    page_size_query_param = "limit"
+    invalid_cursor_message = "Неверный курсор"
+    # Сколько секунд кешируется количество страниц для первой страницы выборки
+    last_page_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = list(queryset.query.order_by)
+
+        cursor = self.decode_cursor(request)
+        if cursor:
+            self.current_page = cursor["page"] + 1
+            self.last_page = cursor["last"]
+            queryset = queryset.filter(
+                self.get_keyset_filter(queryset, cursor["values"])
+            )
+        else:
+            self.current_page = 1
+            self.last_page = self.get_last_page(queryset, request)
+
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_keyset_filter(self, queryset, values):
+        """
+        Условие «строго после» для лексикографического порядка:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            value = self.parse_value(queryset, name, value)
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def parse_value(self, queryset, name, value):
+        """Значение ключа из курсора, приведённое к типу поля или аннотации"""
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = queryset.query.annotations[name].output_field
+        try:
+            value = field.to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def get_last_page(self, queryset, request):
+        params = sorted(
+            (key, request.query_params.getlist(key))
+            for key in request.query_params
+            if key != self.cursor_query_param
+        )
+        key = (
+            "catalog:last_page:" + hashlib.md5(json.dumps(params).encode()).hexdigest()
+        )
+        last_page = cache.get(key)
+        if last_page is None:
+            last_page = max(ceil(queryset.count() / self.page_size), 1)
+            cache.set(key, last_page, self.last_page_cache_timeout)
+        return last_page
+
+    @staticmethod
+    def serialize_value(value):
+        # Полная точность: DjangoJSONEncoder обрезает микросекунды у дат
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def encode_cursor(self, row):
+        cursor = {
+            "values": [
+                self.serialize_value(getattr(row, field.lstrip("-")))
+                for field in self.ordering
+            ],
+            "page": self.current_page,
+            "last": self.last_page,
+        }
+        data = json.dumps(cursor, separators=(",", ":"))
+        return urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            return {
+                "values": list(cursor["values"]),
+                "page": int(cursor["page"]),
+                "last": int(cursor["last"]),
+            }
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_row)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "items": data,
+                "currentPage": self.current_page,
+                "lastPage": max(self.last_page, self.current_page),
+                "nextCursor": self.get_next_cursor(),
+            }
+        )
@@ -0,0 +1,200 @@
+"""
+Действующие цены товаров с учётом активных скидок
+
+Product.effective_price и Product.active_sale хранят цену и самую выгодную
+скидку на дату применения расписания, поэтому фильтры и сортировки по цене идут
+по индексированной колонке. Значения обновляются:
+
+- при сохранении товара (сигнал pre_save) и изменении его скидок;
+- на границах дат — командой apply_sale_schedule (по расписанию или в цикле):
+  пересчитываются только товары, скидки которых начались или закончились
+  с прошлого применения. Дата применения хранится в БД (SaleSchedule);
+  если её нет, пересчитывается весь каталог одним UPDATE.
+
+Чтение цен в базу не пишет. Пока расписание на сегодня не применено, цена
+и скидка считаются коррелированным подзапросом по таблице скидок в том же
+SQL-запросе — медленнее, но без устаревших значений колонок.
+
+Массовые операции без сигналов (bulk_create, update цены) должны заполнять
+effective_price сами или завершаться командой apply_sale_schedule --full.
+"""
+
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import (
+    DecimalField,
+    Exists,
+    Expression,
+    F,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+)
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Product, Sale, SaleSchedule
+
+# Дата применения расписания из БД кешируется ненадолго: она только растёт,
+# поэтому устаревшее значение означает лишь лишний подзапрос, а не неверную цену
+SALE_SCHEDULE_DATE_KEY = "catalog:sale_schedule_date"
+SALE_SCHEDULE_CHECK_TIMEOUT = 60
+
+# Отправляется после пакетного пересчёта цен с аргументом product_ids
+# (None — весь каталог), обработчик сбрасывает кеши (catalog.signals)
+prices_changed = Signal()
+
+
+def active_sales(current_date: Optional[date] = None) -> QuerySet:
+    """Скидки, действующие на указанную дату (по умолчанию — сегодня)"""
+    current_date = current_date or timezone.now().date()
+    return Sale.objects.filter(dateFrom__lte=current_date, dateTo__gte=current_date)
+
+
+def best_sales(current_date: Optional[date] = None, product: str = "pk") -> QuerySet:
+    """Активные скидки товара OuterRef(product), самая низкая цена — первой"""
+    return (
+        active_sales(current_date)
+        .filter(product=OuterRef(product))
+        .order_by("salePrice", "id")
+    )
+
+
+def applied_schedule_date() -> date:
+    """Дата, на которую применено расписание скидок (date.min — не применялось)"""
+    applied = cache.get(SALE_SCHEDULE_DATE_KEY)
+    if applied is None:
+        applied = (
+            SaleSchedule.objects.values_list("applied_date", flat=True).first()
+            or date.min
+        )
+        cache.set(SALE_SCHEDULE_DATE_KEY, applied, SALE_SCHEDULE_CHECK_TIMEOUT)
+    return applied
+
+
+def price_expression(
+    product: str = "", current_date: Optional[date] = None
+) -> Expression:
+    """
+    Выражение действующей цены товара на дату (по умолчанию — сегодня).
+
+    product — путь к товару от модели queryset ("" — сам товар). Колонка
+    effective_price используется, только если расписание применено на эту дату.
+    """
+    prefix = f"{product}__" if product else ""
+    today = timezone.now().date()
+    current_date = current_date or today
+    if current_date == today and applied_schedule_date() == today:
+        return F(f"{prefix}effective_price")
+    sales = best_sales(current_date, f"{prefix}pk")
+    return Coalesce(
+        Subquery(sales.values("salePrice")[:1]),
+        f"{prefix}price",
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def with_current_price(
+    queryset: QuerySet, current_date: Optional[date] = None
+) -> QuerySet:
+    """Аннотирует queryset товаров действующей ценой (actual_price)"""
+    return queryset.annotate(actual_price=price_expression(current_date=current_date))
+
+
+def with_price_field(queryset: QuerySet) -> Tuple[QuerySet, str]:
+    """
+    Queryset товаров и поле действующей цены для фильтров и сортировок:
+    колонка effective_price или аннотация actual_price до применения расписания
+    """
+    price = price_expression()
+    if isinstance(price, F):
+        return queryset, price.name
+    return queryset.annotate(actual_price=price), "actual_price"
+
+
+def with_active_sale(queryset: QuerySet) -> QuerySet:
+    """
+    Товары со скидкой на сегодня. Скидка аннотируется тем же запросом:
+    sale_price, sale_date_from, sale_date_to
+    """
+    today = timezone.now().date()
+    if applied_schedule_date() == today:
+        return queryset.filter(active_sale__isnull=False).annotate(
+            sale_price=F("active_sale__salePrice"),
+            sale_date_from=F("active_sale__dateFrom"),
+            sale_date_to=F("active_sale__dateTo"),
+        )
+    sales = best_sales(today)
+    return queryset.filter(Exists(sales)).annotate(
+        sale_price=Subquery(sales.values("salePrice")[:1]),
+        sale_date_from=Subquery(sales.values("dateFrom")[:1]),
+        sale_date_to=Subquery(sales.values("dateTo")[:1]),
+    )
+
+
+def apply_current_sale(product: Product) -> None:
+    """Проставляет цену и скидку товару перед сохранением"""
+    sale = None
+    if product.pk:
+        sale = (
+            active_sales()
+            .filter(product_id=product.pk)
+            .order_by("salePrice", "id")
+            .first()
+        )
+    product.active_sale = sale
+    product.effective_price = sale.salePrice if sale else product.price
+
+
+def update_effective_prices(
+    product_ids: Optional[Iterable[int]] = None, current_date: Optional[date] = None
+) -> int:
+    """Пересчитывает цены товаров одним UPDATE, без аргументов — всего каталога"""
+    products = Product.objects.all()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(pk__in=product_ids)
+    sales = best_sales(current_date)
+    updated = products.update(
+        active_sale=Subquery(sales.values("id")[:1]),
+        effective_price=Coalesce(Subquery(sales.values("salePrice")[:1]), "price"),
+    )
+    prices_changed.send(sender=Product, product_ids=product_ids)
+    return updated
+
+
+def boundary_product_ids(since: date, until: date) -> List[int]:
+    """Товары, скидки которых начались или закончились в интервале (since, until]"""
+    return list(
+        Sale.objects.filter(
+            Q(dateFrom__gt=since, dateFrom__lte=until)
+            | Q(dateTo__gte=since, dateTo__lt=until)
+        )
+        .values_list("product_id", flat=True)
+        .distinct()
+    )
+
+
+def apply_sale_schedule(current_date: Optional[date] = None, full: bool = False) -> int:
+    """
+    Обновляет цены на дату current_date, возвращает число пересчитанных товаров.
+
+    Пересчитываются только товары на границах скидок с даты прошлого применения;
+    full или неизвестная дата прошлого применения — весь каталог.
+    """
+    current_date = current_date or timezone.now().date()
+    applied = SaleSchedule.objects.values_list("applied_date", flat=True).first()
+    if full or applied is None:
+        updated = update_effective_prices(current_date=current_date)
+    else:
+        product_ids = boundary_product_ids(applied, current_date)
+        updated = (
+            update_effective_prices(product_ids, current_date) if product_ids else 0
+        )
+    SaleSchedule.objects.update_or_create(pk=1, defaults={"applied_date": current_date})
+    cache.set(SALE_SCHEDULE_DATE_KEY, current_date, SALE_SCHEDULE_CHECK_TIMEOUT)
+    return updated
@@ -0,0 +1,254 @@
+"""
+Колоночная read-модель каталога в памяти процесса
+
+Модель держит ключевые поля товаров в массивах NumPy и выполняет фильтры и
+сортировки ProductFilter векторно, без обращения к SQLite; из базы читаются
+только товары выводимой страницы. Включается настройкой CATALOG_READ_MODEL и
+требует установленного numpy, иначе каталог работает через ORM.
+
+Сигналы помечают изменённые товары, и перед следующим запросом модель
+перечитывает только их. Изменения, сделанные в других процессах, подхватываются
+полной перестройкой раз в CATALOG_READ_MODEL_TTL секунд и при смене даты
+(действующие цены зависят от скидок).
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .categories import category_filter_ids
+from .facets import get_tag_filter, parse_price
+from .filters import get_ordering
+from .models import Product, Tag
+from .pricing import with_current_price
+from .search import search_filter
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy необязателен
+    np = None
+
+PRODUCT_FIELDS = (
+    "id",
+    "actual_price",
+    "date",
+    "rating",
+    "reviews_count",
+    "category_id",
+    "freeDelivery",
+    "available",
+)
+# Поле сортировки ProductFilter -> колонка read-модели
+SORT_COLUMNS = {
+    "id": "ids",
+    "effective_price": "price",
+    "date": "date",
+    "reviews_count": "reviews",
+    "rating": "rating",
+}
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def to_microseconds(value: datetime) -> int:
+    # Целые микросекунды: в float64 точность дат с микросекундами теряется
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def is_enabled() -> bool:
+    return np is not None and getattr(settings, "CATALOG_READ_MODEL", False)
+
+
+class CatalogReadModel:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._stale = True
+        self._loaded_at = 0.0
+        self._loaded_date = None
+
+    def mark_dirty(self, product_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._dirty.update(product_ids)
+
+    def mark_stale(self) -> None:
+        with self._lock:
+            self._stale = True
+
+    def _product_rows(self, product_ids=None):
+        products = Product.objects.order_by("id")
+        if product_ids is not None:
+            products = products.filter(id__in=product_ids)
+        return list(with_current_price(products).values_list(*PRODUCT_FIELDS))
+
+    def _tag_links(self, product_ids=None):
+        links = Tag.products.through.objects.all()
+        if product_ids is not None:
+            links = links.filter(product_id__in=product_ids)
+        return links.values_list("tag_id", "product_id")
+
+    def load(self) -> None:
+        """Полная перестройка модели"""
+        rows = self._product_rows()
+        columns = list(zip(*rows)) if rows else [()] * len(PRODUCT_FIELDS)
+        ids, prices, dates, ratings, reviews, categories, free, available = columns
+
+        self.ids = np.array(ids, dtype=np.int64)
+        self.price = np.array(prices, dtype=np.float64)
+        self.date = np.array([to_microseconds(date) for date in dates], dtype=np.int64)
+        self.rating = np.array(ratings, dtype=np.float64)
+        self.reviews = np.array(reviews, dtype=np.int64)
+        self.category = np.array(categories, dtype=np.int64)
+        self.free_delivery = np.array(free, dtype=bool)
+        self.available = np.array(available, dtype=bool)
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self.positions = {product_id: index for index, product_id in enumerate(ids)}
+
+        self.tags = {}
+        for tag_id, product_id in self._tag_links():
+            mask = self.tags.setdefault(tag_id, np.zeros(len(self.ids), dtype=bool))
+            mask[self.positions[product_id]] = True
+
+        self._orders = {}
+        self._stale = False
+        self._dirty.clear()
+        self._loaded_at = time.monotonic()
+        self._loaded_date = timezone.now().date()
+
+    def refresh(self, product_ids) -> None:
+        """Перечитывает из базы только указанные товары"""
+        product_ids = list(product_ids)
+        rows = {row[0]: row for row in self._product_rows(product_ids)}
+
+        new_ids = [pk for pk in rows if pk not in self.positions]
+        if new_ids:
+            self._append(len(new_ids))
+            for offset, product_id in enumerate(new_ids):
+                self.positions[product_id] = len(self.ids) - len(new_ids) + offset
+
+        for product_id in product_ids:
+            index = self.positions.get(product_id)
+            if index is None:
+                continue
+            row = rows.get(product_id)
+            if row is None:
+                self.alive[index] = False
+                continue
+            self.ids[index] = product_id
+            self.price[index] = row[1]
+            self.date[index] = to_microseconds(row[2])
+            self.rating[index] = row[3]
+            self.reviews[index] = row[4]
+            self.category[index] = row[5]
+            self.free_delivery[index] = row[6]
+            self.available[index] = row[7]
+            self.alive[index] = True
+
+        self._orders = {}
+        positions = [self.positions[pk] for pk in product_ids if pk in self.positions]
+        for mask in self.tags.values():
+            mask[positions] = False
+        for tag_id, product_id in self._tag_links(product_ids):
+            mask = self.tags.setdefault(tag_id, np.zeros(len(self.ids), dtype=bool))
+            mask[self.positions[product_id]] = True
+
+    def _append(self, count: int) -> None:
+        def grow(array, fill=0):
+            return np.concatenate([array, np.full(count, fill, dtype=array.dtype)])
+
+        self.ids = grow(self.ids)
+        self.price = grow(self.price)
+        self.date = grow(self.date)
+        self.rating = grow(self.rating)
+        self.reviews = grow(self.reviews)
+        self.category = grow(self.category)
+        self.free_delivery = grow(self.free_delivery, False)
+        self.available = grow(self.available, False)
+        self.alive = grow(self.alive, False)
+        self.tags = {tag_id: grow(mask, False) for tag_id, mask in self.tags.items()}
+
+    def _ensure_fresh(self) -> None:
+        # Вызывается под self._lock
+        ttl = getattr(settings, "CATALOG_READ_MODEL_TTL", 300)
+        expired = (
+            time.monotonic() - self._loaded_at > ttl
+            or self._loaded_date != timezone.now().date()
+        )
+        if self._stale or expired:
+            self.load()
+        elif self._dirty:
+            self.refresh(self._dirty)
+            self._dirty.clear()
+
+    def query(self, params) -> Optional["np.ndarray"]:
+        """
+        Упорядоченные id товаров, подходящих под параметры ProductFilter.
+
+        Возвращает None, если запрос нельзя выполнить в модели (некорректные
+        параметры или поиск по релевантности) — тогда используется ORM.
+        """
+        ordering = params.get("sort")
+        name = params.get("filter[name]")
+        if name and not ordering:
+            return None
+
+        found = None
+        if name:
+            found = list(
+                Product.objects.filter(search_filter(name)).values_list("id", flat=True)
+            )
+
+        with self._lock:
+            self._ensure_fresh()
+            return self._select(params, ordering, found)
+
+    def _select(self, params, ordering, found):
+        mask = self.alive.copy()
+        try:
+            min_price = parse_price(params.get("filter[minPrice]"))
+            max_price = parse_price(params.get("filter[maxPrice]"))
+        except ValueError:
+            return None
+        if min_price is not None:
+            mask &= self.price >= float(min_price)
+        if max_price is not None:
+            mask &= self.price <= float(max_price)
+
+        category_ids = category_filter_ids(
+            params.get("category"), params.get("subcategory")
+        )
+        if category_ids is not None:
+            mask &= np.isin(self.category, category_ids)
+        if params.get("filter[freeDelivery]") == "true":
+            mask &= self.free_delivery
+        if params.get("filter[available]") == "true":
+            mask &= self.available
+        tag_ids, match_all_tags = get_tag_filter(params)
+        if tag_ids:
+            empty = np.zeros(len(self.ids), dtype=bool)
+            masks = [self.tags.get(tag_id, empty) for tag_id in tag_ids]
+            combine = np.logical_and if match_all_tags else np.logical_or
+            mask &= combine.reduce(masks)
+        if found is not None:
+            mask &= np.isin(self.ids, found)
+
+        # Порядки ProductFilter — «поле, id» целиком по возрастанию или целиком
+        # по убыванию, поэтому достаточно одной заранее посчитанной перестановки
+        # на поле: убывающий порядок — она же в обратную сторону
+        field = get_ordering(ordering, params.get("sortType"))[0]
+        order = self._sort_order(SORT_COLUMNS[field.lstrip("-")])
+        if field.startswith("-"):
+            order = order[::-1]
+        return self.ids[order[mask[order]]]
+
+    def _sort_order(self, column: str) -> "np.ndarray":
+        if column not in self._orders:
+            self._orders[column] = np.lexsort((self.ids, getattr(self, column)))
+        return self._orders[column]
+
+
+read_model = CatalogReadModel()
@@ -0,0 +1,58 @@
+"""
+Массовый импорт отзывов
+
+Отзывы вставляются пачками через bulk_create, без сигналов на каждую строку,
+после чего статистика пересчитывается один раз для каждого затронутого товара
+(catalog.stats.rebuild_review_stats). Дата отзыва — момент импорта
+(поле date заполняется автоматически).
+"""
+
+from typing import Iterable, Tuple
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Product, Review
+from .stats import rebuild_review_stats
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def import_reviews(rows: Iterable[dict]) -> Tuple[int, int]:
+    """
+    Импортирует проверенные ReviewImportSerializer строки.
+
+    Возвращает число созданных отзывов и затронутых товаров. Если в строках
+    есть несуществующие товары или авторы, ничего не импортируется (ValueError).
+    """
+    rows = list(rows)
+    product_ids = {row["product"] for row in rows}
+    author_ids = {row["author"] for row in rows}
+
+    missing_products = product_ids - set(
+        Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True)
+    )
+    if missing_products:
+        raise ValueError(f"Нет товаров с id: {sorted(missing_products)}")
+    missing_authors = author_ids - set(
+        User.objects.filter(pk__in=author_ids).values_list("pk", flat=True)
+    )
+    if missing_authors:
+        raise ValueError(f"Нет пользователей с id: {sorted(missing_authors)}")
+
+    with transaction.atomic():
+        Review.objects.bulk_create(
+            (
+                Review(
+                    product_id=row["product"],
+                    author_id=row["author"],
+                    email=row["email"],
+                    text=row.get("text", ""),
+                    rate=row["rate"],
+                )
+                for row in rows
+            ),
+            batch_size=IMPORT_BATCH_SIZE,
+        )
+        rebuild_review_stats(product_ids)
+    return len(rows), len(product_ids)
@@ -0,0 +1,132 @@
+"""
+Полнотекстовый поиск товаров на SQLite FTS5
+
+Индекс — виртуальная таблица catalog_product_fts с rowid, равным id товара.
+Токенайзер unicode61 приводит регистр в том числе для кириллицы (в отличие от
+LIKE в SQLite), remove_diacritics дополнительно отождествляет «ё» и «е».
+Индекс обновляется сигналами при сохранении и удалении товара; для массовых
+изменений (bulk_create, update, loaddata без сигналов) есть команда
+rebuild_search_index.
+"""
+
+import re
+from typing import Iterable
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .cache import bump_catalog_version
+from .models import Product
+
+FTS_TABLE = "catalog_product_fts"
+FTS_COLUMNS = ("title", "description", "fullDescription")
+# Веса колонок для bm25: совпадение в названии важнее, чем в описании
+FTS_WEIGHTS = (10.0, 3.0, 1.0)
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    f"USING fts5({', '.join(FTS_COLUMNS)}, "
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+
+def is_supported() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def build_match_query(text: str) -> str:
+    """
+    Превращает пользовательский ввод в запрос FTS5: каждое слово ищется
+    по префиксу, все слова обязательны. Спецсимволы синтаксиса FTS5 отбрасываются.
+    """
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", text))
+
+
+def search_filter(text: str) -> Q:
+    """
+    Условие на товары, подходящие под поисковую строку.
+
+    Строке без слов (только знаки препинания) не соответствует ни один товар.
+    """
+    match = build_match_query(text)
+    if not match:
+        return Q(pk__in=[])
+    if not is_supported():
+        return (
+            Q(title__icontains=text)
+            | Q(description__icontains=text)
+            | Q(fullDescription__icontains=text)
+        )
+    return Q(
+        id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,)
+        )
+    )
+
+
+def with_search_rank(queryset: QuerySet, text: str) -> QuerySet:
+    """
+    Аннотирует товары релевантностью search_rank (меньше — релевантнее).
+
+    Подзапрос ищет по rowid, поэтому применяется уже к отфильтрованной выдаче.
+    """
+    match = build_match_query(text)
+    if not match or not is_supported():
+        return queryset
+    weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+    rank = RawSQL(
+        f"SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s "
+        f"AND rowid = {Product._meta.db_table}.id",
+        (match,),
+        output_field=FloatField(),
+    )
+    return queryset.annotate(search_rank=rank)
+
+
+def index_products(products: Iterable[Product]) -> None:
+    if not is_supported():
+        return
+    rows = [
+        (product.pk, *(getattr(product, column) for column in FTS_COLUMNS))
+        for product in products
+    ]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [row[:1] for row in rows]
+        )
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+            "VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+
+def remove_products(product_ids: Iterable[int]) -> None:
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+            [(product_id,) for product_id in product_ids],
+        )
+
+
+def rebuild_index() -> int:
+    """Перестраивает индекс по таблице товаров, возвращает число товаров"""
+    if not is_supported():
+        return 0
+    columns = ", ".join(FTS_COLUMNS)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {columns}) "
+            f"SELECT id, {columns} FROM {Product._meta.db_table}"
+        )
+        indexed = cursor.rowcount
+    bump_catalog_version()
+    return indexed
@@ -1,7 +1,6 @@
-from django.db.models import Avg
+from django.conf import settings
 from rest_framework import serializers
 from .models import (
-    Category,
     CategoryImage,
     Product,
     ProductImage,
@@ -18,19 +17,6 @@ class CategoryImageSerializer(serializers.ModelSerializer):
         fields = ["src", "alt"]
 
 
-class CategorySerializer(serializers.ModelSerializer):
-    image = CategoryImageSerializer()
-    subcategories = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Category
-        fields = ["id", "title", "image", "subcategories"]
-
-    def get_subcategories(self, obj):
-        serializer = CategorySerializer(obj.subcategories.all(), many=True)
-        return serializer.data
-
-
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
@@ -58,6 +44,23 @@ class ReviewSerializer(serializers.ModelSerializer):
         return obj.author.username if obj.author else None
 
 
+class ReviewImportSerializer(serializers.Serializer):
+    """Строка массового импорта отзывов (см. catalog.reviews)"""
+
+    product = serializers.IntegerField()
+    author = serializers.IntegerField()
+    email = serializers.EmailField()
+    text = serializers.CharField(allow_blank=True, default="")
+    rate = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class ReviewCreateSerializer(serializers.Serializer):
+    """Новый отзыв покупателя, оценка в тех же пределах, что и при импорте"""
+
+    text = serializers.CharField(allow_blank=True, default="")
+    rate = serializers.IntegerField(min_value=1, max_value=5)
+
+
 class ProductSpecificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductSpecification
@@ -67,11 +70,13 @@ class ProductSpecificationSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True)
     tags = TagSerializer(many=True)
-    reviews = ReviewSerializer(many=True)
+    reviews = serializers.SerializerMethodField()
     specifications = ProductSpecificationSerializer(many=True)
     date = serializers.DateTimeField(format="%a %b %d %Y %H:%M:%S GMT%z (%Z)")
     rating = serializers.SerializerMethodField()
     price = serializers.SerializerMethodField()
+    # В reviews только последние отзывы, здесь — все
+    reviewsCount = serializers.IntegerField(source="reviews_count", read_only=True)
 
     class Meta:
         model = Product
@@ -88,18 +93,27 @@ class ProductSerializer(serializers.ModelSerializer):
             "images",
             "tags",
             "reviews",
+            "reviewsCount",
             "specifications",
             "rating",
         ]
 
     def get_rating(self, instance: "Product"):
-        reviews = instance.reviews.all()
-        if reviews:
-            return round(reviews.aggregate(Avg("rate"))["rate__avg"], 1)
+        if instance.reviews_count:
+            return round(instance.rating_sum / instance.reviews_count, 1)
 
     def get_price(self, instance: "Product"):
         return instance.current_price()
 
+    def get_reviews(self, instance: "Product"):
+        # Последние отзывы загружены пакетно (см. catalog.detail)
+        reviews = getattr(instance, "latest_reviews", None)
+        if reviews is None:
+            reviews = instance.reviews.select_related("author").order_by(
+                "-date", "-id"
+            )[: settings.CATALOG_DETAIL_REVIEWS]
+        return ReviewSerializer(reviews, many=True).data
+
 
 class ProductCatalogSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True)
@@ -113,7 +127,7 @@ class ProductCatalogSerializer(serializers.ModelSerializer):
         return instance.current_price()
 
     def get_reviews(self, instance: "Product"):
-        return instance.reviews.count()
+        return instance.reviews_count
 
     def get_tags(self, instance: "Product"):
         tags = [
@@ -129,9 +143,8 @@ class ProductCatalogSerializer(serializers.ModelSerializer):
         return instance.freeDelivery
 
     def get_rating(self, instance: "Product"):
-        reviews = instance.reviews.all()
-        if reviews:
-            return round(reviews.aggregate(Avg("rate"))["rate__avg"], 1)
+        if instance.reviews_count:
+            return round(instance.rating_sum / instance.reviews_count, 1)
 
     class Meta:
         model = Product
@@ -160,14 +173,12 @@ class SaleProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'price', 'salePrice', 'dateFrom', 'dateTo', 'title', 'images']
 
+    # Действующая скидка аннотируется вместе с товаром (pricing.with_active_sale)
     def get_salePrice(self, obj):
-        sale = obj.sales.first()
-        return sale.salePrice if sale else None
+        return obj.sale_price
 
     def get_dateFrom(self, obj):
-        sale = obj.sales.first()
-        return sale.dateFrom.strftime("%m-%d") if sale else None
+        return obj.sale_date_from.strftime("%m-%d")
 
     def get_dateTo(self, obj):
-        sale = obj.sales.first()
-        return sale.dateTo.strftime("%m-%d") if sale else None
\ No newline at end of file
+        return obj.sale_date_to.strftime("%m-%d")
\ No newline at end of file
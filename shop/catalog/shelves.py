@@ -0,0 +1,104 @@
+"""
+Витрины главной страницы: популярные, лимитированные товары и баннеры
+
+Сериализованный список товаров каждой витрины хранится в кеше под текущей
+версией каталога и датой, поэтому главная страница стоит несколько чтений
+кеша. Изменение товаров, скидок, отзывов и т. п. увеличивает версию каталога
+(catalog.cache) — витрина пересобирается при следующем запросе в веб-процессе.
+Пересобирает её один запрос (блокировка в кеше), остальные на это время
+получают прошлую версию витрины. Команда refresh_shelves пересобирает витрины
+заранее и работает только с общим для процессов кешем.
+"""
+
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache import get_catalog_version, record_cache_event
+from .fragments import absolute_image_urls, get_fragments
+from .models import Banner, Product
+
+SHELF_CACHE_KEY = "catalog:shelf:{name}:{version}:{date}"
+# Последняя собранная версия витрины и блокировка её пересборки
+SHELF_LATEST_KEY = "catalog:shelf:{name}:latest"
+SHELF_LOCK_KEY = "catalog:shelf:{name}:lock"
+SHELF_LOCK_TIMEOUT = 30
+
+
+def popular_ids() -> List[int]:
+    return list(
+        Product.objects.order_by("-rating", "-id").values_list("id", flat=True)[:8]
+    )
+
+
+def limited_ids() -> List[int]:
+    return list(Product.objects.filter(limited=True).values_list("id", flat=True)[:16])
+
+
+def banner_ids() -> List[int]:
+    return list(
+        Banner.objects.filter(sale__dateTo__gte=timezone.now().date()).values_list(
+            "sale__product_id", flat=True
+        )
+    )
+
+
+SHELVES = {
+    "popular": popular_ids,
+    "limited": limited_ids,
+    "banners": banner_ids,
+}
+
+
+def shelf_cache_key(name: str) -> str:
+    return SHELF_CACHE_KEY.format(
+        name=name, version=get_catalog_version(), date=timezone.now().date()
+    )
+
+
+def refresh_shelf(name: str) -> List[dict]:
+    items = get_fragments(SHELVES[name]())
+    cache.set(shelf_cache_key(name), items, settings.CATALOG_CACHE_TIMEOUT)
+    cache.set(SHELF_LATEST_KEY.format(name=name), items, None)
+    return items
+
+
+def rebuild_shelf(name: str) -> List[dict]:
+    """Пересобирает устаревшую витрину, если её не пересобирает другой запрос"""
+    lock = SHELF_LOCK_KEY.format(name=name)
+    if cache.add(lock, True, SHELF_LOCK_TIMEOUT):
+        try:
+            return refresh_shelf(name)
+        finally:
+            cache.delete(lock)
+    items = cache.get(SHELF_LATEST_KEY.format(name=name))
+    # Прошлой версии нет — собираем, не дожидаясь другого запроса
+    return items if items is not None else refresh_shelf(name)
+
+
+def refresh_shelves(force: bool = True) -> Dict[str, int]:
+    """
+    Пересобирает витрины, возвращает число товаров в каждой пересобранной.
+
+    Без force пересобираются только витрины, устаревшие для текущей версии.
+    """
+    refreshed = {}
+    for name in SHELVES:
+        if force or cache.get(shelf_cache_key(name)) is None:
+            refreshed[name] = len(refresh_shelf(name))
+    return refreshed
+
+
+def get_shelf(name: str, request=None) -> List[dict]:
+    items = cache.get(shelf_cache_key(name))
+    if items is None:
+        record_cache_event(name, "misses")
+        items = rebuild_shelf(name)
+    else:
+        record_cache_event(name, "hits")
+    if request is not None:
+        for item in items:
+            item["images"] = absolute_image_urls(item["images"], request)
+    return items
@@ -0,0 +1,295 @@
+"""
+Обработчики сигналов каталога
+"""
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import search
+from .cache import bump_catalog_version
+from .categories import (
+    apply_category_delta,
+    invalidate_category_descendants,
+    invalidate_category_tree,
+    move_category,
+)
+from .detail import bump_product_versions
+from .facets import facet_index
+from .fragments import invalidate_fragments
+from .pricing import apply_current_sale, prices_changed, update_effective_prices
+from .readmodel import read_model
+from .models import (
+    Banner,
+    Category,
+    CategoryImage,
+    Product,
+    ProductImage,
+    ProductSpecification,
+    Review,
+    Sale,
+    Tag,
+)
+from .stats import apply_review_delta
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rate(sender, instance: Review, **kwargs):
+    # Запоминаем прежние товар и оценку, чтобы при редактировании учесть разницу
+    instance._stats_previous = None
+    if instance.pk:
+        instance._stats_previous = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list("product_id", "rate")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_stats_on_review_save(sender, instance: Review, created, **kwargs):
+    previous = getattr(instance, "_stats_previous", None)
+    if created or previous is None:
+        apply_review_delta(instance.product_id, 1, instance.rate)
+        return
+
+    previous_product_id, previous_rate = previous
+    if previous_product_id != instance.product_id:
+        apply_review_delta(previous_product_id, -1, -previous_rate)
+        apply_review_delta(instance.product_id, 1, instance.rate)
+    elif previous_rate != instance.rate:
+        apply_review_delta(instance.product_id, 0, instance.rate - previous_rate)
+
+
+@receiver(post_delete, sender=Review)
+def update_stats_on_review_delete(sender, instance: Review, **kwargs):
+    apply_review_delta(instance.product_id, -1, -instance.rate)
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance: Product, **kwargs):
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance: Product, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Tag.products.through)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_catalog_cache(sender, **kwargs):
+    # Новая версия каталога делает недоступными все закешированные ответы
+    # и фасетный индекс
+    bump_catalog_version()
+
+
+def refresh_indexes(product_ids) -> None:
+    # Товары перечитываются read-моделью и фасетным индексом перед запросом
+    product_ids = list(product_ids)
+    read_model.mark_dirty(product_ids)
+    facet_index.mark_dirty(product_ids)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_read_model_product(sender, instance: Product, **kwargs):
+    refresh_indexes([instance.pk])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_read_model_related(sender, instance, **kwargs):
+    # Рейтинг есть только в read-модели
+    read_model.mark_dirty([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Tag.products.through)
+def refresh_read_model_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        refresh_indexes([instance.pk])
+    elif pk_set:
+        refresh_indexes(pk_set)
+    else:
+        read_model.mark_stale()
+        facet_index.mark_stale()
+
+
+@receiver(post_delete, sender=Tag)
+def reload_read_model(sender, **kwargs):
+    read_model.mark_stale()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reload_facet_index(sender, **kwargs):
+    # Названия тегов и дерево категорий — индекс перестраивается целиком
+    facet_index.mark_stale()
+
+
+def invalidate_products(product_ids) -> None:
+    # Сериализованные карточки в списках и версии страниц товаров
+    product_ids = list(product_ids)
+    invalidate_fragments(product_ids)
+    bump_product_versions(product_ids)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_fragment(sender, instance: Product, **kwargs):
+    invalidate_products([instance.pk])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_related_fragment(sender, instance, **kwargs):
+    invalidate_products([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Tag.products.through)
+def invalidate_tag_fragments(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and not reverse:
+        # После очистки связей товары тега уже не найти
+        invalidate_products(instance.products.values_list("pk", flat=True))
+    elif not action.startswith("post_"):
+        return
+    elif reverse:
+        invalidate_products([instance.pk])
+    elif pk_set:
+        invalidate_products(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tagged_fragments(sender, instance: Tag, created=False, **kwargs):
+    # Название тега входит во фрагменты всех его товаров
+    if not created:
+        invalidate_products(instance.products.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=ProductSpecification)
+@receiver(post_delete, sender=ProductSpecification)
+def bump_product_on_specification_change(sender, instance, **kwargs):
+    # Характеристики выводятся только на странице товара
+    bump_product_versions([instance.product_id])
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_availability(sender, instance: Product, **kwargs):
+    instance._category_previous = None
+    if instance.pk:
+        instance._category_previous = (
+            Product.objects.filter(pk=instance.pk)
+            .values_list("category_id", "available")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def update_category_count_on_save(sender, instance: Product, **kwargs):
+    previous = getattr(instance, "_category_previous", None)
+    current = (instance.category_id, instance.available)
+    if previous == current:
+        return
+    if previous is not None and previous[1]:
+        apply_category_delta(previous[0], -1)
+    if instance.available:
+        apply_category_delta(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Product)
+def update_category_count_on_delete(sender, instance: Product, **kwargs):
+    if instance.available:
+        apply_category_delta(instance.category_id, -1)
+
+
+@receiver(pre_save, sender=Product)
+def update_product_price(sender, instance: Product, **kwargs):
+    apply_current_sale(instance)
+
+
+@receiver(pre_save, sender=Sale)
+def remember_sale_product(sender, instance: Sale, **kwargs):
+    instance._product_previous = None
+    if instance.pk:
+        instance._product_previous = (
+            Sale.objects.filter(pk=instance.pk)
+            .values_list("product_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def update_sale_prices(sender, instance: Sale, **kwargs):
+    product_ids = {instance.product_id}
+    previous = getattr(instance, "_product_previous", None)
+    if previous is not None:
+        product_ids.add(previous)
+    update_effective_prices(product_ids)
+
+
+@receiver(prices_changed)
+def invalidate_prices(sender, product_ids=None, **kwargs):
+    # Цены меняются одним UPDATE, сигналы моделей при этом не отправляются.
+    # Изменения скидок тоже приходят сюда (update_sale_prices)
+    if product_ids is None:
+        invalidate_products(Product.objects.values_list("pk", flat=True))
+        read_model.mark_stale()
+        facet_index.mark_stale()
+    else:
+        invalidate_products(product_ids)
+        refresh_indexes(product_ids)
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CategoryImage)
+@receiver(post_delete, sender=CategoryImage)
+def invalidate_categories(sender, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_parent(sender, instance: Category, **kwargs):
+    instance._parent_previous = None
+    if instance.pk:
+        instance._parent_previous = (
+            Category.objects.filter(pk=instance.pk)
+            .values_list("parent_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Category)
+def update_category_closure(sender, instance: Category, created, **kwargs):
+    if created or instance.parent_id != instance._parent_previous:
+        move_category(instance.pk, instance.parent_id)
+
+
+@receiver(post_delete, sender=Category)
+def forget_category_descendants(sender, **kwargs):
+    # Связи замыкания удалены каскадом
+    invalidate_category_descendants()
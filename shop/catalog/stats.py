@@ -0,0 +1,87 @@
+"""
+Денормализованная статистика отзывов товара: количество, сумма и средняя оценка
+"""
+
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Round
+from django.db.models.lookups import GreaterThan
+
+from .cache import bump_catalog_version
+from .detail import bump_product_versions
+from .fragments import invalidate_fragments
+from .models import Product, Review
+from .readmodel import read_model
+
+
+def average_rating(rating_sum, reviews_count):
+    """Выражение средней оценки, 0 для товара без отзывов"""
+    return Case(
+        When(
+            GreaterThan(reviews_count, 0),
+            then=Round(Cast(rating_sum, FloatField()) / reviews_count, 2),
+        ),
+        default=Value(0),
+        output_field=DecimalField(max_digits=3, decimal_places=2),
+    )
+
+
+def apply_review_delta(product_id: int, count_delta: int, rate_delta: int) -> None:
+    """
+    Инкрементально обновляет статистику одного товара.
+
+    Выполняется одним UPDATE с F-выражениями, поэтому не зависит от числа
+    отзывов и не перезаписывает остальные поля товара.
+    """
+    reviews_count = F("reviews_count") + count_delta
+    rating_sum = F("rating_sum") + rate_delta
+    Product.objects.filter(pk=product_id).update(
+        reviews_count=reviews_count,
+        rating_sum=rating_sum,
+        rating=average_rating(rating_sum, reviews_count),
+    )
+
+
+def rebuild_review_stats(product_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Пересчитывает статистику по таблице отзывов.
+
+    Без аргументов обрабатывает весь каталог. Возвращает число обновлённых товаров.
+    """
+    reviews = Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+    products = Product.objects.all()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    with transaction.atomic():
+        updated = products.update(
+            reviews_count=Coalesce(
+                Subquery(reviews.annotate(total=Count("pk")).values("total")), 0
+            ),
+            rating_sum=Coalesce(
+                Subquery(reviews.annotate(total=Sum("rate")).values("total")), 0
+            ),
+        )
+        products.update(rating=average_rating(F("rating_sum"), F("reviews_count")))
+    bump_catalog_version()
+    invalidate_fragments(product_ids)
+    bump_product_versions(product_ids)
+    if product_ids is None:
+        read_model.mark_stale()
+    else:
+        read_model.mark_dirty(product_ids)
+    return updated
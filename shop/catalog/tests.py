@@ -1,3 +1,1109 @@
-from django.test import TestCase
+import itertools
+import json
+import os
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from unittest import skipIf
+from unittest.mock import patch
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import quote_etag
+from rest_framework.request import Request
+
+from .models import (
+    Banner,
+    Category,
+    CategoryClosure,
+    Product,
+    ProductImage,
+    ProductSpecification,
+    Review,
+    Sale,
+    SaleSchedule,
+    Tag,
+)
+from .cache import get_cache_stats, get_catalog_version
+from .categories import (
+    category_filter_ids,
+    get_category_descendants,
+    rebuild_category_closure,
+    rebuild_category_counts,
+)
+from .facets import facet_index, from_bitmap, to_bitmap
+from .fragments import fragment_key, get_fragments
+from .filters import SORT_ORDERINGS, ProductFilter
+from .pricing import apply_sale_schedule, applied_schedule_date, with_current_price
+from .detail import get_product_version, product_etag
+from .readmodel import np, read_model
+from .shelves import SHELF_LOCK_KEY, refresh_shelves
+
+
+class CatalogTestMixin:
+    """Общие данные для тестов каталога"""
+
+    def setUp(self):
+        # Кеш ответов и индексов переживает тесты, а bulk-операции его не сбрасывают
+        cache.clear()
+        # Индексы в памяти процесса переживают откат транзакции теста
+        facet_index.mark_stale()
+
+    @classmethod
+    def create_products(cls, category, count, **kwargs):
+        return Product.objects.bulk_create(
+            Product(
+                category=category,
+                title=f"Товар {index}",
+                price=Decimal(100 + index),
+                effective_price=Decimal(100 + index),
+                **kwargs,
+            )
+            for index in range(count)
+        )
+
+
+class PricingTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Электроника")
+        cls.products = cls.create_products(cls.category, 30)
+        cls.tag = Tag.objects.create(name="Хит")
+        cls.tag.products.set(cls.products)
+
+        today = timezone.now().date()
+        for product in cls.products[::2]:
+            Sale.objects.create(
+                product=product,
+                salePrice=Decimal("10.00"),
+                dateFrom=today - timedelta(days=1),
+                dateTo=today + timedelta(days=1),
+            )
+        # Прошедшая скидка не должна влиять на цену
+        Sale.objects.create(
+            product=cls.products[1],
+            salePrice=Decimal("1.00"),
+            dateFrom=today - timedelta(days=10),
+            dateTo=today - timedelta(days=5),
+        )
+
+    def test_annotated_price_matches_current_price(self):
+        annotated = {
+            product.pk: product.current_price()
+            for product in with_current_price(Product.objects.all())
+        }
+        for product in Product.objects.all():
+            self.assertEqual(annotated[product.pk], product.current_price())
+
+    def get_catalog_queries(self, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("catalog:catalog"), {"limit": limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["items"]), limit)
+        return len(context)
+
+    def test_catalog_query_count_does_not_depend_on_page_size(self):
+        # Дата применения расписания кешируется — читаем её до замеров
+        applied_schedule_date()
+        self.assertEqual(self.get_catalog_queries(5), self.get_catalog_queries(25))
+
+    def test_catalog_uses_sale_price(self):
+        response = self.client.get(
+            reverse("catalog:catalog"), {"sort": "price", "sortType": "inc"}
+        )
+        prices = {item["id"]: item["price"] for item in response.data["items"]}
+        self.assertEqual(Decimal(prices[self.products[0].pk]), Decimal("10.00"))
+        self.assertEqual(Decimal(prices[self.products[1].pk]), Decimal("101.00"))
+
+    def test_price_filter_uses_effective_price(self):
+        response = self.client.get(
+            reverse("catalog:catalog"), {"filter[maxPrice]": "50", "limit": 30}
+        )
+        self.assertEqual(
+            {item["id"] for item in response.data["items"]},
+            {product.pk for product in self.products[::2]},
+        )
+
+    def test_sale_changes_update_effective_price(self):
+        product = self.products[3]
+        today = timezone.now().date()
+        sale = Sale.objects.create(
+            product=product, salePrice=Decimal("5.00"), dateFrom=today, dateTo=today
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, Decimal("5.00"))
+        self.assertEqual(product.active_sale_id, sale.pk)
+
+        sale.salePrice = Decimal("7.00")
+        sale.save()
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, Decimal("7.00"))
+
+        sale.delete()
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, product.price)
+        self.assertIsNone(product.active_sale_id)
+
+    def test_schedule_recomputes_only_boundary_products(self):
+        today = timezone.now().date()
+        upcoming = self.products[5]
+        Sale.objects.create(
+            product=upcoming,
+            salePrice=Decimal("3.00"),
+            dateFrom=today + timedelta(days=2),
+            dateTo=today + timedelta(days=5),
+        )
+        # Расписание ещё не применялось — пересчитывается весь каталог
+        self.assertEqual(apply_sale_schedule(today), Product.objects.count())
+        # Через два дня скидки чётных товаров закончатся, а новая начнётся
+        self.assertEqual(
+            apply_sale_schedule(today + timedelta(days=2)), len(self.products[::2]) + 1
+        )
+        prices = dict(Product.objects.values_list("pk", "effective_price"))
+        self.assertEqual(prices[upcoming.pk], Decimal("3.00"))
+        self.assertEqual(prices[self.products[0].pk], self.products[0].price)
+        self.assertEqual(
+            SaleSchedule.objects.get().applied_date, today + timedelta(days=2)
+        )
+
+        # Повторное применение на ту же дату ничего не пересчитывает
+        self.assertEqual(apply_sale_schedule(today + timedelta(days=2)), 0)
+
+    def test_stale_schedule_prices_by_subquery_without_writes(self):
+        # Скидка закончилась два дня назад, а расписание применено раньше
+        today = timezone.now().date()
+        product = self.products[7]
+        sale = Sale.objects.create(
+            product=product,
+            salePrice=Decimal("10.00"),
+            dateFrom=today - timedelta(days=5),
+            dateTo=today - timedelta(days=2),
+        )
+        Product.objects.filter(pk=product.pk).update(
+            active_sale=sale, effective_price=Decimal("10.00")
+        )
+        SaleSchedule.objects.create(applied_date=today - timedelta(days=3))
+
+        with CaptureQueriesContext(connection) as context:
+            catalog = self.client.get(reverse("catalog:catalog"), {"limit": 30})
+            cheap = self.client.get(
+                reverse("catalog:catalog"), {"filter[maxPrice]": "50", "limit": 30}
+            )
+            sales = self.client.get(reverse("catalog:sales"), {"limit": 30})
+        prices = {item["id"]: item["price"] for item in catalog.data["items"]}
+        self.assertEqual(Decimal(prices[product.pk]), product.price)
+        self.assertNotIn(product.pk, {item["id"] for item in cheap.data["items"]})
+        self.assertNotIn(product.pk, {item["id"] for item in sales.data["items"]})
+        # Чтение цен в базу не пишет
+        self.assertFalse(
+            [query for query in context if not query["sql"].startswith("SELECT")]
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.active_sale_id, sale.pk)
+
+        # Применение расписания исправляет колонку, дальше цена читается из неё
+        apply_sale_schedule()
+        product.refresh_from_db()
+        self.assertIsNone(product.active_sale_id)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(
+                reverse("catalog:catalog"), {"filter[maxPrice]": "50", "limit": 30}
+            )
+        self.assertFalse([query for query in context if "catalog_sale" in query["sql"]])
+
+    def get_sales(self, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("catalog:sales"), {"limit": limit})
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(context)
+
+    def test_sales_show_active_sale_with_constant_queries(self):
+        today = timezone.now().date()
+        # Вторая действующая скидка выгоднее первой
+        Sale.objects.create(
+            product=self.products[0],
+            salePrice=Decimal("8.00"),
+            dateFrom=today,
+            dateTo=today + timedelta(days=3),
+        )
+        # Скидка из подзапроса и, после применения расписания, из колонки
+        for applied in (False, True):
+            with self.subTest(applied=applied):
+                if applied:
+                    apply_sale_schedule()
+                cache.clear()
+                _, small_queries = self.get_sales(3)
+                cache.clear()
+                data, queries = self.get_sales(15)
+                self.assertEqual(small_queries, queries)
+                self.assertEqual(
+                    [item["id"] for item in data["items"]],
+                    [product.pk for product in self.products[::2]],
+                )
+                first = data["items"][0]
+                self.assertEqual(Decimal(first["salePrice"]), Decimal("8.00"))
+                self.assertEqual(
+                    first["dateTo"], (today + timedelta(days=3)).strftime("%m-%d")
+                )
+
+
+class ReviewStatsTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Бытовая техника")
+        cls.product, cls.other = cls.create_products(cls.category, 2)
+        cls.user = User.objects.create_user(username="reviewer", password="secret")
+
+    def create_review(self, product, rate):
+        return Review.objects.create(
+            author=self.user, product=product, email="a@b.ru", rate=rate
+        )
+
+    def assertStats(self, product, reviews_count, rating_sum, rating):
+        product.refresh_from_db()
+        self.assertEqual(product.reviews_count, reviews_count)
+        self.assertEqual(product.rating_sum, rating_sum)
+        self.assertEqual(product.rating, Decimal(rating))
+
+    def test_stats_follow_create_edit_and_delete(self):
+        first = self.create_review(self.product, 5)
+        second = self.create_review(self.product, 4)
+        self.assertStats(self.product, 2, 9, "4.50")
+
+        second.rate = 2
+        second.save()
+        self.assertStats(self.product, 2, 7, "3.50")
+
+        second.product = self.other
+        second.save()
+        self.assertStats(self.product, 1, 5, "5.00")
+        self.assertStats(self.other, 1, 2, "2.00")
+
+        first.delete()
+        self.assertStats(self.product, 0, 0, "0")
+
+    def test_rebuild_review_stats(self):
+        self.create_review(self.product, 3)
+        self.create_review(self.product, 4)
+        Product.objects.update(reviews_count=0, rating_sum=0, rating=0)
+
+        call_command("rebuild_review_stats", stdout=StringIO())
+        self.assertStats(self.product, 2, 7, "3.50")
+        self.assertStats(self.other, 0, 0, "0")
+
+    def test_product_save_keeps_stats(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.create_review(self.product, 4)
+        stale.price = Decimal("999")
+        stale.save()
+        self.assertStats(self.product, 1, 4, "4.00")
+
+    def test_review_post(self):
+        self.client.force_login(self.user)
+        url = reverse("catalog:review", args=[self.product.pk])
+        # Проверка товара, вставка отзыва, UPDATE статистики
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, {"text": "Хорошо", "rate": 4})
+        self.assertEqual(response.status_code, 201)
+        product_queries = [
+            query["sql"]
+            for query in context
+            if query["sql"].startswith('SELECT "catalog_product"')
+        ]
+        self.assertEqual(len(product_queries), 1)
+        self.assertStats(self.product, 1, 4, "4.00")
+
+        url = reverse("catalog:review", args=[self.other.pk + 100])
+        response = self.client.post(url, {"text": "", "rate": 4})
+        self.assertEqual(response.status_code, 404)
+
+    def test_review_post_validation(self):
+        self.client.force_login(self.user)
+        url = reverse("catalog:review", args=[self.product.pk])
+        for data in ({"text": "Без оценки"}, {"rate": "abc"}, {"rate": 100}):
+            self.assertEqual(self.client.post(url, data).status_code, 400, data)
+        self.assertStats(self.product, 0, 0, "0.00")
+
+    def import_rows(self, count):
+        return [
+            {
+                "product": product.pk,
+                "author": self.user.pk,
+                "email": "a@b.ru",
+                "text": "Импорт",
+                "rate": index % 5 + 1,
+            }
+            for index in range(count)
+            for product in (self.product, self.other)
+        ]
+
+    def test_import_reviews_api(self):
+        url = reverse("catalog:reviews_import")
+        rows = self.import_rows(50)
+        self.client.force_login(self.user)
+        self.assertEqual(
+            self.client.post(url, rows, "application/json").status_code, 403
+        )
+
+        admin = User.objects.create_superuser(username="admin", password="secret")
+        self.client.force_login(admin)
+        # Пользователь, проверка id, одна вставка и два UPDATE статистики
+        with self.assertNumQueries(10):
+            response = self.client.post(url, rows, "application/json")
+        self.assertEqual(response.data, {"created": 100, "products": 2})
+        self.assertStats(self.product, 50, 150, "3.00")
+
+        rows[0]["product"] = self.other.pk + 100
+        response = self.client.post(url, rows, "application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Review.objects.count(), 100)
+
+    def test_import_reviews_command(self):
+        with NamedTemporaryFile("w", suffix=".json") as file:
+            json.dump([{"fields": row} for row in self.import_rows(3)], file)
+            file.flush()
+            call_command("import_reviews", file.name, stdout=StringIO())
+        self.assertStats(self.other, 3, 6, "2.00")
+
+
+class KeysetPaginationTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Смартфоны")
+        products = cls.create_products(cls.category, 45)
+        # Повторяющиеся значения ключей сортировки проверяют тай-брейкер по id
+        for index, product in enumerate(products):
+            product.price = product.effective_price = Decimal(100 + index % 7)
+            product.reviews_count = index % 3
+        Product.objects.bulk_update(
+            products, ["price", "effective_price", "reviews_count"]
+        )
+
+    def walk(self, params):
+        url = reverse("catalog:catalog")
+        response = self.client.get(url, {**params, "cursor": "", "limit": 10})
+        pages = [response.data]
+        while response.data["nextCursor"]:
+            response = self.client.get(
+                url, {**params, "cursor": response.data["nextCursor"], "limit": 10}
+            )
+            pages.append(response.data)
+        return pages
+
+    def test_keyset_matches_offset_order(self):
+        url = reverse("catalog:catalog")
+        for sort in ("price", "date", "reviews", "rating"):
+            for sort_type in ("inc", "dec"):
+                params = {"sort": sort, "sortType": sort_type}
+                expected = [
+                    item["id"]
+                    for item in self.client.get(url, {**params, "limit": 100}).data[
+                        "items"
+                    ]
+                ]
+                pages = self.walk(params)
+                ids = [item["id"] for page in pages for item in page["items"]]
+                self.assertEqual(ids, expected, params)
+                self.assertEqual(
+                    [page["currentPage"] for page in pages], [1, 2, 3, 4, 5]
+                )
+                self.assertTrue(all(page["lastPage"] == 5 for page in pages))
+
+    def test_deep_page_costs_the_same_as_first(self):
+        url = reverse("catalog:catalog")
+        params = {"sort": "price", "sortType": "inc", "limit": 10}
+        self.client.get(url, {**params, "cursor": ""})
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url, {**params, "cursor": ""})
+        cursor = self.walk({"sort": "price", "sortType": "inc"})[-2]["nextCursor"]
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(url, {**params, "cursor": cursor})
+        self.assertEqual(len(first), len(deep))
+        self.assertNotIn("COUNT", " ".join(query["sql"] for query in deep))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("catalog:catalog"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+        # Значения ключей не того типа, что поля сортировки
+        for values in (["abc", 1], ["10", "x"], [None, 1], [[1], 1]):
+            cursor = urlsafe_b64encode(
+                json.dumps({"values": values, "page": 1, "last": 5}).encode()
+            ).decode()
+            response = self.client.get(
+                reverse("catalog:catalog"),
+                {"sort": "price", "sortType": "inc", "cursor": cursor},
+            )
+            self.assertEqual(response.status_code, 404, values)
+
+
+class SearchTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Холодильники")
+        cls.fridge = Product.objects.create(
+            category=category,
+            title="Холодильник Beko",
+            description="Двухкамерный",
+        )
+        cls.freezer = Product.objects.create(
+            category=category,
+            title="Морозильная камера",
+            description="Подходит к любому холодильнику",
+        )
+        cls.kettle = Product.objects.create(
+            category=category, title="Чайник", fullDescription="Стальной корпус"
+        )
+
+    def search(self, text):
+        response = self.client.get(reverse("catalog:catalog"), {"filter[name]": text})
+        return [item["id"] for item in response.data["items"]]
+
+    def test_prefix_and_case_folding(self):
+        self.assertEqual(self.search("ХОЛОДИЛЬ"), [self.fridge.pk, self.freezer.pk])
+        self.assertEqual(self.search("beko"), [self.fridge.pk])
+        self.assertEqual(self.search("стальн"), [self.kettle.pk])
+        self.assertEqual(self.search("чайник beko"), [])
+
+    def test_query_without_words_finds_nothing(self):
+        self.assertEqual(self.search("!!!"), [])
+        response = self.client.get(
+            reverse("catalog:catalog"), {"filter[name]": "!!!", "sort": "price"}
+        )
+        self.assertEqual(response.data["items"], [])
+
+    def test_index_follows_product_changes(self):
+        self.kettle.title = "Электрочайник"
+        self.kettle.save()
+        self.assertEqual(self.search("электро"), [self.kettle.pk])
+        self.kettle.delete()
+        self.assertEqual(self.search("электро"), [])
+
+    def test_rebuild_search_index(self):
+        Product.objects.filter(pk=self.kettle.pk).update(title="Термопот")
+        self.assertEqual(self.search("термопот"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.search("термопот"), [self.kettle.pk])
+
+
+class FacetsTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(title="Техника")
+        cls.phones = Category.objects.create(title="Телефоны", parent=cls.root)
+        cls.laptops = Category.objects.create(title="Ноутбуки", parent=cls.root)
+        cls.phone_items = cls.create_products(cls.phones, 3, freeDelivery=True)
+        cls.laptop_items = cls.create_products(cls.laptops, 2, available=False)
+        cls.games = Tag.objects.create(name="Игры")
+        cls.games.products.set([cls.phone_items[0], *cls.laptop_items])
+        cls.office = Tag.objects.create(name="Офис")
+        cls.office.products.set(cls.laptop_items[:1])
+
+    def test_bitmap_round_trip(self):
+        ids = [1, 7, 8, 64, 1000]
+        self.assertEqual(from_bitmap(to_bitmap(ids)), ids)
+        self.assertEqual(from_bitmap(0), [])
+
+    def test_facet_counts(self):
+        response = self.client.get(
+            reverse("catalog:facets"), {"category": self.root.pk}
+        )
+        self.assertEqual(response.data["total"], 5)
+        self.assertEqual(
+            response.data["tags"],
+            [
+                {"id": self.games.pk, "name": "Игры", "count": 3},
+                {"id": self.office.pk, "name": "Офис", "count": 1},
+            ],
+        )
+        self.assertEqual(
+            {item["id"]: item["count"] for item in response.data["categories"]},
+            {self.phones.pk: 3, self.laptops.pk: 2},
+        )
+        self.assertEqual(response.data["price"], {"min": 100, "max": 102})
+        self.assertEqual(response.data["freeDelivery"], 3)
+        self.assertEqual(response.data["available"], 3)
+
+    def test_facets_follow_filters_and_changes(self):
+        params = {"category": self.root.pk, "filter[freeDelivery]": "true"}
+        self.assertEqual(
+            self.client.get(reverse("catalog:facets"), params).data["total"], 3
+        )
+
+        self.office.products.add(self.phone_items[1])
+        response = self.client.get(reverse("catalog:facets"), params)
+        self.assertEqual(
+            [(tag["name"], tag["count"]) for tag in response.data["tags"]],
+            [("Игры", 1), ("Офис", 1)],
+        )
+
+    def test_tag_filter_modes(self):
+        def catalog_ids(params):
+            response = self.client.get(reverse("catalog:catalog"), params)
+            return sorted(item["id"] for item in response.data["items"])
+
+        tags = [self.games.pk, self.office.pk]
+        laptop = self.laptop_items[0].pk
+        self.assertEqual(
+            catalog_ids({"tags[]": tags}),
+            sorted([self.phone_items[0].pk, *(p.pk for p in self.laptop_items)]),
+        )
+        self.assertEqual(catalog_ids({"tags[]": tags, "tagsMode": "all"}), [laptop])
+        self.assertEqual(catalog_ids({"tags[]": [self.office.pk, 0]}), [laptop])
+        self.assertEqual(catalog_ids({"tags[]": [0], "tagsMode": "all"}), [])
+
+    def test_tag_filter_does_not_join_tags(self):
+        request = Request(RequestFactory().get("/", {"tags[]": [self.games.pk]}))
+        queryset = ProductFilter().filter_queryset(request, Product.objects.all(), None)
+        self.assertNotIn("catalog_tag", str(queryset.query))
+        self.assertEqual(queryset.count(), 3)
+
+    def test_tags_by_category(self):
+        response = self.client.get(
+            reverse("catalog:tags"), {"category": self.phones.pk}
+        )
+        self.assertEqual(response.data, [{"id": self.games.pk, "name": "Игры"}])
+        response = self.client.get(reverse("catalog:tags"))
+        self.assertEqual(len(response.data), 2)
+
+    @patch("catalog.facets.PRICE_BUCKET_SIZE", 2)
+    def test_index_selection_matches_product_filter(self):
+        for index, product in enumerate(self.phone_items + self.laptop_items):
+            product.price = Decimal(100 + index * 10)
+            product.save()
+        cases = [
+            {"filter[minPrice]": "110"},
+            {"filter[maxPrice]": "125", "category": self.root.pk},
+            {"filter[minPrice]": "105", "filter[maxPrice]": "135"},
+            {"filter[minPrice]": "500"},
+            {"filter[available]": "true", "tags[]": [self.games.pk]},
+            {"subcategory": self.laptops.pk, "filter[freeDelivery]": "true"},
+        ]
+        index = facet_index.get()
+        for params in cases:
+            query = QueryDict(urlencode(params, doseq=True))
+            request = Request(RequestFactory().get("/", params))
+            queryset = ProductFilter().filter_queryset(
+                request, Product.objects.all(), None
+            )
+            bitmap = index.select(query)
+            self.assertEqual(from_bitmap(bitmap), sorted(p.pk for p in queryset))
+            prices = [product.effective_price for product in queryset]
+            self.assertEqual(
+                index.price_range(bitmap),
+                (min(prices, default=None), max(prices, default=None)),
+                params,
+            )
+
+        # Изменённый товар перечитывается без перестройки индекса
+        laptop = self.laptop_items[1]
+        laptop.price = Decimal(1)
+        laptop.available = True
+        laptop.save()
+        with self.assertNumQueries(2):
+            index = facet_index.get()
+        self.assertEqual(index.price_range(index.products), (Decimal(1), Decimal(130)))
+        self.assertEqual(index.available.bit_count(), 4)
+        response = self.client.get(reverse("catalog:facets"), {"filter[maxPrice]": "x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_price_filter_is_bad_request(self):
+        cases = [
+            (name, value, read_model_enabled)
+            for name in ("catalog:catalog", "catalog:facets")
+            for value in ("x", "NaN", "Infinity")
+            for read_model_enabled in (False, True)
+        ]
+        for name, value, read_model_enabled in cases:
+            with self.subTest(name=name, value=value, read_model=read_model_enabled):
+                with override_settings(CATALOG_READ_MODEL=read_model_enabled):
+                    response = self.client.get(
+                        reverse(name), {"filter[minPrice]": value}
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(
+                        response.data, {"error": "Некорректный фильтр по цене."}
+                    )
+
+
+# В CI numpy обязателен (requirements.txt): без него тесты падают, а не пропускаются
+@skipIf(np is None and not os.environ.get("CI"), "numpy не установлен")
+@override_settings(CATALOG_READ_MODEL=True)
+class ReadModelTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(title="Компьютеры")
+        cls.child = Category.objects.create(title="Мониторы", parent=cls.root)
+        cls.other = Category.objects.create(title="Посуда")
+        products = cls.create_products(cls.child, 12) + cls.create_products(
+            cls.other, 6, freeDelivery=True
+        )
+        for index, product in enumerate(products):
+            product.price = product.effective_price = Decimal(100 + index % 4)
+            product.rating = Decimal(index % 5)
+            product.reviews_count = index % 3
+            product.available = index % 4 != 0
+        Product.objects.bulk_update(
+            products,
+            ["price", "effective_price", "rating", "reviews_count", "available"],
+        )
+        cls.tag = Tag.objects.create(name="4K")
+        cls.tag.products.set(products[:5])
+        cls.second_tag = Tag.objects.create(name="HDR")
+        cls.second_tag.products.set(products[3:8])
+
+    def setUp(self):
+        super().setUp()
+        read_model.mark_stale()
+
+    def orm_ids(self, params):
+        request = Request(RequestFactory().get("/", params))
+        queryset = ProductFilter().filter_queryset(request, Product.objects.all(), None)
+        return list(queryset.values_list("id", flat=True))
+
+    def test_matches_orm_filters_and_sorting(self):
+        filters = [
+            {},
+            {"filter[minPrice]": "101", "filter[maxPrice]": "102"},
+            {"filter[freeDelivery]": "true"},
+            {"filter[available]": "true"},
+            {"category": str(self.root.pk)},
+            {"tags[]": [self.tag.pk, self.second_tag.pk]},
+            {"tags[]": [self.tag.pk, self.second_tag.pk], "tagsMode": "all"},
+        ]
+        for (sort, sort_type), extra in itertools.product(SORT_ORDERINGS, filters):
+            params = {"sort": sort, "sortType": sort_type, **extra}
+            query = QueryDict(urlencode(params, doseq=True))
+            self.assertEqual(
+                read_model.query(query).tolist(), self.orm_ids(params), params
+            )
+
+    def test_incremental_refresh(self):
+        query = QueryDict("sort=price&sortType=inc&filter[minPrice]=500")
+        self.assertEqual(read_model.query(query).tolist(), [])
+
+        product = Product.objects.create(category=self.other, title="Сервиз", price=900)
+        cheap = Product.objects.filter(category=self.child).first()
+        cheap.price = 600
+        cheap.save()
+        self.assertEqual(read_model.query(query).tolist(), [cheap.pk, product.pk])
+
+        product.delete()
+        self.assertEqual(read_model.query(query).tolist(), [cheap.pk])
+
+    def test_catalog_view_uses_read_model(self):
+        params = {"sort": "rating", "sortType": "inc", "limit": 5, "currentPage": 2}
+        response = self.client.get(reverse("catalog:catalog"), params)
+        self.assertEqual(
+            [item["id"] for item in response.data["items"]], self.orm_ids(params)[5:10]
+        )
+        self.assertEqual(response.data["lastPage"], 4)
+
+
+class ResponseCacheTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Книги")
+        cls.products = cls.create_products(cls.category, 3)
+
+    def test_cache_hits_and_invalidation(self):
+        url = reverse("catalog:catalog")
+        self.client.get(url, {"sort": "price", "sortType": "inc", "limit": 2})
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, {"limit": 2, "sortType": "inc", "sort": "price"}
+            )
+        self.assertEqual(response.data["items"][0]["title"], "Товар 0")
+        self.assertEqual(get_cache_stats()["catalog"], {"hits": 1, "misses": 1})
+
+        product = self.products[0]
+        product.title = "Новое название"
+        product.save()
+        response = self.client.get(
+            url, {"sort": "price", "sortType": "inc", "limit": 2}
+        )
+        self.assertEqual(response.data["items"][0]["title"], "Новое название")
+        self.assertEqual(get_cache_stats()["catalog"], {"hits": 1, "misses": 2})
+
+    def test_version_bumped_by_related_models(self):
+        version = get_catalog_version()
+        Sale.objects.create(
+            product=self.products[0],
+            salePrice=1,
+            dateFrom=timezone.now().date(),
+            dateTo=timezone.now().date(),
+        )
+        Tag.objects.create(name="Новинка").products.add(self.products[1])
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_stats_endpoint_is_for_admins(self):
+        url = reverse("catalog:cache_stats")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.get(reverse("catalog:catalog"))
+        self.client.get(reverse("catalog:catalog"))
+        admin = User.objects.create_superuser(username="admin", password="secret")
+        self.client.force_login(admin)
+        response = self.client.get(url)
+        self.assertEqual(response.data["version"], get_catalog_version())
+        self.assertEqual(response.data["stats"]["catalog"], {"hits": 1, "misses": 1})
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(get_cache_stats()["catalog"], {"hits": 0, "misses": 0})
+
+    def test_stats_command_requires_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command("catalog_cache_stats")
+
+
+class FragmentCacheTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Спорт")
+        cls.products = cls.create_products(cls.category, 4)
+        cls.tag = Tag.objects.create(name="Лето")
+        cls.tag.products.set(cls.products[:2])
+        cls.user = User.objects.create_user(username="athlete", password="secret")
+
+    def test_only_missing_fragments_are_built(self):
+        ids = [product.pk for product in self.products]
+        get_fragments(ids[:2])
+        # get_many по ключам и по одному запросу на товары, изображения и теги
+        with self.assertNumQueries(3):
+            fragments = get_fragments(ids)
+        self.assertEqual([fragment["id"] for fragment in fragments], ids)
+        with self.assertNumQueries(0):
+            get_fragments(reversed(ids))
+
+    def test_change_invalidates_only_its_product(self):
+        first, second = self.products[:2]
+        get_fragments([first.pk, second.pk])
+
+        first.title = "Мяч"
+        first.save()
+        self.assertIsNone(cache.get(fragment_key(first.pk)))
+        self.assertIsNotNone(cache.get(fragment_key(second.pk)))
+        self.assertEqual(get_fragments([first.pk])[0]["title"], "Мяч")
+
+        Review.objects.create(author=self.user, product=second, email="a@b.ru", rate=4)
+        self.assertEqual(get_fragments([second.pk])[0]["reviews"], 1)
+
+        self.tag.name = "Осень"
+        self.tag.save()
+        tags = [fragment["tags"] for fragment in get_fragments([first.pk, second.pk])]
+        self.assertEqual(tags, [[{"id": self.tag.pk, "name": "Осень"}]] * 2)
+
+        self.tag.products.clear()
+        self.assertEqual(get_fragments([first.pk])[0]["tags"], [])
+
+    def test_absolute_image_urls(self):
+        product = self.products[0]
+        ProductImage.objects.create(product=product, src="products/ball.png", alt="")
+        response = self.client.get(reverse("catalog:catalog"), {"limit": 1})
+        self.assertEqual(
+            response.data["items"][0]["images"][0]["src"],
+            "http://testserver/media/products/ball.png",
+        )
+        # В кеше ссылка хранится относительной
+        self.assertEqual(
+            cache.get(fragment_key(product.pk))["images"][0]["src"],
+            "/media/products/ball.png",
+        )
+
+
+class CategoryTreeTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(title="Дом")
+        cls.kitchen = Category.objects.create(title="Кухня", parent=cls.root)
+        cls.garden = Category.objects.create(title="Сад", parent=cls.root)
+        cls.empty = Category.objects.create(title="Пустая")
+        Category.objects.create(title="Пустая подкатегория", parent=cls.empty)
+        cls.product = Product.objects.create(category=cls.kitchen, title="Чайник")
+
+    def get_tree(self):
+        response = self.client.get(reverse("catalog:categories"))
+        return [
+            (node["id"], [child["id"] for child in node["subcategories"]])
+            for node in response.data
+        ]
+
+    def test_tree_is_built_once(self):
+        # Категории с изображениями и замыкание категорий
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get_tree(), [(self.root.pk, [self.kitchen.pk])])
+        with self.assertNumQueries(0):
+            self.get_tree()
+
+    def test_counters_follow_products(self):
+        self.product.category = self.garden
+        self.product.save()
+        self.assertEqual(self.get_tree(), [(self.root.pk, [self.garden.pk])])
+
+        self.product.available = False
+        self.product.save()
+        self.assertEqual(self.get_tree(), [])
+
+        Product.objects.create(category=self.empty, title="Коробка")
+        self.assertEqual(self.get_tree(), [(self.empty.pk, [])])
+
+        Product.objects.filter(category=self.empty).delete()
+        self.assertEqual(self.get_tree(), [])
+
+    def test_category_changes_and_rebuild(self):
+        self.get_tree()
+        self.kitchen.title = "Посуда"
+        self.kitchen.save()
+        response = self.client.get(reverse("catalog:categories"))
+        self.assertEqual(response.data[0]["subcategories"][0]["title"], "Посуда")
+
+        Category.objects.update(available_count=0)
+        self.assertEqual(rebuild_category_counts(), 5)
+        self.kitchen.refresh_from_db()
+        self.assertEqual(self.kitchen.available_count, 1)
+
+
+class CategoryClosureTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tools = Category.objects.create(title="Инструменты")
+        cls.drills = Category.objects.create(title="Дрели", parent=cls.tools)
+        cls.saws = Category.objects.create(title="Пилы", parent=cls.tools)
+        cls.garden = Category.objects.create(title="Сад")
+        cls.create_products(cls.tools, 1)
+        cls.create_products(cls.drills, 2)
+        cls.create_products(cls.saws, 3)
+
+    def links(self):
+        return set(
+            CategoryClosure.objects.values_list("ancestor_id", "descendant_id", "depth")
+        )
+
+    def catalog_count(self, params):
+        queryset = ProductFilter().filter_queryset(
+            Request(RequestFactory().get("/", params)), Product.objects.all(), None
+        )
+        return queryset.count()
+
+    def test_closure_follows_moves_and_deletes(self):
+        tools, drills, saws, garden = self.tools, self.drills, self.saws, self.garden
+        self.assertEqual(
+            get_category_descendants()[tools.pk], [tools.pk, drills.pk, saws.pk]
+        )
+
+        saws.parent = garden
+        saws.save()
+        self.assertEqual(get_category_descendants()[garden.pk], [garden.pk, saws.pk])
+        self.assertEqual(get_category_descendants()[tools.pk], [tools.pk, drills.pk])
+
+        links = self.links()
+        self.assertEqual(rebuild_category_closure(), len(links))
+        self.assertEqual(self.links(), links)
+
+        drills.delete()
+        self.assertEqual(get_category_descendants()[tools.pk], [tools.pk])
+
+    def test_category_and_subcategory_filters(self):
+        self.assertEqual(self.catalog_count({"category": self.tools.pk}), 6)
+        self.assertEqual(
+            self.catalog_count(
+                {"category": self.tools.pk, "subcategory": self.saws.pk}
+            ),
+            3,
+        )
+        self.assertEqual(self.catalog_count({"subcategory": self.drills.pk}), 2)
+        self.assertEqual(
+            self.catalog_count(
+                {"category": self.garden.pk, "subcategory": self.saws.pk}
+            ),
+            0,
+        )
+        self.assertEqual(category_filter_ids("abc", None), [])
+        self.assertIsNone(category_filter_ids(None, ""))
+
+    def test_filter_reads_cached_descendants(self):
+        self.catalog_count({"category": self.tools.pk})
+        with CaptureQueriesContext(connection) as context:
+            self.catalog_count({"category": self.tools.pk})
+        self.assertEqual(len(context), 1)
+        self.assertNotIn("catalog_category", context[0]["sql"])
+
+
+class ProductDetailTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Музыка")
+        cls.product, cls.other = cls.create_products(cls.category, 2)
+        Tag.objects.create(name="Винил").products.add(cls.product)
+        ProductSpecification.objects.create(
+            product=cls.product, name="Скорость", value="33"
+        )
+        cls.users = [
+            User.objects.create_user(username=f"listener{index}", password="secret")
+            for index in range(3)
+        ]
+
+    def get_detail(self, product=None, **headers):
+        product = product or self.product
+        return self.client.get(
+            reverse("catalog:product_detail", args=[product.pk]), **headers
+        )
+
+    def add_review(self, user, rate=5):
+        Review.objects.create(
+            author=user, product=self.product, email="a@b.ru", text="", rate=rate
+        )
+
+    def test_query_count_does_not_depend_on_reviews(self):
+        self.add_review(self.users[0])
+        applied_schedule_date()
+        # Товар с ценой, изображения, теги, характеристики, отзывы с авторами
+        with self.assertNumQueries(5):
+            self.get_detail()
+
+        for user in self.users[1:]:
+            self.add_review(user)
+        with self.assertNumQueries(5):
+            response = self.get_detail()
+        self.assertEqual(len(response.data["reviews"]), 3)
+        self.assertEqual(response.data["specifications"][0]["value"], "33")
+
+    @override_settings(CATALOG_DETAIL_REVIEWS=2)
+    def test_latest_reviews_and_pagination(self):
+        for rate, user in enumerate(self.users, start=1):
+            self.add_review(user, rate)
+        response = self.get_detail()
+        self.assertEqual(
+            [review["rate"] for review in response.data["reviews"]], [3, 2]
+        )
+        self.assertEqual(response.data["reviewsCount"], 3)
+
+        url = reverse("catalog:review", args=[self.product.pk])
+        response = self.client.get(url, {"limit": 2})
+        self.assertEqual(
+            [review["rate"] for review in response.data["results"]], [3, 2]
+        )
+        self.assertEqual(response.data["results"][0]["author"], "listener2")
+        # Автор загружается вместе с отзывом
+        with self.assertNumQueries(2):
+            response = self.client.get(response.data["next"])
+        self.assertEqual([review["rate"] for review in response.data["results"]], [1])
+        self.assertIsNone(response.data["next"])
+
+        self.assertEqual(
+            self.client.post(url, {"text": "", "rate": 5}).status_code, 401
+        )
+        other_url = reverse("catalog:review", args=[self.other.pk + 100])
+        self.assertEqual(self.client.get(other_url).status_code, 404)
+
+    def test_conditional_get(self):
+        response = self.get_detail()
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            response = self.get_detail(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            response = self.get_detail(
+                HTTP_IF_MODIFIED_SINCE=self.get_detail()["Last-Modified"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+        # Изменения другого товара не сбрасывают версию
+        self.other.title = "Другое"
+        self.other.save()
+        self.assertEqual(self.get_detail(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ProductSpecification.objects.create(product=self.product, name="Вес", value="1")
+        response = self.get_detail(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["specifications"]), 2)
+
+    def test_missing_product(self):
+        product_id = self.other.pk
+        self.other.delete()
+        response = self.client.get(reverse("catalog:product_detail", args=[product_id]))
+        self.assertEqual(response.status_code, 404)
+
+        # Совпадающий ETag не превращает отсутствующий товар в 304
+        etag = quote_etag(product_etag(product_id, get_product_version(product_id)))
+        response = self.client.get(
+            reverse("catalog:product_detail", args=[product_id]),
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ShelvesTestCase(CatalogTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Игрушки")
+        cls.products = cls.create_products(cls.category, 10, limited=True)
+        today = timezone.now().date()
+        sale = Sale.objects.create(
+            product=cls.products[0], salePrice=50, dateFrom=today, dateTo=today
+        )
+        Banner.objects.create(sale=sale, titul="Распродажа")
+
+    def test_homepage_served_from_cache(self):
+        refresh_shelves()
+        with self.assertNumQueries(0):
+            popular = self.client.get(reverse("catalog:popular")).data
+            limited = self.client.get(reverse("catalog:limited")).data
+            banners = self.client.get(reverse("catalog:banners")).data
+        self.assertEqual(len(popular), 8)
+        self.assertEqual(len(limited), 10)
+        self.assertEqual([item["id"] for item in banners], [self.products[0].pk])
+        self.assertEqual(Decimal(banners[0]["price"]), Decimal(50))
+        self.assertEqual(get_cache_stats()["banners"], {"hits": 1, "misses": 0})
+
+    def test_shelf_follows_changes(self):
+        self.client.get(reverse("catalog:limited"))
+        product = self.products[3]
+        product.limited = False
+        product.save()
+        response = self.client.get(reverse("catalog:limited"))
+        self.assertNotIn(product.pk, [item["id"] for item in response.data])
+        self.assertEqual(get_cache_stats()["limited"], {"hits": 0, "misses": 2})
+
+    def test_banner_changes_refresh_shelf(self):
+        today = timezone.now().date()
+        sale = Sale.objects.create(
+            product=self.products[1], salePrice=60, dateFrom=today, dateTo=today
+        )
+        self.client.get(reverse("catalog:banners"))
+        banner = Banner.objects.create(sale=sale, titul="Новинка")
+        response = self.client.get(reverse("catalog:banners"))
+        self.assertIn(self.products[1].pk, [item["id"] for item in response.data])
+
+        banner.delete()
+        response = self.client.get(reverse("catalog:banners"))
+        self.assertNotIn(self.products[1].pk, [item["id"] for item in response.data])
+
+    def test_stale_shelf_served_while_another_request_rebuilds(self):
+        self.client.get(reverse("catalog:limited"))
+        product = self.products[3]
+        product.limited = False
+        product.save()
+        cache.add(SHELF_LOCK_KEY.format(name="limited"), True)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("catalog:limited"))
+        self.assertIn(product.pk, [item["id"] for item in response.data])
+
+        cache.delete(SHELF_LOCK_KEY.format(name="limited"))
+        response = self.client.get(reverse("catalog:limited"))
+        self.assertNotIn(product.pk, [item["id"] for item in response.data])
+
+    def test_refresh_command_requires_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command("refresh_shelves", stdout=StringIO())
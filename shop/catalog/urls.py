@@ -8,6 +8,10 @@ from .views import (
     LimitedProductsView,
     SaleView,
     BannerProductsView,
+    TagsView,
+    CatalogFacetsView,
+    ReviewImportView,
+    CacheStatsView,
 )
 
 app_name = "catalog"
@@ -16,9 +20,13 @@ urlpatterns = [
     path("api/categories/", CategoriesListView.as_view(), name="categories"),
     path("api/product/<int:pk>/", ProductDetailView.as_view(), name="product_detail"),
     path("api/product/<int:pk>/reviews", ProductReviewView.as_view(), name="review"),
+    path("api/reviews/import", ReviewImportView.as_view(), name="reviews_import"),
     path("api/products/popular", PopularProductsView.as_view(), name="popular"),
     path("api/products/limited", LimitedProductsView.as_view(), name="limited"),
     path("api/catalog", CatalogAPIView.as_view(), name="catalog"),
+    path("api/catalog/facets", CatalogFacetsView.as_view(), name="facets"),
+    path("api/catalog/cache-stats", CacheStatsView.as_view(), name="cache_stats"),
+    path("api/tags", TagsView.as_view(), name="tags"),
     path("api/sales", SaleView.as_view(), name="sales"),
     path("api/banners", BannerProductsView.as_view(), name="banners"),
 ]
@@ -1,67 +1,104 @@
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.generics import GenericAPIView, RetrieveAPIView, ListAPIView
+from rest_framework.generics import (
+    GenericAPIView,
+    get_object_or_404,
+)
 from rest_framework.mixins import ListModelMixin
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework import status, exceptions
-from django.db.models import Count, Avg
-from django.utils import timezone
-from .models import Category, Product, Review, Banner
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .models import Product, Review
 from .serializers import (
-    CategorySerializer,
-    ProductSerializer,
     ReviewSerializer,
+    ReviewCreateSerializer,
+    ReviewImportSerializer,
     ProductCatalogSerializer,
     SaleProductSerializer,
 )
-from .paginators import CatalogPagination
+from .paginators import (
+    CatalogPagination,
+    CatalogKeysetPagination,
+    ReviewCursorPagination,
+)
 from .filters import ProductFilter
+from .facets import get_facet_index
+from . import readmodel
+from .cache import (
+    cached_response,
+    get_cache_stats,
+    get_catalog_version,
+    reset_cache_stats,
+)
+from .fragments import get_fragments
+from .categories import get_category_tree
+from .pricing import with_active_sale
+from .reviews import import_reviews
+from .shelves import get_shelf
+from .detail import get_product_detail, get_product_version, product_etag
 
 
-class CategoriesListView(ListAPIView):
-    serializer_class = CategorySerializer
-    pagination_class = None
-
-    def get_queryset(self):
-        # Фильтруем категории, которые имеют хотя бы одну подкатегорию
-        # и хотя бы один доступный товар
-        queryset = (
-            Category.objects.annotate(
-                subcategory_count=Count("subcategories"),
-            )
-            .filter(subcategory_count__gt=0)
-            .order_by("id")
+class CategoriesListView(APIView):
+    def get(self, request):
+        # Категории, которые имеют хотя бы одну подкатегорию
+        # и хотя бы один доступный товар (см. catalog.categories)
+        return Response(get_category_tree(request))
+
+
+class ProductDetailView(APIView):
+    def get(self, request, pk):
+        version = get_product_version(pk)
+        # Карточка берётся из кеша под версией; товара нет — 404 даже при
+        # совпадающем If-None-Match
+        data = get_product_detail(pk, version, request)
+        if data is None:
+            raise exceptions.NotFound()
+        etag = quote_etag(product_etag(pk, version))
+        last_modified = version // 1_000_000
+
+        # Повторный просмотр отвечает 304 без обращения к базе
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
         )
-        return queryset
-
+        if not_modified is not None:
+            return not_modified
 
-class ProductDetailView(RetrieveAPIView):
-    queryset = Product.objects.all()
-    serializer_class = ProductSerializer
+        response = Response(data)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
 
 
 class ProductReviewView(APIView):
-    permission_classes = [IsAuthenticated]
+    # Читать отзывы можно всем, оставлять — только авторизованным
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request, pk):
+        if not Product.objects.filter(pk=pk).exists():
+            raise exceptions.NotFound()
+        reviews = Review.objects.filter(product_id=pk).select_related("author")
+        paginator = ReviewCursorPagination()
+        page = paginator.paginate_queryset(reviews, request, view=self)
+        serializer = ReviewSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, pk):
-        product = Product.objects.get(pk=pk)
-
-        review = Review.objects.create(
-            author=request.user,
-            product=Product.objects.get(pk=pk),
-            email=request.user.profile.email,
-            text=request.data["text"],
-            rate=request.data["rate"],
-        )
-
-        avg_rating = Review.objects.filter(product=product).aggregate(Avg("rate"))[
-            "rate__avg"
-        ]
-
-        # Обновляем рейтинг продукта
-        product.rating = round(avg_rating, 2) if avg_rating else 0
-        product.save()
+        product = get_object_or_404(Product.objects.only("pk"), pk=pk)
+        data = ReviewCreateSerializer(data=request.data)
+        data.is_valid(raise_exception=True)
+
+        # Рейтинг и количество отзывов товара обновляются одним UPDATE
+        # в сигнале (catalog.stats) — в одной транзакции со вставкой отзыва
+        with transaction.atomic():
+            review = Review.objects.create(
+                author=request.user,
+                product=product,
+                email=request.user.profile.email,
+                **data.validated_data,
+            )
 
         serializer = ReviewSerializer(review)
 
@@ -77,39 +114,83 @@ class ProductReviewView(APIView):
         return super().handle_exception(exc)
 
 
+class CacheStatsView(APIView):
+    """Статистика кеша ответов каталога в процессе, обслуживающем запрос"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"version": get_catalog_version(), "stats": get_cache_stats()})
+
+    def delete(self, request):
+        reset_cache_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ReviewImportView(APIView):
+    """Массовый импорт отзывов администратором"""
+
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = ReviewImportSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            created, products = import_reviews(serializer.validated_data)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {"created": created, "products": products}, status=status.HTTP_201_CREATED
+        )
+
+
 class CatalogAPIView(ListModelMixin, GenericAPIView):
-    queryset = (
-        Product.objects.all()
-        .prefetch_related("images")
-        .prefetch_related("tags")
-        .prefetch_related("reviews")
-        # .select_related("sale")
-    )
     pagination_class = CatalogPagination
     serializer_class = ProductCatalogSerializer
 
     filter_backends = [ProductFilter]
 
+    def get_queryset(self):
+        # Карточки товаров страницы собираются из фрагментов (catalog.fragments)
+        return Product.objects.all()
+
+    @property
+    def paginator(self):
+        # Параметр cursor (в том числе пустой) включает keyset-пагинацию
+        if not hasattr(self, "_paginator"):
+            if CatalogKeysetPagination.cursor_query_param in self.request.query_params:
+                self._paginator = CatalogKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        ids = None
+        if readmodel.is_enabled() and not isinstance(
+            self.paginator, CatalogKeysetPagination
+        ):
+            # Фильтрация и сортировка выполняются в read-модели
+            ids = readmodel.read_model.query(request.query_params)
+        if ids is not None:
+            page_ids = [int(product_id) for product_id in self.paginate_queryset(ids)]
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            page_ids = [product.pk for product in self.paginate_queryset(queryset)]
+        return self.get_paginated_response(get_fragments(page_ids, request))
+
+    @cached_response("catalog")
     def get(self, request):
         return self.list(request)
 
 
 class PopularProductsView(APIView):
     def get(self, request):
-        popular_products = Product.objects.order_by("-rating")[:8]
-
-        serializer = ProductCatalogSerializer(popular_products, many=True)
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(get_shelf("popular"), status=status.HTTP_200_OK)
 
 
 class LimitedProductsView(APIView):
     def get(self, request):
-        limited_products = Product.objects.filter(limited=True)[:16]
-
-        serializer = ProductCatalogSerializer(limited_products, many=True)
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(get_shelf("limited"), status=status.HTTP_200_OK)
 
 
 class SaleView(ListModelMixin, GenericAPIView):
@@ -117,28 +198,47 @@ class SaleView(ListModelMixin, GenericAPIView):
     serializer_class = SaleProductSerializer
 
     def get_queryset(self):
-        current_date = timezone.now().date()
-        return Product.objects.filter(
-            sales__dateFrom__lte=current_date, sales__dateTo__gte=current_date
-        ).distinct()
+        return with_active_sale(
+            Product.objects.order_by("id").prefetch_related("images")
+        )
 
+    @cached_response("sales")
     def get(self, request):
         return self.list(request)
 
 
-class BannerProductsView(ListAPIView):
-    serializer_class = ProductCatalogSerializer
+class BannerProductsView(APIView):
+    def get(self, request):
+        return Response(get_shelf("banners", request))
 
-    def get_queryset(self):
-        current_date = timezone.now().date()
-        active_banners = Banner.objects.filter(
-            sale__dateTo__gte=current_date
-        ).select_related("sale__product")
 
-        products = [banner.sale.product for banner in active_banners]
-        return products
+class TagsView(APIView):
+    def get(self, request):
+        index = get_facet_index()
+        category = request.query_params.get("category")
+        if category and category.isdigit():
+            bitmap = index.categories.get(int(category), 0)
+        else:
+            bitmap = index.products
+        tags = [
+            {"id": tag["id"], "name": tag["name"]} for tag in index.tag_counts(bitmap)
+        ]
+        return Response(tags, status=status.HTTP_200_OK)
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+
+class CatalogFacetsView(APIView):
+    """Счётчики фасетов боковой панели каталога для текущих фильтров"""
+
+    def get(self, request):
+        # Выборка — пересечением масок индекса, без загрузки id из базы
+        index = get_facet_index()
+        bitmap = index.select(request.query_params)
+        if bitmap is None:
+            return Response(
+                {"error": "Некорректный фильтр по цене."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        category = request.query_params.get("category")
+        category = int(category) if category and category.isdigit() else None
+        facets = index.facets(bitmap, category)
+        return Response(facets, status=status.HTTP_200_OK)
@@ -0,0 +1,65 @@
+"""
+Оформление заказа из корзины пользователя
+
+Конвейер выполняется в одной транзакции и фиксированным числом операторов
+независимо от размера корзины: вставка заказа, чтение строк корзины вместе
+с названиями и действующими ценами товаров, пакетная вставка строк заказа
+(bulk_create), резервирование остатков (orders.stock), запись итоговой
+стоимости и удаление строк корзины. Цены и названия копируются в строки
+заказа, поэтому последующие изменения каталога не меняют оформленные
+заказы.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+
+from basket.models import BasketItem
+from catalog.pricing import price_expression
+
+from .models import ORDER_STATUS_CREATED, Order, OrderLine
+from .stock import reserve_stock
+
+
+def checkout(user) -> Order:
+    """
+    Создаёт заказ из корзины пользователя.
+
+    ValueError, если корзина пуста, и OutOfStock, если какого-то товара
+    не хватает на складе, — тогда заказ не создаётся.
+    """
+    # Действующие цены на сегодня (catalog.pricing) — в запросе строк корзины
+    price = price_expression("product")
+    items = BasketItem.objects.filter(basket__user=user)
+    with transaction.atomic():
+        # Первый оператор транзакции — запись: блокировку записи SQLite
+        # соединение ждёт (timeout), а не получает "database is locked" при
+        # попытке перейти от чтения к записи
+        order = Order.objects.create(user=user, status=ORDER_STATUS_CREATED)
+        rows = list(
+            items.annotate(price=price).values_list(
+                "product_id",
+                "basket_count",
+                "product__title",
+                "price",
+            )
+        )
+        if not rows:
+            raise ValueError("Корзина пуста.")
+        reserve_stock(order, {product_id: count for product_id, count, *_ in rows})
+
+        lines = [
+            OrderLine(
+                order=order,
+                product_id=product_id,
+                title=title,
+                price=price,
+                count=count,
+            )
+            for product_id, count, title, price in rows
+        ]
+        OrderLine.objects.bulk_create(lines)
+        order.totalCost = sum((line.price * line.count for line in lines), Decimal(0))
+        order.save(update_fields=["totalCost"])
+        items.delete()
+    return order
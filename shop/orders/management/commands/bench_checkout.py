@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from statistics import mean
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from basket.models import Basket, BasketItem
+from catalog.models import Category, Product
+from orders.checkout import checkout
+
+USERNAME_PREFIX = "bench-checkout-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест оформления заказов: несколько потоков оформляют "
+        "заказы из корзин синтетических пользователей, результат — заказов в секунду. "
+        "Тест идёт на временной копии схемы, рабочая база не изменяется"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="число потоков")
+        parser.add_argument("--lines", type=int, default=20, help="товаров в корзине")
+        parser.add_argument(
+            "--seconds", type=float, default=10, help="длительность теста, секунды"
+        )
+        parser.add_argument(
+            "--journal-mode",
+            default="wal",
+            help="режим журнала SQLite (PRAGMA journal_mode), по умолчанию wal",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Тест рассчитан на SQLite")
+        # Потокам нужны зафиксированные транзакции, поэтому вместо отката —
+        # отдельный файл базы: режим журнала (WAL сохраняется в файле) и
+        # синтетические данные не попадают в рабочую базу
+        with TemporaryDirectory() as directory:
+            connection.settings_dict["TEST"] = {
+                **connection.settings_dict.get("TEST", {}),
+                "NAME": os.path.join(directory, "bench_checkout.sqlite3"),
+            }
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+            try:
+                self.bench(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def bench(self, options):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode = {options['journal_mode']}")
+            journal_mode = cursor.fetchone()[0]
+        self.stdout.write(f"Режим журнала: {journal_mode}")
+
+        users, products = self.prepare(options["threads"], options["lines"])
+        self.run(users, products, options["seconds"])
+
+    def prepare(self, threads, lines):
+        category = Category.objects.create(title=f"{USERNAME_PREFIX}category")
+        products = Product.objects.bulk_create(
+            Product(
+                category=category,
+                title=f"Товар {index}",
+                price=100,
+                effective_price=100,
+                # Остатка хватает на весь прогон: меряется оформление, а не отказы
+                count=10**9,
+            )
+            for index in range(lines)
+        )
+        users = [
+            User.objects.create_user(username=f"{USERNAME_PREFIX}{index}")
+            for index in range(threads)
+        ]
+        Basket.objects.bulk_create(Basket(user=user) for user in users)
+        return users, products
+
+    def run(self, users, products, seconds):
+        deadline = time.monotonic() + seconds
+        latencies, errors = [], []
+
+        def worker(user):
+            basket = Basket.objects.get(user=user)
+            try:
+                while time.monotonic() < deadline:
+                    BasketItem.objects.bulk_create(
+                        BasketItem(basket=basket, product=product, basket_count=2)
+                        for product in products
+                    )
+                    started = time.perf_counter()
+                    checkout(user)
+                    latencies.append(time.perf_counter() - started)
+            except Exception as error:  # noqa: BLE001 - выводится в отчёте
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Потоков: {len(users)}, товаров в заказе: {len(products)}, "
+            f"заказов: {len(latencies)} за {elapsed:.1f} с"
+        )
+        if latencies:
+            self.stdout.write(
+                f"Оформление заказа: в среднем {mean(latencies) * 1000:.1f} мс, "
+                f"максимум {max(latencies) * 1000:.1f} мс"
+            )
+        for error in errors:
+            self.stderr.write(f"Ошибка: {error!r}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Заказов в секунду: {len(latencies) / elapsed:.1f}")
+        )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.stock import expire_reservations
+
+
+class Command(BaseCommand):
+    help = "Возвращает на склад товары неоплаченных заказов с истёкшим резервом"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="работать постоянно, снимая истёкшие резервы",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=60,
+            help="период проверки в режиме --loop, секунды",
+        )
+
+    def handle(self, *args, **options):
+        self.report(expire_reservations())
+        while options["loop"]:
+            time.sleep(options["interval"])
+            self.report(expire_reservations())
+
+    def report(self, released):
+        self.stdout.write(f"Снято резервов: {released}")
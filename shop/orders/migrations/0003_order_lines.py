@@ -0,0 +1,104 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_order_products(apps, schema_editor):
+    # Товары старых заказов становятся строками: по одной единице, цена — текущая
+    Order = apps.get_model("orders", "Order")
+    OrderLine = apps.get_model("orders", "OrderLine")
+    links = Order.products.through.objects.values_list(
+        "order_id", "product_id", "product__title", "product__price"
+    )
+    OrderLine.objects.bulk_create(
+        OrderLine(
+            order_id=order_id, product_id=product_id, title=title, price=price, count=1
+        )
+        for order_id, product_id, title, price in links.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0022_sale_dates_index"),
+        ("orders", "0002_order_products"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="email",
+            field=models.EmailField(
+                blank=True, max_length=254, null=True, verbose_name="Email"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="fullName",
+            field=models.CharField(
+                blank=True, max_length=150, null=True, verbose_name="Имя покупателя"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="phone",
+            field=models.CharField(
+                blank=True, max_length=20, null=True, verbose_name="Телефон"
+            ),
+        ),
+        migrations.CreateModel(
+            name="OrderLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "title",
+                    models.CharField(max_length=100, verbose_name="Название товара"),
+                ),
+                (
+                    "price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=8, verbose_name="Цена за единицу"
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(verbose_name="Количество")),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="orders.order",
+                        verbose_name="Заказ",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="order_lines",
+                        to="catalog.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Строка заказа",
+                "verbose_name_plural": "Строки заказа",
+            },
+        ),
+        migrations.RunPython(copy_order_products, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="order",
+            name="products",
+        ),
+    ]
@@ -2,6 +2,13 @@ from django.db import models
 from django.contrib.auth.models import User
 from catalog.models import Product
 
+# Статусы заказа: оформлен из корзины, подтверждён покупателем (товары
+# в резерве), оплачен, отменён по истечении резерва (orders.stock)
+ORDER_STATUS_CREATED = "created"
+ORDER_STATUS_ACCEPTED = "accepted"
+ORDER_STATUS_PAID = "paid"
+ORDER_STATUS_CANCELLED = "cancelled"
+
 
 class Order(models.Model):
     """Класс для заказа"""
@@ -10,7 +17,13 @@ class Order(models.Model):
         auto_now_add=True, verbose_name="Дата создания заказа"
     )
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
-    products = models.ManyToManyField(Product, related_name="orders")
+    fullName = models.CharField(
+        max_length=150, blank=True, null=True, verbose_name="Имя покупателя"
+    )
+    email = models.EmailField(blank=True, null=True, verbose_name="Email")
+    phone = models.CharField(
+        max_length=20, blank=True, null=True, verbose_name="Телефон"
+    )
     deliveryType = models.CharField(
         max_length=20, blank=True, null=True, verbose_name="Тип доставки"
     )
@@ -39,3 +52,57 @@ class Order(models.Model):
 
     def __str__(self) -> str:
         return f"Order {self.pk} пользователя {self.user}"
+
+
+class OrderLine(models.Model):
+    """Строка заказа: товар, количество и цена на момент оформления"""
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="lines", verbose_name="Заказ"
+    )
+    # Строка остаётся в истории и после удаления товара из каталога
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="order_lines",
+        verbose_name="Товар",
+    )
+    title = models.CharField(max_length=100, verbose_name="Название товара")
+    price = models.DecimalField(
+        max_digits=8, decimal_places=2, verbose_name="Цена за единицу"
+    )
+    count = models.PositiveIntegerField(verbose_name="Количество")
+
+    class Meta:
+        verbose_name = "Строка заказа"
+        verbose_name_plural = "Строки заказа"
+
+    def __str__(self) -> str:
+        return f"{self.title} x {self.count}"
+
+
+class StockReservation(models.Model):
+    """Товар, отложенный под неоплаченный заказ до expires_at (orders.stock)"""
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="reservations",
+        verbose_name="Заказ",
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="reservations",
+        verbose_name="Товар",
+    )
+    count = models.PositiveIntegerField(verbose_name="Количество")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Действует до")
+
+    class Meta:
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+
+    def __str__(self) -> str:
+        return f"{self.product} x {self.count} для заказа {self.order_id}"
@@ -0,0 +1,64 @@
+from typing import Iterable, List
+
+from rest_framework import serializers
+
+from catalog.fragments import get_fragments
+
+from .models import Order
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    """Заказ; товары (products) добавляются функцией serialize_orders"""
+
+    createdAt = serializers.DateTimeField(
+        source="created_add", format="%Y-%m-%d %H:%M", read_only=True
+    )
+
+    class Meta:
+        model = Order
+        fields = [
+            "id",
+            "createdAt",
+            "fullName",
+            "email",
+            "phone",
+            "deliveryType",
+            "paymentType",
+            "totalCost",
+            "status",
+            "city",
+            "address",
+        ]
+        read_only_fields = ["id", "totalCost", "status"]
+
+
+def serialize_orders(orders: Iterable[Order]) -> List[dict]:
+    """
+    Заказы с товарами в формате корзины.
+
+    Карточки товаров берутся из кеша фрагментов одним get_many на все заказы;
+    count и price (стоимость строки на момент оформления) — из строк заказа.
+    Строки товаров, удалённых из каталога, выводятся по сохранённому названию.
+    Строки заказов должны быть загружены prefetch_related("lines").
+    """
+    orders = list(orders)
+    product_ids = {
+        line.product_id
+        for order in orders
+        for line in order.lines.all()
+        if line.product_id is not None
+    }
+    cards = {card["id"]: card for card in get_fragments(sorted(product_ids))}
+
+    result = []
+    for order in orders:
+        data = OrderSerializer(order).data
+        data["products"] = []
+        for line in order.lines.all():
+            product = dict(cards.get(line.product_id) or {"id": None, "images": []})
+            product.update(
+                title=line.title, count=line.count, price=line.price * line.count
+            )
+            data["products"].append(product)
+        result.append(data)
+    return result
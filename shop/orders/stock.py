@@ -0,0 +1,129 @@
+"""
+Резервирование остатков товаров под неоплаченные заказы
+
+При оформлении заказа остатки (Product.count) списываются одним условным
+UPDATE ... SET count = count - n WHERE count >= n для всех товаров сразу:
+без чтения остатков перед записью и без общей блокировки, поэтому
+одновременные заказы не продают больше, чем есть на складе. Списанное
+хранится в StockReservation до оплаты заказа или до истечения
+ORDER_RESERVATION_TTL; истёкшие резервы возвращаются на склад командой
+expire_reservations, а их заказы отменяются.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from catalog.cache import bump_catalog_version
+from catalog.detail import bump_product_versions
+from catalog.fragments import invalidate_fragments
+from catalog.models import Product
+
+from .models import (
+    ORDER_STATUS_ACCEPTED,
+    ORDER_STATUS_CANCELLED,
+    ORDER_STATUS_CREATED,
+    ORDER_STATUS_PAID,
+    Order,
+    StockReservation,
+)
+
+# Заказы, товары которых ещё в резерве
+PENDING_STATUSES = (ORDER_STATUS_CREATED, ORDER_STATUS_ACCEPTED)
+
+
+class OutOfStock(ValueError):
+    pass
+
+
+def per_product(counts: Dict[int, int]) -> Case:
+    """Выражение «количество для товара строки» для UPDATE по нескольким товарам"""
+    return Case(
+        *(
+            When(pk=product_id, then=Value(count))
+            for product_id, count in counts.items()
+        ),
+        output_field=IntegerField(),
+    )
+
+
+def invalidate_stock(product_ids: Iterable[int]) -> None:
+    # Остаток выводится в карточках и на странице товара
+    product_ids = list(product_ids)
+    invalidate_fragments(product_ids)
+    bump_product_versions(product_ids)
+    bump_catalog_version()
+
+
+def reserve_stock(order: Order, counts: Dict[int, int]) -> None:
+    """
+    Списывает остатки товаров заказа и создаёт резервы.
+
+    Вызывается внутри транзакции: если какого-то товара не хватает,
+    OutOfStock откатывает и уже списанные остатки.
+    """
+    quantity = per_product(counts)
+    updated = Product.objects.filter(pk__in=list(counts), count__gte=quantity).update(
+        count=F("count") - quantity
+    )
+    if updated != len(counts):
+        raise OutOfStock("Недостаточно товара на складе.")
+
+    expires_at = timezone.now() + timedelta(seconds=settings.ORDER_RESERVATION_TTL)
+    StockReservation.objects.bulk_create(
+        StockReservation(
+            order=order, product_id=product_id, count=count, expires_at=expires_at
+        )
+        for product_id, count in counts.items()
+    )
+    transaction.on_commit(lambda: invalidate_stock(counts))
+
+
+def complete_reservations(order: Order) -> None:
+    """
+    Оплата заказа: резервы становятся продажей.
+
+    ValueError, если заказ уже оплачен или отменён по истечении резерва.
+    """
+    with transaction.atomic():
+        paid = Order.objects.filter(pk=order.pk, status__in=PENDING_STATUSES).update(
+            status=ORDER_STATUS_PAID
+        )
+        if not paid:
+            raise ValueError("Заказ уже оплачен или резерв товаров истёк.")
+        StockReservation.objects.filter(order=order).delete()
+    order.status = ORDER_STATUS_PAID
+
+
+def expire_reservations(now: Optional[datetime] = None) -> int:
+    """
+    Возвращает на склад истёкшие резервы и отменяет их заказы.
+
+    Возвращает число снятых резервов.
+    """
+    expired = StockReservation.objects.filter(expires_at__lte=now or timezone.now())
+    with transaction.atomic():
+        # Первый оператор — запись: дальше транзакция держит блокировку записи
+        Order.objects.filter(
+            pk__in=expired.values("order_id"), status__in=PENDING_STATUSES
+        ).update(status=ORDER_STATUS_CANCELLED)
+        rows = list(
+            expired.select_for_update().values_list("pk", "product_id", "count")
+        )
+        if not rows:
+            return 0
+
+        restored = defaultdict(int)
+        for _, product_id, count in rows:
+            restored[product_id] += count
+        Product.objects.filter(pk__in=list(restored)).update(
+            count=F("count") + per_product(restored)
+        )
+        StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        transaction.on_commit(lambda: invalidate_stock(restored))
+    return len(rows)
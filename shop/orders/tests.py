@@ -1,3 +1,292 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from basket.models import Basket, BasketItem
+from basket.tests import BasketTestMixin
+from catalog.models import Product, Sale
+from catalog.pricing import applied_schedule_date
+
+from .checkout import checkout
+from .models import Order, OrderLine, StockReservation
+from .serializers import OrderSerializer
+from .stock import OutOfStock, complete_reservations, expire_reservations
+
+
+class CheckoutTestCase(BasketTestMixin, TestCase):
+    PRODUCTS = 40
+    PRODUCT_FIELDS = {"count": 100}
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def fill_basket(self, products, count=2):
+        BasketItem.objects.bulk_create(
+            BasketItem(basket=self.basket, product=product, basket_count=count)
+            for product in products
+        )
+
+    def test_checkout_snapshots_basket(self):
+        first, second = self.products[:2]
+        today = timezone.now().date()
+        Sale.objects.create(
+            product=second,
+            salePrice=Decimal(4),
+            dateFrom=today - timedelta(days=1),
+            dateTo=today,
+        )
+        self.fill_basket([first, second], count=3)
+
+        response = self.client.post(
+            reverse("orders:orders"), [], content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(pk=response.data["orderId"])
+        self.assertEqual(order.totalCost, Decimal(42))
+        self.assertEqual(
+            sorted(order.lines.values_list("product_id", "price", "count")),
+            [(first.pk, Decimal(10), 3), (second.pk, Decimal(4), 3)],
+        )
+        self.assertFalse(BasketItem.objects.filter(basket=self.basket).exists())
+
+        # Изменение каталога не меняет оформленный заказ
+        second.delete()
+        response = self.client.get(reverse("orders:order_detail", args=[order.pk]))
+        self.assertEqual(
+            [
+                (item["id"], item["title"], item["count"], item["price"])
+                for item in response.data["products"]
+            ],
+            [
+                (first.pk, first.title, 3, Decimal(30)),
+                (None, second.title, 3, Decimal(12)),
+            ],
+        )
+
+    def test_statement_count_does_not_depend_on_basket_size(self):
+        # Транзакция (2), вставка заказа, строки корзины, списание остатков,
+        # резервы, строки заказа, итоговая стоимость, удаление корзины
+        applied_schedule_date()
+        for size in (1, 40):
+            self.fill_basket(self.products[:size])
+            with self.assertNumQueries(9):
+                order = checkout(self.user)
+            self.assertEqual(order.lines.count(), size)
+
+    def test_empty_basket(self):
+        response = self.client.post(reverse("orders:orders"))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_list_and_confirm(self):
+        self.fill_basket(self.products[:2])
+        order = checkout(self.user)
+        response = self.client.post(
+            reverse("orders:order_detail", args=[order.pk]),
+            {
+                "fullName": "Иван Иванов",
+                "email": "ivan@example.com",
+                "phone": "88002000600",
+                "deliveryType": "ordinary",
+                "paymentType": "online",
+                "city": "Москва",
+                "address": "Красная площадь, 1",
+                "totalCost": 1,
+                "products": [],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.data, {"orderId": order.pk})
+
+        response = self.client.get(reverse("orders:orders"))
+        self.assertEqual(len(response.data), 1)
+        data = response.data[0]
+        self.assertEqual(data["status"], "accepted")
+        self.assertEqual(data["city"], "Москва")
+        self.assertEqual(Decimal(data["totalCost"]), Decimal(40))
+        self.assertEqual(len(data["products"]), 2)
+
+    def test_other_users_orders_are_hidden(self):
+        self.fill_basket(self.products[:1])
+        order = checkout(self.user)
+        other = User.objects.create_user(username="other", password="secret")
+        self.client.force_login(other)
+        response = self.client.get(reverse("orders:order", args=[order.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse("orders:orders")).data, [])
+        self.assertEqual(OrderLine.objects.count(), 1)
+
+
+class StockReservationTestCase(BasketTestMixin, TestCase):
+    PRODUCTS = 2
+    PRODUCT_FIELDS = {"count": 5}
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def fill_basket(self, *counts):
+        BasketItem.objects.bulk_create(
+            BasketItem(basket=self.basket, product=product, basket_count=count)
+            for product, count in zip(self.products, counts)
+        )
+
+    def stock(self):
+        return [product.count for product in Product.objects.order_by("id")]
+
+    def test_checkout_reserves_stock(self):
+        self.fill_basket(2, 5)
+        order = checkout(self.user)
+        self.assertEqual(self.stock(), [3, 0])
+        self.assertEqual(
+            sorted(order.reservations.values_list("product_id", "count")),
+            [(self.products[0].pk, 2), (self.products[1].pk, 5)],
+        )
+
+    def test_out_of_stock_rolls_back_checkout(self):
+        self.fill_basket(2, 6)
+        with self.assertRaises(OutOfStock):
+            checkout(self.user)
+        response = self.client.post(reverse("orders:orders"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), [5, 5])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(BasketItem.objects.filter(basket=self.basket).count(), 2)
+
+    def test_expired_reservations_return_to_stock(self):
+        self.fill_basket(2, 1)
+        order = checkout(self.user)
+        self.assertEqual(expire_reservations(), 0)
+
+        later = timezone.now() + timedelta(seconds=settings.ORDER_RESERVATION_TTL + 1)
+        self.assertEqual(expire_reservations(now=later), 2)
+        self.assertEqual(self.stock(), [5, 5])
+        order.refresh_from_db()
+        self.assertEqual(order.status, "cancelled")
+        self.assertFalse(StockReservation.objects.exists())
+
+        with self.assertRaises(ValueError):
+            complete_reservations(order)
+        response = self.client.post(
+            reverse("orders:order_detail", args=[order.pk]),
+            {"city": "Москва"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_reservation_expiring_before_confirm(self):
+        self.fill_basket(2, 1)
+        order = checkout(self.user)
+        later = timezone.now() + timedelta(seconds=settings.ORDER_RESERVATION_TTL + 1)
+        is_valid = OrderSerializer.is_valid
+
+        def expire_then_validate(serializer, **kwargs):
+            # Резерв истекает, пока обрабатывается подтверждение
+            expire_reservations(now=later)
+            return is_valid(serializer, **kwargs)
+
+        with mock.patch.object(
+            OrderSerializer, "is_valid", autospec=True, side_effect=expire_then_validate
+        ):
+            response = self.client.post(
+                reverse("orders:order_detail", args=[order.pk]),
+                {"city": "Москва"},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "cancelled")
+        self.assertIsNone(order.city)
+        self.assertEqual(self.stock(), [5, 5])
+
+    def test_confirm_keeps_paid_status(self):
+        self.fill_basket(1)
+        order = checkout(self.user)
+        complete_reservations(order)
+        url = reverse("orders:order_detail", args=[order.pk])
+        response = self.client.post(
+            url, {"city": "Москва"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "paid")
+
+        missing = reverse("orders:order_detail", args=[order.pk + 1])
+        response = self.client.post(
+            missing, {"city": "Москва"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_paid_order_keeps_stock(self):
+        self.fill_basket(2, 1)
+        order = checkout(self.user)
+        complete_reservations(order)
+        self.assertEqual(order.status, "paid")
+        self.assertFalse(StockReservation.objects.exists())
+
+        later = timezone.now() + timedelta(seconds=settings.ORDER_RESERVATION_TTL + 1)
+        self.assertEqual(expire_reservations(now=later), 0)
+        self.assertEqual(self.stock(), [3, 4])
+
+
+class StockReservationConcurrencyTestCase(BasketTestMixin, TransactionTestCase):
+    THREADS = 16
+    BUYERS = 200
+    STOCK = 50
+
+    def setUp(self):
+        super().setUp()
+        (self.product,) = self.create_products(1, count=self.STOCK, limited=True)
+        users = User.objects.bulk_create(
+            User(username=f"buyer{index}") for index in range(self.BUYERS)
+        )
+        baskets = Basket.objects.bulk_create(Basket(user=user) for user in users)
+        BasketItem.objects.bulk_create(
+            BasketItem(basket=basket, product=self.product, basket_count=1)
+            for basket in baskets
+        )
+        self.users = users
+
+    def test_concurrent_checkouts_never_oversell(self):
+        buyers = iter(self.users)
+        lock = threading.Lock()
+        placed, refused, errors = [], [], []
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        user = next(buyers, None)
+                    if user is None:
+                        return
+                    try:
+                        placed.append(checkout(user))
+                    except OutOfStock:
+                        refused.append(user)
+            except Exception as error:  # noqa: BLE001 - ошибка проверяется в тесте
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(placed), self.STOCK)
+        self.assertEqual(len(refused), self.BUYERS - self.STOCK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 0)
+        self.assertEqual(Order.objects.count(), self.STOCK)
+        self.assertEqual(StockReservation.objects.count(), self.STOCK)
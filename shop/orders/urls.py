@@ -0,0 +1,12 @@
+from django.urls import path
+
+from .views import OrderDetailView, OrdersView
+
+app_name = "orders"
+
+urlpatterns = [
+    path("api/orders", OrdersView.as_view(), name="orders"),
+    path("api/orders/<int:pk>", OrderDetailView.as_view(), name="order"),
+    # Адрес, по которому обращается фронтенд (order-detail.js)
+    path("api/order/<int:pk>", OrderDetailView.as_view(), name="order_detail"),
+]
@@ -1,3 +1,56 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .checkout import checkout
+from .models import ORDER_STATUS_ACCEPTED, Order
+from .serializers import OrderSerializer, serialize_orders
+from .stock import PENDING_STATUSES
+
+
+def user_orders(user):
+    return Order.objects.filter(user=user).prefetch_related("lines")
+
+
+class OrdersView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        orders = user_orders(request.user).order_by("-created_add", "-id")
+        return Response(serialize_orders(orders))
+
+    def post(self, request):
+        # Заказ оформляется из корзины на сервере; товары из тела запроса —
+        # копия корзины во фронтенде — не используются
+        try:
+            order = checkout(request.user)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"orderId": order.pk})
+
+
+class OrderDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        order = get_object_or_404(user_orders(request.user), pk=pk)
+        return Response(serialize_orders([order])[0])
+
+    def post(self, request, pk):
+        """Подтверждение заказа: данные покупателя, доставка и оплата"""
+        serializer = OrderSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        # Одна условная запись: резерв мог истечь (expire_reservations) или
+        # заказ — оплатиться между чтением и сохранением
+        confirmed = Order.objects.filter(
+            pk=pk, user=request.user, status__in=PENDING_STATUSES
+        ).update(status=ORDER_STATUS_ACCEPTED, **serializer.validated_data)
+        if not confirmed:
+            get_object_or_404(Order.objects.filter(user=request.user), pk=pk)
+            return Response(
+                {"error": "Заказ уже оплачен или резерв товаров истёк."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({"orderId": pk})
@@ -0,0 +1,11 @@
+from rest_framework import serializers
+
+
+class PaymentSerializer(serializers.Serializer):
+    """Данные карты из формы оплаты; в базе не сохраняются"""
+
+    number = serializers.RegexField(r"^\d{16}$")
+    name = serializers.CharField(max_length=100)
+    month = serializers.RegexField(r"^(0?[1-9]|1[0-2])$")
+    year = serializers.RegexField(r"^\d{2,4}$")
+    code = serializers.RegexField(r"^\d{3}$")
@@ -1,3 +1,67 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from basket.models import BasketItem
+from basket.tests import BasketTestMixin
+from orders.checkout import checkout
+from orders.models import StockReservation
+from orders.stock import expire_reservations
+
+CARD = {
+    "number": "4242424242424242",
+    "name": "Ivan Ivanov",
+    "month": "02",
+    "year": "2030",
+    "code": "123",
+}
+
+
+class PaymentTestCase(BasketTestMixin, TestCase):
+    PRODUCTS = 1
+    PRODUCT_FIELDS = {"count": 5}
+
+    def setUp(self):
+        super().setUp()
+        (self.product,) = self.products
+        self.client.force_login(self.user)
+        BasketItem.objects.create(
+            basket=self.basket, product=self.product, basket_count=2
+        )
+        self.order = checkout(self.user)
+
+    def pay(self, data=CARD):
+        return self.client.post(
+            reverse("payment:payment", args=[self.order.pk]),
+            data,
+            content_type="application/json",
+        )
+
+    def test_payment_completes_reservation(self):
+        self.assertEqual(self.pay({**CARD, "code": "12"}).status_code, 400)
+        self.assertEqual(self.pay().status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+        self.assertFalse(StockReservation.objects.exists())
+
+        later = timezone.now() + timedelta(seconds=settings.ORDER_RESERVATION_TTL + 1)
+        self.assertEqual(expire_reservations(now=later), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 3)
+        self.assertEqual(self.pay().status_code, 400)
+
+    def test_expired_order_cannot_be_paid(self):
+        later = timezone.now() + timedelta(seconds=settings.ORDER_RESERVATION_TTL + 1)
+        expire_reservations(now=later)
+        self.assertEqual(self.pay().status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "cancelled")
 
-# Create your tests here.
+    def test_other_users_order(self):
+        other = User.objects.create_user(username="other", password="secret")
+        self.client.force_login(other)
+        self.assertEqual(self.pay().status_code, 404)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .views import PaymentView
+
+app_name = "payment"
+
+urlpatterns = [
+    path("api/payment/<int:pk>", PaymentView.as_view(), name="payment"),
+]
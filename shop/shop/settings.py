@@ -55,6 +55,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "basket.middleware.BasketCookieMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -87,6 +88,11 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Секунды ожидания блокировки записи другим соединением
+        "OPTIONS": {"timeout": 20},
+        # Файловая тестовая база: в общей базе в памяти конкурирующие
+        # соединения получают "database table is locked" без ожидания
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 # APPEND_SLASH = False
@@ -145,6 +151,10 @@ REST_FRAMEWORK = {
 
 CART_SESSION_ID = 'basket'
 
+# LocMemCache у каждого процесса свой: сигналы сбрасывают кеши каталога только
+# в процессе, который изменил данные, остальные видят изменения по истечении
+# CATALOG_CACHE_TIMEOUT и CATALOG_FRAGMENT_TIMEOUT. С общим кешем (Redis,
+# memcached) сроки можно увеличить
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -152,3 +162,36 @@ CACHES = {
 }
 
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+
+# Хранилище корзины анонимного пользователя: "session" или "cookie" —
+# подписанная cookie без хранения на сервере (basket.basket.CookieBasket)
+BASKET_STORAGE = "session"
+BASKET_COOKIE_NAME = "basket"
+# Время жизни cookie корзины, секунды
+BASKET_COOKIE_AGE = 30 * 24 * 60 * 60
+# Ограничение числа разных товаров, чтобы cookie уложилась в 4 КБ
+BASKET_COOKIE_MAX_ITEMS = 100
+# Количество товара, который при входе есть и в анонимной корзине, и в корзине
+# пользователя: "sum" — сумма, "max" — большее, "replace" — из анонимной
+BASKET_MERGE_POLICY = "sum"
+# Сумма корзины, начиная с которой доставка бесплатна (basket.pricing)
+BASKET_FREE_DELIVERY_FROM = 2000
+# Сколько секунд товары неоплаченного заказа остаются в резерве (orders.stock)
+ORDER_RESERVATION_TTL = 15 * 60
+
+# Время жизни закешированных ответов каталога, витрин и дерева категорий,
+# секунды (catalog.cache)
+CATALOG_CACHE_TIMEOUT = 300
+# Время жизни сериализованных карточек и страниц товаров и их версий (ETag),
+# секунды (catalog.fragments, catalog.detail)
+CATALOG_FRAGMENT_TIMEOUT = 300
+# Сколько последних отзывов выводится в карточке товара, остальные — через
+# GET /api/product/<pk>/reviews
+CATALOG_DETAIL_REVIEWS = 5
+
+# Колоночная read-модель каталога в памяти процесса (catalog.readmodel, нужен numpy)
+CATALOG_READ_MODEL = False
+# Период полной перестройки read-модели, секунды
+CATALOG_READ_MODEL_TTL = 300
+# Период полной перестройки фасетного индекса в памяти процесса (catalog.facets)
+CATALOG_FACET_INDEX_TTL = 300
@@ -25,6 +25,8 @@ urlpatterns = [
     path("", include("catalog.urls")),
     path("", include("users.urls")),
     path("", include("basket.urls")),
+    path("", include("orders.urls")),
+    path("", include("payment.urls")),
 ]
 
 if settings.DEBUG: